@@ -1,7 +1,7 @@
 import time
 from concurrent.futures import ThreadPoolExecutor, Future
 
-from threading import Lock
+from threading import Condition, Lock
 from typing import Optional, Callable, List
 
 from one_dragon.base.conditional_operation.atomic_op import AtomicOp
@@ -10,11 +10,12 @@ from one_dragon.base.conditional_operation.operation_task import OperationTask
 from one_dragon.base.conditional_operation.operation_template import OperationTemplate
 from one_dragon.base.conditional_operation.scene_handler import SceneHandler
 from one_dragon.base.conditional_operation.state_handler_template import StateHandlerTemplate
-from one_dragon.base.conditional_operation.state_recorder import StateRecorder, StateRecord
+from one_dragon.base.conditional_operation.state_recorder import StateRecorder, StateRecord, StateRecorderStore
 from one_dragon.base.conditional_operation.utils import construct_scene_handler
 from one_dragon.base.config.yaml_config import YamlConfig
 from one_dragon.thread.atomic_int import AtomicInt
 from one_dragon.utils import thread_utils
+from one_dragon.utils.latency_histogram import LatencyHistogram
 from one_dragon.utils.log_utils import log
 
 _od_conditional_op_executor = ThreadPoolExecutor(thread_name_prefix='od_conditional_op', max_workers=32)
@@ -38,11 +39,23 @@ class ConditionalOperator(YamlConfig):
         self.last_trigger_time: dict[int, float] = {}  # 各handler最后一次的触发时间
         self.normal_scene_handler: Optional[SceneHandler] = None  # 不需要状态触发的场景处理
         self.is_running: bool = False  # 整体是否正在运行
+        self.state_recorder_store: StateRecorderStore = StateRecorderStore()  # 状态记录的存储 子类创建状态记录器时使用
 
         self._task_lock: Lock = Lock()
         self.running_task: Optional[OperationTask] = None  # 正在运行的任务
         self.running_task_cnt: AtomicInt = AtomicInt()
 
+        # 主循环的唤醒 任务结束、相关状态变化、停止运行时唤醒 不与任务锁共用 避免通知方死锁
+        self.event_driven_loop: bool = True  # 主循环是否使用事件唤醒 False时使用原来的20ms轮询
+        self.max_loop_wait_seconds: float = 0.5  # 主循环最长的等待时间 兜底
+        self._loop_condition: Condition = Condition()
+        self._loop_dirty: bool = False  # 是否有未处理的唤醒
+        self._normal_ready_time: float = 0  # 主循环最近一次被唤醒的时间 用于统计延迟
+        self._normal_usage_recorders: List[StateRecorder] = []  # 主循环使用的状态记录器
+
+        self.trigger_latency: LatencyHistogram = LatencyHistogram('触发场景延迟')  # 状态到达 -> 第一个指令执行
+        self.normal_latency: LatencyHistogram = LatencyHistogram('主循环延迟')  # 可以执行 -> 第一个指令执行
+
     def init(
             self,
             op_getter: Callable[[OperationDef], AtomicOp],
@@ -77,6 +90,16 @@ class ConditionalOperator(YamlConfig):
             else:
                 self.normal_scene_handler = handler
 
+        # 主循环使用的状态发生变化时 唤醒主循环
+        self._normal_usage_recorders = []
+        if self.normal_scene_handler is not None:
+            for state_name in self.normal_scene_handler.get_usage_states():
+                recorder = self.get_state_recorder(state_name)
+                if recorder is None:
+                    continue
+                recorder.add_change_callback(self._notify_normal_scene_loop)
+                self._normal_usage_recorders.append(recorder)
+
         self._inited = True
 
     def dispose(self) -> None:
@@ -85,6 +108,9 @@ class ConditionalOperator(YamlConfig):
         :return:
         """
         self.stop_running()  # 在这里强制停止运行
+        for recorder in self._normal_usage_recorders:
+            recorder.remove_change_callback(self._notify_normal_scene_loop)
+        self._normal_usage_recorders = []
         if self.trigger_scene_handler is not None:
             for _, handler in self.trigger_scene_handler.items():
                 handler.dispose()
@@ -104,16 +130,83 @@ class ConditionalOperator(YamlConfig):
 
         self.is_running = True
         self.running_task_cnt.set(0)  # 每次重置计数器 防止有bug导致无法正常运行
+        self.trigger_latency.reset()
+        self.normal_latency.reset()
 
         if self.normal_scene_handler is not None:
-            future: Future = _od_conditional_op_executor.submit(self._normal_scene_loop)
+            if self.event_driven_loop:
+                future: Future = _od_conditional_op_executor.submit(self._normal_scene_event_loop)
+            else:
+                future: Future = _od_conditional_op_executor.submit(self._normal_scene_loop)
             future.add_done_callback(thread_utils.handle_future_result)
 
         return True
 
+    def _notify_normal_scene_loop(self) -> None:
+        """
+        唤醒主循环
+        :return:
+        """
+        with self._loop_condition:
+            self._loop_dirty = True
+            self._normal_ready_time = time.time()
+            self._loop_condition.notify_all()
+
+    def _normal_scene_event_loop(self) -> None:
+        """
+        主循环 事件唤醒的版本
+        只在以下情况重新判断
+        1. 其它场景的任务结束
+        2. 主循环的执行间隔到了
+        3. 主循环使用的状态发生变化
+        4. 状态没有变化 但判断结果会随时间变化的时间点到了
+        :return:
+        """
+        normal_handler = self.normal_scene_handler
+        normal_handler_id = id(normal_handler)
+        while self.is_running:
+            wait_seconds: Optional[float] = self.max_loop_wait_seconds
+
+            # 上锁后确保运行状态不会被篡改
+            with self._task_lock:
+                if not self.is_running:
+                    # 已经被stop_running中断了 不继续
+                    break
+
+                if self.running_task_cnt.get() == 0:  # 有其它场景在运行时 等待任务结束的唤醒
+                    trigger_time = time.time()
+                    last_trigger_time = self.last_trigger_time.get(normal_handler_id, 0)
+                    past_time = trigger_time - last_trigger_time
+                    if past_time < normal_handler.interval_seconds:
+                        wait_seconds = normal_handler.interval_seconds - past_time
+                    else:
+                        new_task = normal_handler.get_operations(trigger_time)
+                        if new_task is not None:
+                            log.debug(f'当前场景 主循环 当前条件 {new_task.expr_display}')
+                            # 从最近一次唤醒 或执行间隔结束开始计算延迟
+                            ready_time = max(self._normal_ready_time, last_trigger_time + normal_handler.interval_seconds)
+                            new_task.set_latency_start(min(ready_time, trigger_time), self.normal_latency)
+                            self.running_task = new_task
+                            self.last_trigger_time[normal_handler_id] = trigger_time
+                            self.running_task_cnt.inc()
+                            future = self.running_task.run_async()
+                            future.add_done_callback(self._on_task_done)
+                        else:
+                            next_check_time = normal_handler.get_next_check_time()
+                            if next_check_time is None:  # 无法得知下一次变化的时间 退化为轮询
+                                wait_seconds = 0.02
+                            else:
+                                wait_seconds = min(wait_seconds, max(0.0, next_check_time - trigger_time))
+
+            # 等待时间不能写在锁里 要尽快释放锁
+            with self._loop_condition:
+                if not self._loop_dirty and self.is_running:
+                    self._loop_condition.wait(wait_seconds)
+                self._loop_dirty = False
+
     def _normal_scene_loop(self) -> None:
         """
-        主循环
+        主循环 每20ms轮询的版本 保留用于对比
         :return:
         """
         normal_handler_id = id(self.normal_scene_handler)
@@ -140,6 +233,8 @@ class ConditionalOperator(YamlConfig):
                         new_task = self.normal_scene_handler.get_operations(trigger_time)
                         if new_task is not None:
                             log.debug(f'当前场景 主循环 当前条件 {new_task.expr_display}')
+                            ready_time = max(self._normal_ready_time, last_trigger_time + self.normal_scene_handler.interval_seconds)
+                            new_task.set_latency_start(min(ready_time, trigger_time), self.normal_latency)
                             self.running_task = new_task
                             self.last_trigger_time[normal_handler_id] = trigger_time
                             self.running_task_cnt.inc()
@@ -152,10 +247,11 @@ class ConditionalOperator(YamlConfig):
                 else:  # 没有命中的状态 或者 提交执行了 那就自旋等待
                     time.sleep(0.02)
 
-    def _trigger_scene(self, state_name: str) -> None:
+    def _trigger_scene(self, state_name: str, arrive_time: Optional[float] = None) -> None:
         """
         触发对应的场景
         :param state_name: 触发的状态
+        :param arrive_time: 状态到达的时间 用于统计延迟
         :return:
         """
         if state_name not in self.trigger_scene_handler:
@@ -201,6 +297,7 @@ class ConditionalOperator(YamlConfig):
             log.debug(f'当前场景 {state_name} 当前条件 {new_task.expr_display}')
 
             new_task.set_trigger(state_name)
+            new_task.set_latency_start(trigger_time if arrive_time is None else arrive_time, self.trigger_latency)
             self.running_task = new_task
             self.last_trigger_time[trigger_handler_id] = trigger_time
             future = self.running_task.run_async()
@@ -215,6 +312,11 @@ class ConditionalOperator(YamlConfig):
         with self._task_lock:
             self.is_running = False
             self._stop_running_task()
+        self._notify_normal_scene_loop()
+
+        if self.trigger_latency.total_cnt > 0 or self.normal_latency.total_cnt > 0:
+            log.debug(self.trigger_latency.display_text)
+            log.debug(self.normal_latency.display_text)
 
     def _stop_running_task(self) -> None:
         """
@@ -228,6 +330,7 @@ class ConditionalOperator(YamlConfig):
                 # 如果 finish=True 则计数器已经在 _on_task_done 减少了 这里就不减了
                 # 如果 finish=False 则代表还有操作在继续。在这里要减少计数器而不是等_on_task_done 让无触发器场景尽早运行
                 self.running_task_cnt.dec()
+                self._notify_normal_scene_loop()
 
     def _on_task_done(self, future: Future) -> None:
         """
@@ -241,6 +344,7 @@ class ConditionalOperator(YamlConfig):
                     self.running_task.priority = None
             except Exception:  # run_async里有callback打印日志
                 pass
+        self._notify_normal_scene_loop()
 
     def get_usage_states(self) -> set[str]:
         """
@@ -269,6 +373,7 @@ class ConditionalOperator(YamlConfig):
         :param state_record: 状态记录
         :return:
         """
+        arrive_time = time.time()
         # 先统一更新状态值
         state_recorder = self._update_state_recorder(state_record)
         if state_recorder is None:
@@ -276,7 +381,7 @@ class ConditionalOperator(YamlConfig):
 
         # 再去触发具体的场景 由自己的线程处理
         if not state_record.is_clear:
-            future: Future = _od_conditional_op_executor.submit(self._trigger_scene, state_recorder.state_name)
+            future: Future = _od_conditional_op_executor.submit(self._trigger_scene, state_recorder.state_name, arrive_time)
             future.add_done_callback(thread_utils.handle_future_result)
 
     def batch_update_states(self, state_records: List[StateRecord]) -> None:
@@ -289,6 +394,7 @@ class ConditionalOperator(YamlConfig):
         :param state_records: 状态记录列表
         :return:
         """
+        arrive_time = time.time()
         top_priority_handler: Optional[SceneHandler] = None
         top_priority_state: Optional[str] = None
 
@@ -321,7 +427,7 @@ class ConditionalOperator(YamlConfig):
 
         # 触发具体的场景 由自己的线程处理
         if top_priority_state is not None:
-            future: Future = _od_conditional_op_executor.submit(self._trigger_scene, top_priority_state)
+            future: Future = _od_conditional_op_executor.submit(self._trigger_scene, top_priority_state, arrive_time)
             future.add_done_callback(thread_utils.handle_future_result)
         else:
             # 没有场景需要触发 看是否需要打断当前操作
@@ -353,12 +459,88 @@ class ConditionalOperator(YamlConfig):
         if new_record.is_clear:
             recorder.clear_state_record()
         else:
+            # 互斥的状态 由存储统一清除
             recorder.update_state_record(new_record)
-            if recorder.mutex_list is not None:
-                for mutex_state in recorder.mutex_list:
-                    mutex_recorder = self.get_state_recorder(mutex_state)
-                    if mutex_recorder is None:
-                        continue
-                    mutex_recorder.clear_state_record()
 
         return recorder
+
+
+def __debug_loop_latency():
+    """
+    对比事件唤醒的主循环 和原来20ms轮询的主循环
+    1. 触发场景 状态到达 -> 第一个指令执行的延迟
+    2. 主循环 上一个任务结束 -> 下一个任务第一个指令执行的延迟
+    3. 主循环条件不满足时 1秒内的空转判断次数
+    """
+    import random
+
+    class _SleepOp(AtomicOp):
+
+        def __init__(self, seconds: float):
+            AtomicOp.__init__(self, 'sleep')
+            self.seconds: float = seconds
+
+        def execute(self):
+            time.sleep(self.seconds)
+
+    class _DebugOperator(ConditionalOperator):
+
+        def __init__(self):
+            ConditionalOperator.__init__(self, sub_dir='', template_name='debug', is_mock=True)
+            self.state_recorders: dict[str, StateRecorder] = {}
+
+        def get_state_recorder(self, state_name: str) -> Optional[StateRecorder]:
+            if state_name not in self.state_recorders:
+                self.state_recorders[state_name] = StateRecorder(state_name, store=self.state_recorder_store)
+            return self.state_recorders[state_name]
+
+    for event_driven in [False, True]:
+        op = _DebugOperator()
+        op.data = {
+            'scenes': [
+                {'triggers': ['闪避识别'], 'priority': 1, 'interval': 0,
+                 'handlers': [{'states': '[闪避识别]', 'operations': [{'op_name': 'sleep', 'seconds': 0.01}]}]},
+                {'interval': 0,
+                 'handlers': [{'states': '[前台-A, 0, 999]', 'operations': [{'op_name': 'sleep', 'seconds': 0.03}]}]},
+            ]
+        }
+        op.init(op_getter=lambda op_def: _SleepOp(op_def.wait_seconds),
+                scene_handler_getter=lambda name: None,
+                operation_template_getter=lambda name: None)
+        op.event_driven_loop = event_driven
+
+        check_cnt = [0]
+        normal_get_operations = op.normal_scene_handler.get_operations
+
+        def _count_get_operations(trigger_time: float) -> Optional[OperationTask]:
+            check_cnt[0] += 1
+            return normal_get_operations(trigger_time)
+
+        op.normal_scene_handler.get_operations = _count_get_operations
+
+        op.start_running_async()
+
+        # 主循环没有可执行的指令
+        time.sleep(1)
+        idle_check_cnt = check_cnt[0]
+
+        # 主循环持续执行 期间随机触发闪避
+        op.update_state(StateRecord('前台-A', time.time()))
+        random.seed(0)
+        for _ in range(50):
+            time.sleep(random.uniform(0.05, 0.1))
+            op.update_state(StateRecord('闪避识别', time.time()))
+        time.sleep(0.2)
+
+        trigger_text = op.trigger_latency.display_text
+        normal_text = op.normal_latency.display_text
+        op.dispose()
+
+        print('事件唤醒' if event_driven else '20ms轮询')
+        print('  空闲1秒 主循环判断 %d 次' % idle_check_cnt)
+        print('  ' + trigger_text)
+        print('  ' + normal_text)
+
+
+if __name__ == '__main__':
+    __debug_loop_latency()
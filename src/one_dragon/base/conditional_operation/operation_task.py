@@ -1,3 +1,4 @@
+import time
 from concurrent.futures import ThreadPoolExecutor, Future
 
 from threading import Lock
@@ -5,6 +6,7 @@ from typing import Optional, List, Set
 
 from one_dragon.base.conditional_operation.atomic_op import AtomicOp
 from one_dragon.utils import thread_utils
+from one_dragon.utils.latency_histogram import LatencyHistogram
 from one_dragon.utils.log_utils import log
 
 _od_op_task_executor = ThreadPoolExecutor(thread_name_prefix='_od_op_task_executor', max_workers=32)
@@ -30,6 +32,9 @@ class OperationTask:
 
         self.expr_list: List[str] = []  # 用于界面显示
 
+        self._latency_start_time: Optional[float] = None  # 统计延迟的开始时间
+        self._latency_histogram: Optional[LatencyHistogram] = None  # 开始时间到第一个指令执行的延迟
+
     def run_async(self) -> Future:
         """
         异步执行
@@ -50,14 +55,18 @@ class OperationTask:
                 if not self.running:
                     # 被stop中断了 不继续后续的操作
                     break
-                self._current_op = self.op_list[idx]
-                if self._current_op.async_op:
-                    self._async_ops.append(self._current_op)
-                future: Future = _od_op_task_executor.submit(self._current_op.execute)
-                future.add_done_callback(thread_utils.handle_future_result)
+                op = self.op_list[idx]
+                self._current_op = op
+                if op.async_op:
+                    self._async_ops.append(op)
+
+            if idx == 0 and self._latency_histogram is not None:
+                self._latency_histogram.record(time.time() - self._latency_start_time)
 
+            # 直接在任务线程中执行 原来提交到线程池后也是阻塞等待结果 省去一次线程切换
+            # stop 会在其它线程中调用 op.stop 打断执行
             try:
-                future.result()
+                op.execute()
             except Exception:
                 log.error('指令执行出错', exc_info=True)
 
@@ -93,6 +102,16 @@ class OperationTask:
             self._async_ops.clear()
             return False
 
+    def set_latency_start(self, start_time: float, histogram: LatencyHistogram) -> None:
+        """
+        设置延迟统计 第一个指令开始执行时 记录与开始时间的差值
+        :param start_time: 开始时间 例如触发状态到达的时间
+        :param histogram: 记录的统计
+        :return:
+        """
+        self._latency_start_time = start_time
+        self._latency_histogram = histogram
+
     def add_expr(self, expr: str) -> None:
         """
         添加一个表达式
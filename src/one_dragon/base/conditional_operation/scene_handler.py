@@ -24,6 +24,20 @@ class SceneHandler:
                 return task
         return None
 
+    def get_next_check_time(self) -> Optional[float]:
+        """
+        在状态没有变化的情况下 下一次可能有指令可以执行的时间
+        需要在 get_operations 没有返回指令后使用
+        :return: 无法得知时返回None
+        """
+        next_time: float = float('inf')
+        for sh in self.state_handlers:
+            sh_time = sh.get_next_check_time()
+            if sh_time is None:
+                return None
+            next_time = min(next_time, sh_time)
+        return next_time
+
     def get_usage_states(self) -> set[str]:
         """
         获取使用的状态
@@ -1,5 +1,5 @@
 from enum import Enum
-from typing import Optional, Callable
+from typing import Optional, Callable, List, Tuple
 
 from one_dragon.base.conditional_operation.state_recorder import StateRecorder
 from one_dragon.utils.log_utils import log
@@ -125,6 +125,189 @@ class StateCalNode:
             self.state_recorder.dispose()
 
 
+class CompiledStateCalTree:
+
+    def __init__(self, root: StateCalNode):
+        """
+        编译后的状态判断树
+        将状态判断树生成为一个扁平的python表达式 直接读取状态记录存储中的数组 避免每次判断时递归遍历节点和比较枚举
+        同时监听使用到的状态记录器的变化 并记录判断结果下一次可能随时间变化的时间点
+        状态记录器都没有变化 且未到达变化时间点时 直接返回上一次的判断结果
+        :param root: 状态判断树的根节点
+        """
+        self.root: StateCalNode = root
+
+        self.recorder_list: List[StateRecorder] = []  # 使用到的状态记录器 去重
+        self.leaf_list: List[Tuple[int, float, float]] = []  # 状态节点 (记录器下标, 时间区间最小值, 时间区间最大值)
+
+        self._cal: Optional[Callable[[float], bool]] = None
+        self._compiled: bool = False
+
+        self._change_cnt: int = 0  # 状态记录器的变化次数
+        # 上一次的判断 (变化次数, 判断结果, 下一次需要重新判断的时间) 整体赋值 保证多线程读取时一致
+        self._last: Optional[Tuple[int, bool, float]] = None
+
+        self._compile()
+        if self._compiled:
+            for recorder in self.recorder_list:
+                recorder.add_change_callback(self.invalidate)
+
+    def _compile(self) -> None:
+        """
+        生成判断方法 生成失败时(例如表达式嵌套过深) 退回使用原来的树进行判断
+        :return:
+        """
+        namespace: dict = {}
+        try:
+            expr = self._to_expr(self.root, namespace)
+            store_list = []
+            for recorder in self.recorder_list:
+                if not any(recorder.store is store for store in store_list):
+                    store_list.append(recorder.store)
+            store_args = ''.join(['s%d=s%d, ' % (i, i) for i in range(len(store_list))])
+            const_args = ''.join(['%s=%s, ' % (k, k) for k in namespace.keys()])
+            for i, store in enumerate(store_list):
+                namespace['s%d' % i] = store
+            # 表达式中的记录器 替换为直接读取存储中的数组
+            for i, recorder in enumerate(self.recorder_list):
+                store_idx = next(idx for idx, store in enumerate(store_list) if store is recorder.store)
+                expr = expr.replace('{r%d}' % i, 's%d' % store_idx).replace('{id%d}' % i, str(recorder.state_id))
+
+            self._cal = eval('lambda now, %s%s: %s' % (store_args, const_args, expr), {}, namespace)
+            self._compiled = True
+        except (SyntaxError, RecursionError, MemoryError):
+            log.debug('状态判断树无法编译 使用原判断树', exc_info=True)
+            self._cal = self.root.in_time_range
+            self._compiled = False
+
+    def _to_expr(self, node: StateCalNode, namespace: dict) -> str:
+        """
+        将节点转化为python表达式
+        :param node: 节点
+        :param namespace: 表达式中使用的常量
+        :return:
+        """
+        if node.node_type == StateCalNodeType.OP:
+            if node.op_type == StateCalOpType.AND:
+                return '(%s and %s)' % (self._to_expr(node.left_child, namespace),
+                                        self._to_expr(node.right_child, namespace))
+            elif node.op_type == StateCalOpType.OR:
+                return '(%s or %s)' % (self._to_expr(node.left_child, namespace),
+                                       self._to_expr(node.right_child, namespace))
+            else:
+                return '(not %s)' % self._to_expr(node.left_child, namespace)
+        elif node.node_type == StateCalNodeType.STATE:
+            recorder_idx = -1
+            for idx, recorder in enumerate(self.recorder_list):
+                if recorder is node.state_recorder:
+                    recorder_idx = idx
+                    break
+            if recorder_idx == -1:
+                recorder_idx = len(self.recorder_list)
+                self.recorder_list.append(node.state_recorder)
+            self.leaf_list.append((recorder_idx, node.state_time_range_min, node.state_time_range_max))
+
+            # 先使用占位符 编译时再替换为对应的存储和状态id
+            s = '{r%d}' % recorder_idx
+            state_id = '{id%d}' % recorder_idx
+            t_min = self._add_const(namespace, node.state_time_range_min)
+            t_max = self._add_const(namespace, node.state_time_range_max)
+            expr = '%s <= now - %s.last_record_time[%s] <= %s' % (t_min, s, state_id, t_max)
+            if node.state_value_range_min is not None and node.state_value_range_max is not None:
+                v_min = self._add_const(namespace, node.state_value_range_min)
+                v_max = self._add_const(namespace, node.state_value_range_max)
+                expr = '%s and %s.has_value[%s] and %s <= %s.last_value[%s] <= %s' % (
+                    expr, s, state_id, v_min, s, state_id, v_max)
+            return '(%s)' % expr
+        else:
+            return 'True'
+
+    @staticmethod
+    def _add_const(namespace: dict, value) -> str:
+        """
+        表达式中的常量 统一放到参数默认值中 兼容 inf 等无法直接写在表达式中的值
+        :param namespace: 常量
+        :param value: 值
+        :return: 常量的变量名
+        """
+        name = 'c%d' % len(namespace)
+        namespace[name] = value
+        return name
+
+    def in_time_range(self, now: float) -> bool:
+        """
+        根据当前时间 判断是否在状态的生效时间范围内 结果与 StateCalNode.in_time_range 一致
+        :param now: 当前时间
+        :return:
+        """
+        if not self._compiled:
+            return self._cal(now)
+
+        change_cnt = self._change_cnt
+        last = self._last
+        if last is not None and last[0] == change_cnt and now < last[2]:
+            return last[1]
+
+        result = self._cal(now)
+        self._last = (change_cnt, result, self._next_change_time(now))
+        return result
+
+    def _next_change_time(self, now: float) -> float:
+        """
+        状态记录器没有变化时 判断结果下一次可能发生变化的时间
+        每个状态节点只在 [记录时间+最小值, 记录时间+最大值] 内成立 因此结果只可能在这些边界上变化
+        :param now: 当前时间
+        :return:
+        """
+        next_time = float('inf')
+        for recorder_idx, t_min, t_max in self.leaf_list:
+            record_time = self.recorder_list[recorder_idx].last_record_time
+            start_time = record_time + t_min
+            end_time = record_time + t_max
+            if now < start_time:
+                next_time = min(next_time, start_time)
+            elif now <= end_time:
+                next_time = min(next_time, end_time)
+        return next_time
+
+    def get_next_change_time(self) -> Optional[float]:
+        """
+        上一次判断后 判断结果下一次可能随时间变化的时间点
+        :return: 上一次判断已经失效 或者未能编译时 返回None
+        """
+        last = self._last
+        if not self._compiled or last is None or last[0] != self._change_cnt:
+            return None
+        return last[2]
+
+    def get_last_result(self) -> Optional[bool]:
+        """
+        上一次的判断结果
+        :return: 上一次判断已经失效 或者未能编译时 返回None
+        """
+        last = self._last
+        if not self._compiled or last is None or last[0] != self._change_cnt:
+            return None
+        return last[1]
+
+    def invalidate(self) -> None:
+        """
+        使用的状态记录器发生变化 上一次的判断结果失效
+        判断过程中发生变化的话 判断结果也不会被使用
+        :return:
+        """
+        self._change_cnt += 1
+
+    def dispose(self) -> None:
+        """
+        销毁时 取消对状态记录器的监听
+        :return:
+        """
+        for recorder in self.recorder_list:
+            recorder.remove_change_callback(self.invalidate)
+        self._last = None
+
+
 def construct_state_cal_tree(expr_str: str, state_getter: Callable[[str], StateRecorder]) -> StateCalNode:
     """
     根据表达式 构造出状态判断树
@@ -287,5 +470,77 @@ def __debug():
     assert not node.in_time_range(2)  # False
 
 
+def __debug_compiled_benchmark():
+    """
+    使用 config/auto_battle 下的所有配置中的状态表达式 对比原判断树和编译后的判断耗时
+    模拟战斗中每20ms轮询一次 每次轮询之间随机更新少量状态
+    """
+    import os
+    import random
+    import time
+    import yaml
+    from one_dragon.base.conditional_operation.state_recorder import StateRecord
+    from one_dragon.utils import os_utils
+
+    expr_list: List[str] = []
+
+    def _collect(data) -> None:
+        if isinstance(data, dict):
+            for k, v in data.items():
+                if k == 'states' and isinstance(v, str):
+                    expr_list.append(v)
+                else:
+                    _collect(v)
+        elif isinstance(data, list):
+            for v in data:
+                _collect(v)
+
+    for sub_dir in ['auto_battle', 'auto_battle_state_handler']:
+        dir_path = os_utils.get_path_under_work_dir('config', sub_dir)
+        for file_name in os.listdir(dir_path):
+            if not file_name.endswith('.yml'):
+                continue
+            with open(os.path.join(dir_path, file_name), 'r', encoding='utf-8') as file:
+                _collect(yaml.safe_load(file))
+
+    recorders: dict[str, StateRecorder] = {}
+
+    def _get_recorder(state_name: str) -> StateRecorder:
+        if state_name not in recorders:
+            recorders[state_name] = StateRecorder(state_name)
+        return recorders[state_name]
+
+    tree_list = [construct_state_cal_tree(expr, _get_recorder) for expr in expr_list]
+    compiled_list = [CompiledStateCalTree(tree) for tree in tree_list]
+    recorder_list = list(recorders.values())
+    print('表达式 %d 个 状态 %d 个' % (len(tree_list), len(recorder_list)))
+
+    random.seed(0)
+    now: float = 100
+    tree_cost: float = 0
+    compiled_cost: float = 0
+    diff_cnt: int = 0
+    for _ in range(2000):
+        now += 0.02
+        for recorder in random.sample(recorder_list, 3):
+            if random.random() < 0.2:
+                recorder.clear_state_record()
+            else:
+                recorder.update_state_record(StateRecord(recorder.state_name, now, value=random.randint(0, 3)))
+
+        start = time.perf_counter()
+        tree_result = [tree.in_time_range(now) for tree in tree_list]
+        tree_cost += time.perf_counter() - start
+
+        start = time.perf_counter()
+        compiled_result = [compiled.in_time_range(now) for compiled in compiled_list]
+        compiled_cost += time.perf_counter() - start
+
+        diff_cnt += sum(1 for a, b in zip(tree_result, compiled_result) if a != b)
+
+    print('原判断树 %.3f 毫秒/轮询 编译后 %.3f 毫秒/轮询 结果不一致 %d 次' % (
+        tree_cost * 1000 / 2000, compiled_cost * 1000 / 2000, diff_cnt))
+
+
 if __name__ == '__main__':
-    __debug()
+    __debug_compiled_benchmark()
@@ -2,7 +2,7 @@ from typing import List, Optional, Set
 
 from one_dragon.base.conditional_operation.atomic_op import AtomicOp
 from one_dragon.base.conditional_operation.operation_task import OperationTask
-from one_dragon.base.conditional_operation.state_cal_tree import StateCalNode
+from one_dragon.base.conditional_operation.state_cal_tree import StateCalNode, CompiledStateCalTree
 from one_dragon.utils.log_utils import log
 
 
@@ -23,6 +23,7 @@ class StateHandler:
         """
         self.expr: str = expr
         self.state_cal_tree: StateCalNode = state_cal_tree
+        self.compiled_state_cal_tree: CompiledStateCalTree = CompiledStateCalTree(state_cal_tree)
         self.sub_handlers: List[StateHandler] = sub_handlers
         self.operations: List[AtomicOp] = operations
         self.interrupt_states: Set[str] = interrupt_states
@@ -33,7 +34,7 @@ class StateHandler:
         :param trigger_time:
         :return:
         """
-        if self.state_cal_tree.in_time_range(trigger_time):
+        if self.compiled_state_cal_tree.in_time_range(trigger_time):
             if self.sub_handlers is not None and len(self.sub_handlers) > 0:
                 for sub_handler in self.sub_handlers:
                     task = sub_handler.get_operations(trigger_time)
@@ -49,6 +50,24 @@ class StateHandler:
 
         return None
 
+    def get_next_check_time(self) -> Optional[float]:
+        """
+        在状态没有变化的情况下 下一次判断结果可能发生变化的时间
+        需要在 get_operations 没有返回指令后使用 此时所有相关的判断都已经执行过
+        :return: 无法得知时返回None
+        """
+        next_time = self.compiled_state_cal_tree.get_next_change_time()
+        if next_time is None:
+            return None
+        if not self.compiled_state_cal_tree.get_last_result() or self.sub_handlers is None:
+            return next_time
+        for sub_handler in self.sub_handlers:
+            sub_time = sub_handler.get_next_check_time()
+            if sub_time is None:
+                return None
+            next_time = min(next_time, sub_time)
+        return next_time
+
     def get_usage_states(self) -> set[str]:
         """
         获取使用的状态
@@ -68,6 +87,8 @@ class StateHandler:
         销毁
         :return:
         """
+        if self.compiled_state_cal_tree is not None:
+            self.compiled_state_cal_tree.dispose()
         if self.state_cal_tree is not None:
             self.state_cal_tree.dispose()
         if self.operations is not None:
@@ -1,4 +1,6 @@
-from typing import Optional, List
+import numpy as np
+import threading
+from typing import Optional, List, Callable
 
 
 class StateRecord:
@@ -17,40 +19,309 @@ class StateRecord:
         self.value_add: int = value_to_add
 
 
+class StateRecorderStore:
+
+    def __init__(self, capacity: int = 256):
+        """
+        状态记录的存储
+        状态名称统一转化为整数id 记录时间和值保存在数组中
+        互斥关系使用互斥组表示 组内任意一个状态出现时 组内其它状态都会被清空
+        组内同时最多只有一个状态是有效的 因此每个组只记录最后出现的状态 新状态出现时只需要清空这一个
+        :param capacity: 初始容量 不够时自动扩容
+        """
+        self._lock = threading.Lock()
+
+        self.state_id_map: dict[str, int] = {}  # 状态名称 -> id
+        self.state_name_list: List[str] = []  # id -> 状态名称
+
+        self.last_record_time: np.ndarray = np.full((capacity,), -1, dtype=np.float64)  # -1代表还没有触发过 0代表被清除
+        self.last_value: np.ndarray = np.zeros((capacity,), dtype=np.int64)
+        self.has_value: np.ndarray = np.zeros((capacity,), dtype=bool)  # last_value 是否有值
+
+        self.mutex_group_list: List[np.ndarray] = []  # 互斥组 -> 组内的状态id
+        self._group_last_state: List[int] = []  # 互斥组 -> 组内最后出现的状态id -1代表没有
+        self._state_group_list: List[List[int]] = []  # id -> 所在的互斥组
+        self._state_mutex_list: List[List[int]] = []  # id -> 额外的互斥状态id
+
+        self._change_callback_list: List[List[Callable[[], None]]] = []  # id -> 状态变化时的回调
+
+    @property
+    def state_cnt(self) -> int:
+        return len(self.state_name_list)
+
+    def get_state_id(self, state_name: str) -> int:
+        """
+        获取状态对应的id 不存在时新建
+        :param state_name: 状态名称
+        :return:
+        """
+        state_id = self.state_id_map.get(state_name)
+        if state_id is not None:
+            return state_id
+
+        with self._lock:
+            state_id = self.state_id_map.get(state_name)
+            if state_id is not None:
+                return state_id
+
+            state_id = len(self.state_name_list)
+            if state_id >= self.last_record_time.shape[0]:
+                self._expand(state_id + 1)
+            self.state_name_list.append(state_name)
+            self._state_group_list.append([])
+            self._state_mutex_list.append([])
+            self._change_callback_list.append([])
+            self.state_id_map[state_name] = state_id
+            return state_id
+
+    def _expand(self, min_capacity: int) -> None:
+        """
+        扩容 调用方需要持有锁
+        :param min_capacity: 最少需要的容量
+        :return:
+        """
+        capacity = max(min_capacity, self.last_record_time.shape[0] * 2)
+        old_cnt = self.last_record_time.shape[0]
+
+        last_record_time = np.full((capacity,), -1, dtype=np.float64)
+        last_record_time[:old_cnt] = self.last_record_time
+        last_value = np.zeros((capacity,), dtype=np.int64)
+        last_value[:old_cnt] = self.last_value
+        has_value = np.zeros((capacity,), dtype=bool)
+        has_value[:old_cnt] = self.has_value
+
+        self.last_record_time = last_record_time
+        self.last_value = last_value
+        self.has_value = has_value
+
+    def add_mutex_group(self, state_name_list: List[str]) -> int:
+        """
+        增加一个互斥组 组内的状态两两互斥
+        :param state_name_list: 状态名称列表
+        :return: 互斥组id
+        """
+        id_list = [self.get_state_id(i) for i in state_name_list]
+        with self._lock:
+            group_id = len(self.mutex_group_list)
+            self.mutex_group_list.append(np.array(id_list, dtype=np.int64))
+            self._group_last_state.append(-1)
+            for state_id in id_list:
+                self._state_group_list[state_id].append(group_id)
+            return group_id
+
+    def add_mutex(self, state_name: str, mutex_list: List[str]) -> None:
+        """
+        增加单向的互斥关系 状态出现时 清空互斥的状态
+        :param state_name: 状态名称
+        :param mutex_list: 互斥的状态名称列表
+        :return:
+        """
+        state_id = self.get_state_id(state_name)
+        mutex_id_list = [self.get_state_id(i) for i in mutex_list]
+        with self._lock:
+            self._state_mutex_list[state_id].extend([i for i in mutex_id_list if i != state_id])
+
+    def update_record(self, state_id: int, trigger_time: float,
+                      value: Optional[int] = None, value_add: Optional[int] = None) -> None:
+        """
+        记录状态 并清空互斥的状态
+        :param state_id: 状态id
+        :param trigger_time: 触发时间
+        :param value: 状态值
+        :param value_add: 状态值的增量
+        :return:
+        """
+        self.last_record_time[state_id] = trigger_time
+        if not self.has_value[state_id]:
+            self.last_value[state_id] = 0
+            self.has_value[state_id] = True
+
+        if value is not None:
+            self.last_value[state_id] = value
+
+        if value_add is not None:
+            self.last_value[state_id] += value_add
+
+        self._on_change(state_id)
+
+        for group_id in self._state_group_list[state_id]:
+            last_state_id = self._group_last_state[group_id]
+            if last_state_id != state_id:
+                if last_state_id != -1:
+                    self.clear_record(last_state_id)
+                self._group_last_state[group_id] = state_id
+
+        for mutex_state_id in self._state_mutex_list[state_id]:
+            self.clear_record(mutex_state_id)
+
+    def clear_record(self, state_id: int) -> None:
+        """
+        清空状态 原来没有出现过的话 就不重置
+        :param state_id: 状态id
+        :return:
+        """
+        record_time = self.last_record_time[state_id]
+        if record_time == -1:
+            return
+        if record_time == 0 and not self.has_value[state_id]:
+            # 已经是清空的状态
+            return
+        self.last_record_time[state_id] = 0
+        self.has_value[state_id] = False
+        self._on_change(state_id)
+
+    def clear_records(self, state_ids: np.ndarray) -> None:
+        """
+        批量清空状态 只处理出现过且还没有被清空的状态
+        :param state_ids: 状态id数组
+        :return:
+        """
+        record_time = self.last_record_time[state_ids]
+        changed_ids = state_ids[(record_time != -1) & ((record_time != 0) | self.has_value[state_ids])]
+        if len(changed_ids) == 0:
+            return
+
+        self.last_record_time[changed_ids] = 0
+        self.has_value[changed_ids] = False
+        for state_id in changed_ids.tolist():
+            self._on_change(state_id)
+
+    def get_last_value(self, state_id: int) -> Optional[int]:
+        """
+        获取上一次记录的值
+        :param state_id: 状态id
+        :return: 没有值时返回None
+        """
+        if not self.has_value[state_id]:
+            return None
+        return int(self.last_value[state_id])
+
+    def set_last_value(self, state_id: int, value: Optional[int]) -> None:
+        """
+        直接设置值 不触发互斥
+        :param state_id: 状态id
+        :param value: 值
+        :return:
+        """
+        if value is None:
+            self.has_value[state_id] = False
+        else:
+            self.last_value[state_id] = value
+            self.has_value[state_id] = True
+        self._on_change(state_id)
+
+    def set_last_record_time(self, state_id: int, record_time: float) -> None:
+        """
+        直接设置记录时间 不触发互斥
+        :param state_id: 状态id
+        :param record_time: 记录时间
+        :return:
+        """
+        self.last_record_time[state_id] = record_time
+        self._on_change(state_id)
+
+    def add_change_callback(self, state_id: int, callback: Callable[[], None]) -> None:
+        """
+        增加状态变化时的回调
+        :param state_id: 状态id
+        :param callback: 回调
+        :return:
+        """
+        self._change_callback_list[state_id].append(callback)
+
+    def remove_change_callback(self, state_id: int, callback: Callable[[], None]) -> None:
+        """
+        移除状态变化时的回调
+        :param state_id: 状态id
+        :param callback: 回调
+        :return:
+        """
+        callback_list = self._change_callback_list[state_id]
+        if callback in callback_list:
+            callback_list.remove(callback)
+
+    def _on_change(self, state_id: int) -> None:
+        """
+        状态变化后 通知依赖方
+        :param state_id: 状态id
+        :return:
+        """
+        for callback in self._change_callback_list[state_id]:
+            callback()
+
+
 class StateRecorder:
 
-    def __init__(self, state_name: str, mutex_list: Optional[List[str]] = None):
+    def __init__(self, state_name: str, mutex_list: Optional[List[str]] = None,
+                 store: Optional[StateRecorderStore] = None):
+        """
+        一个状态的记录器 实际数据保存在 StateRecorderStore 中
+        互斥的状态需要在同一个 StateRecorderStore 中
+        :param state_name: 状态名称
+        :param mutex_list: 互斥的状态 这种状态出现的时候 就会将自身状态清空 需要同时传入共用的 store
+        :param store: 状态记录的存储 为空时单独使用一个
+        """
+        if store is None and mutex_list is not None and len(mutex_list) > 0:
+            # 单独的存储中没有互斥的状态 互斥不会生效
+            raise ValueError('状态 %s 设置了互斥状态 需要传入共用的 StateRecorderStore' % state_name)
+        self.store: StateRecorderStore = StateRecorderStore(capacity=1) if store is None else store
+        self.state_id: int = self.store.get_state_id(state_name)
         self.state_name: str = state_name
         self.mutex_list: List[str] = mutex_list  # 互斥的状态 这种状态出现的时候 就会将自身状态清空
+        if mutex_list is not None and len(mutex_list) > 0:
+            self.store.add_mutex(state_name, mutex_list)
+
+    @property
+    def last_record_time(self) -> float:
+        """
+        上次记录这个状态的时间 -1代表还没有触发过 0代表被清除
+        """
+        return float(self.store.last_record_time[self.state_id])
 
-        self.last_record_time: float = -1  # 上次记录这个状态的时间 -1代表还没有触发过 0代表被清除
-        self.last_value: Optional[int] = None  # 上一次记录的值
+    @last_record_time.setter
+    def last_record_time(self, new_value: float) -> None:
+        self.store.set_last_record_time(self.state_id, new_value)
+
+    @property
+    def last_value(self) -> Optional[int]:
+        """
+        上一次记录的值
+        """
+        return self.store.get_last_value(self.state_id)
+
+    @last_value.setter
+    def last_value(self, new_value: Optional[int]) -> None:
+        self.store.set_last_value(self.state_id, new_value)
 
     def update_state_record(self, record: StateRecord) -> None:
         """
-        状态事件被触发时 记录触发的时间
+        状态事件被触发时 记录触发的时间 同时清空互斥的状态
         :param record:
         :return:
         """
-        self.last_record_time = record.trigger_time
-        if self.last_value is None:
-            self.last_value = 0
-
-        if record.value is not None:
-            self.last_value = record.value
-
-        if record.value_add is not None:
-            self.last_value += record.value_add
+        self.store.update_record(self.state_id, record.trigger_time, value=record.value, value_add=record.value_add)
 
     def clear_state_record(self) -> None:
         """
         互斥事件发生时 清空
         """
-        if self.last_record_time == -1:
-            # 原来没有出现过的话 就不重置
-            return
-        self.last_record_time = 0
-        self.last_value = None
+        self.store.clear_record(self.state_id)
+
+    def add_change_callback(self, callback: Callable[[], None]) -> None:
+        """
+        增加状态变化时的回调
+        :param callback: 回调
+        :return:
+        """
+        self.store.add_change_callback(self.state_id, callback)
+
+    def remove_change_callback(self, callback: Callable[[], None]) -> None:
+        """
+        移除状态变化时的回调
+        :param callback: 回调
+        :return:
+        """
+        self.store.remove_change_callback(self.state_id, callback)
 
     def dispose(self) -> None:
         """
@@ -59,5 +330,73 @@ class StateRecorder:
         """
         self.state_name = None
         self.mutex_list = None
-        self.last_value = None
-        self.last_value = None
+
+
+def __debug_store_benchmark():
+    """
+    模拟自动战斗中的角色状态互斥 对比原来按名称逐个清空互斥状态 和使用存储的耗时、互斥关系占用
+    每帧更新 前台、后台-1、后台-2、连携技、快速支援 等状态
+    """
+    import random
+    import sys
+    import time
+
+    class _LegacyRecorder:
+
+        def __init__(self, mutex_list: Optional[List[str]]):
+            self.mutex_list = mutex_list
+            self.last_record_time: float = -1
+            self.last_value: Optional[int] = None
+
+    prefix_list = ['前台-', '后台-1-', '后台-2-', '快速支援-', '切换角色-', '连携技-1-', '连携技-2-']
+    for agent_cnt in [30, 60, 120]:
+        agent_name_list = ['角色%d' % i for i in range(agent_cnt)]
+
+        legacy_mutex: dict[str, List[str]] = {}
+        for agent_name in agent_name_list:
+            others = [i for i in agent_name_list if i != agent_name]
+            for prefix in prefix_list:
+                legacy_mutex[prefix + agent_name] = [prefix + i for i in others]
+        legacy_size = sum(sys.getsizeof(v) + sum(sys.getsizeof(i) for i in v) for v in legacy_mutex.values())
+        legacy_recorders = {k: _LegacyRecorder(v) for k, v in legacy_mutex.items()}
+
+        store = StateRecorderStore()
+        for prefix in prefix_list:
+            store.add_mutex_group([prefix + i for i in agent_name_list])
+        store_size = sum(i.nbytes for i in store.mutex_group_list)
+        recorders = {k: StateRecorder(k, store=store) for k in legacy_mutex.keys()}
+
+        random.seed(0)
+        frame_list = [[p + random.choice(agent_name_list) for p in prefix_list] for _ in range(2000)]
+
+        start = time.perf_counter()
+        for frame_idx, frame in enumerate(frame_list):
+            for state_name in frame:
+                recorder = legacy_recorders[state_name]
+                recorder.last_record_time = frame_idx + 1
+                if recorder.last_value is None:
+                    recorder.last_value = 0
+                for mutex_state in recorder.mutex_list:
+                    mutex_recorder = legacy_recorders.get(mutex_state)
+                    if mutex_recorder is None or mutex_recorder.last_record_time == -1:
+                        continue
+                    mutex_recorder.last_record_time = 0
+                    mutex_recorder.last_value = None
+        legacy_cost = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for frame_idx, frame in enumerate(frame_list):
+            for state_name in frame:
+                recorders[state_name].update_state_record(StateRecord(state_name, frame_idx + 1))
+        store_cost = time.perf_counter() - start
+
+        same = all(legacy_recorders[k].last_record_time == recorders[k].last_record_time for k in legacy_mutex.keys())
+        print('角色 %d 个 原方式 %.1f 微秒/状态 互斥表 %d KB 存储 %.1f 微秒/状态 互斥表 %d KB 结果一致 %s' % (
+            agent_cnt,
+            legacy_cost * 1e6 / (len(frame_list) * len(prefix_list)), legacy_size // 1024,
+            store_cost * 1e6 / (len(frame_list) * len(prefix_list)), store_size // 1024,
+            same))
+
+
+if __name__ == '__main__':
+    __debug_store_benchmark()
@@ -1,7 +1,7 @@
 import time
 
 from cv2.typing import MatLike
-from typing import List
+from typing import List, Optional
 
 from one_dragon.base.geometry.point import Point
 
@@ -55,11 +55,14 @@ class ControllerBase:
         截图并保存在内存中
         """
         self.before_screenshot()
-        now = time.time()
-        screen = self.get_screenshot(independent)
-        fix_screen = self.fill_uid_black(screen)
-
-        self.screenshot_history.append(ScreenshotWithTime(fix_screen, now))
+        frame: Optional[ScreenshotWithTime] = self.capture_screenshot(independent)
+        if frame is None:
+            now = time.time()
+            screen = self.get_screenshot(independent)
+            frame = ScreenshotWithTime(self.fill_uid_black(screen), now)
+        now = frame.create_time
+
+        self.screenshot_history.append(frame)
         while len(self.screenshot_history) > self.max_screenshot_cnt:
             self.screenshot_history.pop(0)
 
@@ -67,7 +70,14 @@ class ControllerBase:
             and now - self.screenshot_history[0].create_time > self.screenshot_alive_seconds):
             self.screenshot_history.pop(0)
 
-        return fix_screen
+        return frame.image
+
+    def capture_screenshot(self, independent: bool = False) -> Optional[ScreenshotWithTime]:
+        """
+        使用预分配缓冲区的截图 已经遮挡UID 由子类实现
+        :return: 不支持时返回None 使用 get_screenshot 和 fill_uid_black
+        """
+        return None
 
     def before_screenshot(self) -> None:
         """
@@ -83,9 +93,11 @@ class ControllerBase:
         """
         pass
 
-    def fill_uid_black(self, screen: MatLike) -> MatLike:
+    def fill_uid_black(self, screen: MatLike, new_image: bool = True) -> MatLike:
         """
         遮挡UID 由子类实现
+        :param screen: 截图
+        :param new_image: 是否复制一张新图 否则直接修改原图
         """
         pass
 
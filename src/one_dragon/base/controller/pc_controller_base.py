@@ -10,13 +10,14 @@ from functools import lru_cache
 from pynput import keyboard
 from typing import Optional
 
-from one_dragon.base.controller.controller_base import ControllerBase
+from one_dragon.base.controller.controller_base import ControllerBase, ScreenshotWithTime
 from one_dragon.base.controller.pc_button import pc_button_utils
 from one_dragon.base.controller.pc_button.ds4_button_controller import Ds4ButtonController
 from one_dragon.base.controller.pc_button.keyboard_mouse_controller import KeyboardMouseController
 from one_dragon.base.controller.pc_button.pc_button_controller import PcButtonController
 from one_dragon.base.controller.pc_button.xbox_button_controller import XboxButtonController
 from one_dragon.base.controller.pc_game_window import PcGameWindow
+from one_dragon.base.controller.screenshot_pipeline import ScreenshotPipeline, ScreenshotSource, MssScreenshotSource
 from one_dragon.base.geometry.point import Point
 from one_dragon.base.geometry.rectangle import Rect
 from one_dragon.utils.log_utils import log
@@ -43,6 +44,11 @@ class PcControllerBase(ControllerBase):
 
         self.btn_controller: PcButtonController = self.keyboard_controller
         self.sct = None
+        self.screenshot_source: Optional[ScreenshotSource] = None
+        self.screenshot_pipeline: ScreenshotPipeline = ScreenshotPipeline(
+            standard_width=standard_width, standard_height=standard_height,
+            buffer_cnt=self.max_screenshot_cnt + 2
+        )
 
     def init_before_context_run(self) -> bool:
         pyautogui.FAILSAFE = False  # 禁用 Fail-Safe,防止鼠标接近屏幕的边缘或角落时报错
@@ -51,11 +57,14 @@ class PcControllerBase(ControllerBase):
                 self.sct.close()
             except Exception:
                 pass
+        self.screenshot_source = None
         try:
             import mss
             self.sct = mss.mss()
+            self.screenshot_source = MssScreenshotSource(self.sct)
         except Exception:
             pass
+        self.screenshot_pipeline.reset_stats()
         self.active_window()
 
         return True
@@ -117,6 +126,23 @@ class PcControllerBase(ControllerBase):
             self.keyboard_controller.keyboard.release(keyboard.Key.alt)
         return True
 
+    def capture_screenshot(self, independent: bool = False) -> Optional[ScreenshotWithTime]:
+        """
+        使用截图流水线截图 写入预分配的缓冲区 并原地遮挡UID
+        :param independent: 是否独立截图 独立截图时不使用流水线
+        :return: 只读的截图 不支持时返回None
+        """
+        if independent or self.screenshot_source is None:
+            return None
+        try:
+            return self.screenshot_pipeline.capture(
+                self.screenshot_source, self.game_win.win_rect,
+                post_process=lambda img: self.fill_uid_black(img, new_image=False)
+            )
+        except Exception:
+            log.error('截图失败', exc_info=True)
+            return None
+
     def get_screenshot(self, independent: bool = False) -> MatLike:
         """
         截图 如果分辨率和默认不一样则进行缩放
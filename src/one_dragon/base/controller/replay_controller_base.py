@@ -0,0 +1,315 @@
+import os
+import re
+import threading
+import time
+
+import cv2
+import numpy as np
+from cv2.typing import MatLike
+from typing import List, Optional
+
+from one_dragon.base.controller.controller_base import ControllerBase, ScreenshotWithTime
+from one_dragon.base.controller.pc_button.pc_button_controller import PcButtonController
+from one_dragon.base.geometry.point import Point
+from one_dragon.utils import cv2_utils
+from one_dragon.utils.log_utils import log
+
+
+_IMAGE_SUFFIX_LIST = ['.png', '.jpg', '.jpeg', '.bmp']
+
+
+class ReplayFrame:
+
+    def __init__(self, image: MatLike, record_time: float, name: str):
+        """
+        回放的一帧
+        :param image: RGB 图片
+        :param record_time: 相对第一帧的时间(秒)
+        :param name: 来源 文件名或视频帧号
+        """
+        self.image: MatLike = image
+        self.record_time: float = record_time
+        self.name: str = name
+
+
+def _to_standard_frame(image: MatLike, standard_width: int, standard_height: int) -> MatLike:
+    """
+    转化成标准大小的只读 RGB 图片
+    """
+    if image.ndim == 3 and image.shape[2] == 4:
+        image = image[:, :, :3]
+    if image.shape[1] != standard_width or image.shape[0] != standard_height:
+        image = cv2.resize(image, (standard_width, standard_height))
+    image = np.ascontiguousarray(image)
+    image.flags.writeable = False
+    return image
+
+
+def load_replay_frames(replay_path: str,
+                       fps: Optional[float] = None,
+                       standard_width: int = 1920,
+                       standard_height: int = 1080,
+                       max_frame_cnt: Optional[int] = None) -> List[ReplayFrame]:
+    """
+    读取录制的画面
+    - 文件夹: 按文件名中的毫秒时间戳排序(例如 .debug/images 中的 _1735134333210.png) 没有时间戳时按文件名排序
+    - 视频文件: 使用视频自带的时间
+    :param replay_path: 文件夹或视频路径
+    :param fps: 指定帧率时 忽略录制的时间 按固定间隔回放
+    :param standard_width: 标准宽度
+    :param standard_height: 标准高度
+    :param max_frame_cnt: 最多读取多少帧
+    :return:
+    """
+    frame_list: List[ReplayFrame] = []
+    recorded_time_list: List[Optional[float]] = []
+
+    if os.path.isdir(replay_path):
+        file_list = []
+        for file_name in os.listdir(replay_path):
+            if os.path.splitext(file_name)[1].lower() not in _IMAGE_SUFFIX_LIST:
+                continue
+            match = re.search(r'(\d{13})', file_name)
+            file_list.append((int(match.group(1)) / 1000.0 if match is not None else None, file_name))
+
+        if all(i[0] is not None for i in file_list):
+            file_list.sort(key=lambda i: (i[0], i[1]))
+        else:
+            file_list = [(None, i[1]) for i in sorted(file_list, key=lambda i: i[1])]
+
+        for record_time, file_name in file_list:
+            if max_frame_cnt is not None and len(frame_list) >= max_frame_cnt:
+                break
+            image = cv2_utils.read_image(os.path.join(replay_path, file_name))
+            if image is None or image.ndim != 3:
+                continue
+            frame_list.append(ReplayFrame(_to_standard_frame(image, standard_width, standard_height), 0, file_name))
+            recorded_time_list.append(record_time)
+    elif os.path.isfile(replay_path):
+        cap = cv2.VideoCapture(replay_path)
+        try:
+            while max_frame_cnt is None or len(frame_list) < max_frame_cnt:
+                pos_ms = cap.get(cv2.CAP_PROP_POS_MSEC)
+                ret, image = cap.read()
+                if not ret:
+                    break
+                image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+                frame_list.append(ReplayFrame(_to_standard_frame(image, standard_width, standard_height), 0,
+                                              'frame_%d' % len(frame_list)))
+                recorded_time_list.append(pos_ms / 1000.0)
+        finally:
+            cap.release()
+
+    if fps is None and len(recorded_time_list) > 0 and all(t is not None for t in recorded_time_list):
+        first_time = recorded_time_list[0]
+        for frame, t in zip(frame_list, recorded_time_list):
+            frame.record_time = t - first_time
+    else:
+        interval = 1.0 / (fps if fps is not None and fps > 0 else 30)
+        for idx, frame in enumerate(frame_list):
+            frame.record_time = idx * interval
+
+    return frame_list
+
+
+class ReplayButtonController(PcButtonController):
+
+    def __init__(self):
+        """
+        回放时使用的按键 不进行任何操作 只记录次数
+        """
+        PcButtonController.__init__(self)
+        self.input_cnt: int = 0
+
+    def tap(self, key: str) -> None:
+        self.input_cnt += 1
+
+    def press(self, key: str, press_time: Optional[float] = None) -> None:
+        self.input_cnt += 1
+
+    def release(self, key: str) -> None:
+        self.input_cnt += 1
+
+
+class ReplayControllerBase(ControllerBase):
+
+    def __init__(self, replay_path: str,
+                 fps: Optional[float] = None,
+                 realtime: bool = True,
+                 loop: bool = False,
+                 speed: float = 1,
+                 standard_width: int = 1920,
+                 standard_height: int = 1080,
+                 max_frame_cnt: Optional[int] = None):
+        """
+        回放录制画面的控制器 用于在没有游戏窗口的环境中 测量识别流程的吞吐和延迟
+        所有操作都不会真正执行
+        :param replay_path: 录制画面的文件夹或视频
+        :param fps: 回放帧率 为空时使用录制的时间
+        :param realtime: True 时按时间回放 跟不上时跳过中间的帧 和真实截图一致
+                         False 时每次截图都返回下一帧 结果可复现
+        :param loop: 回放结束后是否从头开始 不循环时停留在最后一帧 并认为游戏窗口已关闭
+        :param speed: 回放速度倍数
+        :param standard_width: 标准宽度
+        :param standard_height: 标准高度
+        :param max_frame_cnt: 最多读取多少帧
+        """
+        ControllerBase.__init__(self)
+        self.replay_path: str = replay_path
+        self.fps: Optional[float] = fps
+        self.realtime: bool = realtime
+        self.loop: bool = loop
+        self.speed: float = speed if speed > 0 else 1
+        self.standard_width: int = standard_width
+        self.standard_height: int = standard_height
+        self.max_frame_cnt: Optional[int] = max_frame_cnt
+
+        self.game_win = None
+        self.btn_controller: ReplayButtonController = ReplayButtonController()
+        self.keyboard_controller: ReplayButtonController = self.btn_controller
+
+        self._lock = threading.Lock()
+        self.frame_list: List[ReplayFrame] = []
+        self._start_time: Optional[float] = None
+        self._next_idx: int = 0  # 非实时回放时 下一次截图返回的帧
+        self.finished: bool = False
+
+        # 统计
+        self.screenshot_cnt: int = 0
+        self.served_idx_set: set = set()  # 被返回过的帧
+        self.click_cnt: int = 0
+
+        self.load_frames()
+
+    def load_frames(self) -> None:
+        """
+        读取录制的画面
+        :return:
+        """
+        self.frame_list = load_replay_frames(self.replay_path, fps=self.fps,
+                                             standard_width=self.standard_width,
+                                             standard_height=self.standard_height,
+                                             max_frame_cnt=self.max_frame_cnt)
+        log.info('回放画面 %s 共 %d 帧 时长 %.2f 秒', self.replay_path, len(self.frame_list), self.duration)
+        self.reset_replay()
+
+    def reset_replay(self) -> None:
+        """
+        从头开始回放
+        :return:
+        """
+        with self._lock:
+            self._start_time = None
+            self._next_idx = 0
+            self.finished = False
+            self.screenshot_cnt = 0
+            self.served_idx_set = set()
+
+    @property
+    def duration(self) -> float:
+        """
+        回放时长(秒)
+        """
+        return self.frame_list[-1].record_time if len(self.frame_list) > 0 else 0
+
+    def init_before_context_run(self) -> bool:
+        self.reset_replay()
+        return len(self.frame_list) > 0
+
+    @property
+    def is_game_window_ready(self) -> bool:
+        return len(self.frame_list) > 0 and not self.finished
+
+    def _next_frame_idx(self, now: float) -> int:
+        """
+        本次截图应该返回的帧 需要在持有锁时调用
+        :param now: 当前时间
+        :return:
+        """
+        frame_cnt = len(self.frame_list)
+        if not self.realtime:
+            idx = self._next_idx
+            self._next_idx += 1
+            if idx >= frame_cnt:
+                if self.loop:
+                    idx = idx % frame_cnt
+                else:
+                    self.finished = True
+                    idx = frame_cnt - 1
+            return idx
+
+        if self._start_time is None:
+            self._start_time = now
+        elapsed = (now - self._start_time) * self.speed
+        if self.loop and self.duration > 0:
+            elapsed = elapsed % (self.duration + 1e-6)
+        elif elapsed > self.duration:
+            self.finished = True
+
+        # 最后一个 录制时间不晚于已回放时间 的帧
+        lo, hi = 0, frame_cnt - 1
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self.frame_list[mid].record_time <= elapsed:
+                lo = mid
+            else:
+                hi = mid - 1
+        return lo
+
+    def capture_screenshot(self, independent: bool = False) -> Optional[ScreenshotWithTime]:
+        if len(self.frame_list) == 0:
+            return None
+        with self._lock:
+            now = time.time()
+            idx = self._next_frame_idx(now)
+            self.screenshot_cnt += 1
+            self.served_idx_set.add(idx)
+        return ScreenshotWithTime(self.frame_list[idx].image, now)
+
+    def get_screenshot(self, independent: bool = False) -> MatLike:
+        frame = self.capture_screenshot(independent)
+        return None if frame is None else frame.image
+
+    def fill_uid_black(self, screen: MatLike, new_image: bool = True) -> MatLike:
+        """
+        录制的画面不需要再遮挡
+        """
+        return screen
+
+    def click(self, pos: Point = None, press_time: float = 0, pc_alt: bool = False) -> bool:
+        self.click_cnt += 1
+        return True
+
+    def scroll(self, down: int, pos: Point = None):
+        self.click_cnt += 1
+
+    def drag_to(self, end: Point, start: Point = None, duration: float = 0.5):
+        self.click_cnt += 1
+
+    def mouse_move(self, game_pos: Point):
+        pass
+
+    def active_window(self) -> None:
+        pass
+
+    def enable_keyboard(self):
+        pass
+
+    def enable_xbox(self):
+        pass
+
+    def enable_ds4(self):
+        pass
+
+    @property
+    def stats_display_text(self) -> str:
+        """
+        统计的展示文本
+        :return:
+        """
+        served_cnt = len(self.served_idx_set)
+        return '回放 截图 %d 次 返回 %d/%d 帧 跳过 %d 帧 点击 %d 次 按键 %d 次' % (
+            self.screenshot_cnt, served_cnt, len(self.frame_list),
+            max(0, (max(self.served_idx_set) + 1 if served_cnt > 0 else 0) - served_cnt),
+            self.click_cnt, self.btn_controller.input_cnt
+        )
@@ -0,0 +1,263 @@
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+from typing import Callable, List, Optional
+
+from one_dragon.base.controller.controller_base import ScreenshotWithTime
+from one_dragon.base.geometry.rectangle import Rect
+from one_dragon.utils.latency_histogram import LatencyHistogram
+
+
+class ScreenshotSource:
+
+    def grab(self, rect: Rect) -> Optional[np.ndarray]:
+        """
+        截取屏幕的一个区域
+        由子类实现
+        :param rect: 屏幕区域
+        :return: BGRA 格式的图片 (h, w, 4) 可以是内部缓存的视图 只保证在下一次截图前有效
+        """
+        pass
+
+    def close(self) -> None:
+        """
+        释放资源
+        :return:
+        """
+        pass
+
+
+class MssScreenshotSource(ScreenshotSource):
+
+    def __init__(self, sct):
+        """
+        使用 mss 截图 直接使用 mss 返回的内存 不额外复制
+        :param sct: mss.mss() 的实例
+        """
+        self.sct = sct
+
+    def grab(self, rect: Rect) -> Optional[np.ndarray]:
+        monitor = {"top": rect.y1, "left": rect.x1, "width": rect.width, "height": rect.height}
+        shot = self.sct.grab(monitor)
+        return np.frombuffer(shot.raw, dtype=np.uint8).reshape((shot.height, shot.width, 4))
+
+    def close(self) -> None:
+        try:
+            self.sct.close()
+        except Exception:
+            pass
+
+
+class SyntheticScreenshotSource(ScreenshotSource):
+
+    def __init__(self, width: int = 1920, height: int = 1080, seed: int = 0):
+        """
+        合成的画面 用于在没有游戏窗口的环境中测试截图流程
+        每次截图时 画面中有一个色块会移动 保证相邻两帧内容不同
+        :param width: 画面宽度 截图区域与之不同时按截图区域重新生成
+        :param height: 画面高度
+        :param seed: 随机种子
+        """
+        self.seed: int = seed
+        self.frame_cnt: int = 0
+        self._background: Optional[np.ndarray] = None
+        self._frame: Optional[np.ndarray] = None
+        self._init_frame(width, height)
+
+    def _init_frame(self, width: int, height: int) -> None:
+        rng = np.random.default_rng(self.seed)
+        self._background = rng.integers(0, 256, size=(height, width, 4), dtype=np.uint8)
+        self._background[:, :, 3] = 255
+        self._frame = self._background.copy()
+
+    def grab(self, rect: Rect) -> Optional[np.ndarray]:
+        if self._frame.shape[0] != rect.height or self._frame.shape[1] != rect.width:
+            self._init_frame(rect.width, rect.height)
+
+        height, width = self._frame.shape[:2]
+        block = max(1, min(width, height) // 10)
+        # 只恢复上一帧色块的位置 再画新的色块
+        prev_x = ((self.frame_cnt - 1) * block) % max(1, width - block) if self.frame_cnt > 0 else 0
+        self._frame[:block, prev_x:prev_x + block] = self._background[:block, prev_x:prev_x + block]
+        x = (self.frame_cnt * block) % max(1, width - block)
+        self._frame[:block, x:x + block] = (0, 0, 255, 255)
+        self.frame_cnt += 1
+        return self._frame
+
+
+class ScreenshotPipeline:
+
+    def __init__(self, standard_width: int = 1920, standard_height: int = 1080,
+                 buffer_cnt: int = 12,
+                 read_only: bool = True):
+        """
+        截图流水线 颜色转换和缩放直接写入预先分配好的环形缓冲区 避免每次截图都申请多张整图的内存
+        返回的图片是缓冲区的只读视图
+        缓冲区仍被外部引用时(例如截图历史、正在进行的识别) 会跳过不复用 全部都被引用时才新申请一个
+        :param standard_width: 标准宽度 截图区域大小不同时缩放到标准大小
+        :param standard_height: 标准高度
+        :param buffer_cnt: 初始的缓冲区数量 应该大于截图历史的数量
+        :param read_only: 返回的图片是否只读
+        """
+        self.standard_width: int = standard_width
+        self.standard_height: int = standard_height
+        self.read_only: bool = read_only
+
+        self._lock = threading.Lock()
+        self._buffer_list: List[np.ndarray] = []
+        self._cursor: int = 0
+        self._scale_buffer: Optional[np.ndarray] = None  # 需要缩放时 颜色转换的中间结果
+
+        # 统计
+        self.capture_cnt: int = 0
+        self.alloc_cnt: int = 0  # 申请整图内存的次数
+        self.skip_cnt: int = 0  # 缓冲区仍被引用而跳过的次数
+        self.grab_latency: LatencyHistogram = LatencyHistogram('截图')
+        self.process_latency: LatencyHistogram = LatencyHistogram('转换')
+
+        for _ in range(max(1, buffer_cnt)):
+            self._buffer_list.append(self._new_buffer())
+
+    def _new_buffer(self) -> np.ndarray:
+        self.alloc_cnt += 1
+        return np.empty((self.standard_height, self.standard_width, 3), dtype=np.uint8)
+
+    def _acquire_buffer(self) -> np.ndarray:
+        """
+        取下一个没有被外部引用的缓冲区
+        :return:
+        """
+        buffer_len = len(self._buffer_list)
+        for i in range(buffer_len):
+            idx = (self._cursor + i) % buffer_len
+            # 引用来源: 列表本身 + getrefcount 的参数 其余的都是外部持有的视图
+            if sys.getrefcount(self._buffer_list[idx]) <= 2:
+                self._cursor = (idx + 1) % buffer_len
+                return self._buffer_list[idx]
+            self.skip_cnt += 1
+
+        buffer = self._new_buffer()
+        self._buffer_list.insert(self._cursor, buffer)
+        self._cursor = (self._cursor + 1) % len(self._buffer_list)
+        return buffer
+
+    def capture(self, source: ScreenshotSource, rect: Rect,
+                post_process: Optional[Callable[[np.ndarray], None]] = None) -> Optional[ScreenshotWithTime]:
+        """
+        截图
+        :param source: 截图来源
+        :param rect: 截图区域
+        :param post_process: 在只读之前 对图片进行原地修改 例如遮挡UID
+        :return: RGB 格式的标准大小截图 截图失败时返回None
+        """
+        with self._lock:
+            create_time = time.time()
+            start = time.perf_counter()
+            raw = source.grab(rect)
+            grab_end = time.perf_counter()
+            self.grab_latency.record(grab_end - start)
+            if raw is None:
+                return None
+
+            buffer = self._acquire_buffer()
+            height, width = raw.shape[:2]
+            if width == self.standard_width and height == self.standard_height:
+                cv2.cvtColor(raw, cv2.COLOR_BGRA2RGB, dst=buffer)
+            else:
+                if self._scale_buffer is None or self._scale_buffer.shape[:2] != (height, width):
+                    self.alloc_cnt += 1
+                    self._scale_buffer = np.empty((height, width, 3), dtype=np.uint8)
+                cv2.cvtColor(raw, cv2.COLOR_BGRA2RGB, dst=self._scale_buffer)
+                cv2.resize(self._scale_buffer, (self.standard_width, self.standard_height), dst=buffer)
+
+            if post_process is not None:
+                post_process(buffer)
+
+            image = buffer.view()
+            if self.read_only:
+                image.flags.writeable = False
+
+            self.capture_cnt += 1
+            self.process_latency.record(time.perf_counter() - grab_end)
+
+            return ScreenshotWithTime(image, create_time)
+
+    @property
+    def buffer_cnt(self) -> int:
+        return len(self._buffer_list)
+
+    def reset_stats(self) -> None:
+        """
+        清空统计
+        :return:
+        """
+        with self._lock:
+            self.capture_cnt = 0
+            self.alloc_cnt = 0
+            self.skip_cnt = 0
+            self.grab_latency.reset()
+            self.process_latency.reset()
+
+    @property
+    def stats_display_text(self) -> str:
+        """
+        统计的展示文本
+        :return:
+        """
+        return '截图 %d 次 缓冲区 %d 个 申请内存 %d 次 跳过仍被引用的缓冲区 %d 次 | %s | %s' % (
+            self.capture_cnt, self.buffer_cnt, self.alloc_cnt, self.skip_cnt,
+            self.grab_latency.display_text, self.process_latency.display_text
+        )
+
+
+def __debug_pipeline_benchmark():
+    """
+    使用合成画面 对比原来每次新建图片的截图方式 和 截图流水线 的耗时和内存申请
+    同时模拟保留最近10张截图的截图历史
+    """
+    source = SyntheticScreenshotSource()
+    history_cnt = 10
+    times = 300
+
+    for width, height in [(1920, 1080), (2560, 1440)]:
+        rect = Rect(0, 0, width, height)
+
+        history: List[np.ndarray] = []
+        start = time.perf_counter()
+        for _ in range(times):
+            screen = cv2.cvtColor(np.array(source.grab(rect)), cv2.COLOR_BGRA2RGB)
+            if width != 1920:
+                screen = cv2.resize(screen, (1920, 1080))
+            screen = screen.copy()  # 原来遮挡UID时复制一张新图
+            history.append(screen)
+            if len(history) > history_cnt:
+                history.pop(0)
+        old_cost = time.perf_counter() - start
+
+        pipeline = ScreenshotPipeline()
+        history = []
+        start = time.perf_counter()
+        for _ in range(times):
+            frame = pipeline.capture(source, rect, post_process=lambda img: img[0:10, 0:10].fill(0))
+            history.append(frame.image)
+            if len(history) > history_cnt:
+                history.pop(0)
+        new_cost = time.perf_counter() - start
+
+        # 正确性 最新一帧与直接转换的结果一致
+        expected = cv2.cvtColor(source._frame, cv2.COLOR_BGRA2RGB)
+        if width != 1920:
+            expected = cv2.resize(expected, (1920, 1080))
+        expected[0:10, 0:10] = 0
+        same = np.array_equal(expected, history[-1])
+
+        print('%dx%d 原方式 %.2f 毫秒/次 每次申请 %d 张整图 | 流水线 %.2f 毫秒/次 结果一致 %s' % (
+            width, height, old_cost * 1000 / times, 4 if width != 1920 else 3, new_cost * 1000 / times, same))
+        print(pipeline.stats_display_text)
+
+
+if __name__ == '__main__':
+    __debug_pipeline_benchmark()
@@ -1,6 +1,7 @@
 from cv2.typing import MatLike
+from typing import List, Optional
 
-from one_dragon.base.matcher.match_result import MatchResultList
+from one_dragon.base.matcher.match_result import MatchResult, MatchResultList
 
 
 class OcrMatcher:
@@ -32,3 +33,28 @@ class OcrMatcher:
         :return: {key_word: []}
         """
         pass
+
+    def run_ocr_batch(self, image_list: List[MatLike], threshold: float = None,
+                      merge_line_distance: float = -1,
+                      single_line_list: Optional[List[bool]] = None) -> List[dict[str, MatchResultList]]:
+        """
+        对多张图片进行OCR 默认逐张识别 子类可以合并成一次模型调用
+        :param image_list: 图片列表
+        :param threshold: 匹配阈值
+        :param merge_line_distance: 多少行距内合并结果 -1为不合并
+        :param single_line_list: 每张图片是否只有单行文本 是的话不进行文本检测 整张图片作为一个文本框
+        :return: 与图片一一对应的 {key_word: []}
+        """
+        result_list: List[dict[str, MatchResultList]] = []
+        for idx, image in enumerate(image_list):
+            if single_line_list is not None and single_line_list[idx]:
+                text = self.run_ocr_single_line(image, threshold=threshold)
+                result_map: dict[str, MatchResultList] = {}
+                if text is not None and len(text) > 0:
+                    mrl = MatchResultList(only_best=False)
+                    mrl.append(MatchResult(1, 0, 0, image.shape[1], image.shape[0], data=text))
+                    result_map[text] = mrl
+                result_list.append(result_map)
+            else:
+                result_list.append(self.run_ocr(image, threshold=threshold, merge_line_distance=merge_line_distance))
+        return result_list
@@ -0,0 +1,215 @@
+import hashlib
+import sys
+import threading
+import time
+from collections import OrderedDict
+from cv2.typing import MatLike
+from typing import Any, Hashable, Tuple
+
+import numpy as np
+
+from one_dragon.base.matcher.match_result import MatchResult, MatchResultList
+
+
+class _OcrCacheEntry:
+
+    def __init__(self, value: Any, size: int, create_time: float):
+        self.value: Any = value
+        self.size: int = size
+        self.create_time: float = create_time
+
+
+class OcrResultCache:
+
+    def __init__(self, max_memory_bytes: int = 4 * 1024 * 1024,
+                 ttl_seconds: float = 300,
+                 max_entries: int = 4096):
+        """
+        OCR结果缓存 以图片内容的哈希值和识别参数作为key
+        菜单按钮、固定位置的文本区域等 会以完全相同的画面反复OCR 命中时直接返回上一次的结果
+        返回的是结果的副本 使用方可以修改(例如 add_offset)
+        :param max_memory_bytes: 缓存结果占用内存的上限(估算) 超过时淘汰最久未使用的
+        :param ttl_seconds: 结果的有效时间 0为不过期
+        :param max_entries: 最多缓存多少个结果
+        """
+        self.max_memory_bytes: int = max_memory_bytes
+        self.ttl_seconds: float = ttl_seconds
+        self.max_entries: int = max_entries
+        self.enabled: bool = True
+
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Hashable, _OcrCacheEntry] = OrderedDict()
+        self.memory_bytes: int = 0
+
+        self.hit_cnt: int = 0
+        self.miss_cnt: int = 0
+        self.expired_cnt: int = 0
+        self.evicted_cnt: int = 0
+
+    @staticmethod
+    def get_image_key(image: MatLike) -> Tuple:
+        """
+        图片内容的key 对像素做精确哈希 不同内容不会共用结果
+        :param image: 图片
+        :return:
+        """
+        arr = np.ascontiguousarray(image)
+        digest = hashlib.sha1(arr.data).digest()  # 有硬件加速 比 blake2b 和 md5 更快
+        return arr.shape, arr.dtype.str, digest
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """
+        获取缓存的结果
+        :param key: key
+        :return: (是否命中, 结果的副本)
+        """
+        if not self.enabled:
+            return False, None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.miss_cnt += 1
+                return False, None
+            if self.ttl_seconds > 0 and time.time() - entry.create_time > self.ttl_seconds:
+                self._remove(key)
+                self.expired_cnt += 1
+                self.miss_cnt += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hit_cnt += 1
+            value = entry.value
+        return True, copy_ocr_result(value)
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """
+        保存结果 会保存一份副本 之后使用方修改结果不影响缓存
+        :param key: key
+        :param value: run_ocr 的结果字典 或单行识别的文本
+        :return:
+        """
+        if not self.enabled:
+            return
+        value = copy_ocr_result(value)
+        size = estimate_ocr_result_size(value) + sys.getsizeof(key)
+        if size > self.max_memory_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _OcrCacheEntry(value, size, time.time())
+            self.memory_bytes += size
+            while (len(self._entries) > self.max_entries
+                   or self.memory_bytes > self.max_memory_bytes):
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evicted_cnt += 1
+
+    def _remove(self, key: Hashable) -> None:
+        """
+        删除一个结果 需要在持有锁时调用
+        """
+        entry = self._entries.pop(key)
+        self.memory_bytes -= entry.size
+
+    def clear(self) -> None:
+        """
+        清空缓存
+        :return:
+        """
+        with self._lock:
+            self._entries.clear()
+            self.memory_bytes = 0
+
+    def reset_stats(self) -> None:
+        """
+        清空统计
+        :return:
+        """
+        with self._lock:
+            self.hit_cnt = 0
+            self.miss_cnt = 0
+            self.expired_cnt = 0
+            self.evicted_cnt = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hit_cnt + self.miss_cnt
+        return self.hit_cnt / total if total > 0 else 0
+
+    @property
+    def stats_display_text(self) -> str:
+        """
+        统计的展示文本
+        :return:
+        """
+        return 'OCR缓存 命中 %d/%d (%.1f%%) 过期 %d 淘汰 %d 数量 %d 内存 %.1fKB' % (
+            self.hit_cnt, self.hit_cnt + self.miss_cnt, 100.0 * self.hit_rate,
+            self.expired_cnt, self.evicted_cnt, len(self._entries), self.memory_bytes / 1024.0
+        )
+
+
+def copy_ocr_result(value: Any) -> Any:
+    """
+    复制OCR结果
+    :param value: run_ocr 的结果字典 或单行识别的文本
+    :return:
+    """
+    if not isinstance(value, dict):
+        return value
+    result = {}
+    for text, mrl in value.items():
+        new_mrl = MatchResultList(only_best=mrl.only_best)
+        for mr in mrl.arr:
+            new_mr = MatchResult(mr.confidence, mr.x, mr.y, mr.w, mr.h,
+                                 template_scale=mr.template_scale, data=mr.data)
+            new_mrl.arr.append(new_mr)
+            if mr is mrl.max:
+                new_mrl.max = new_mr
+        result[text] = new_mrl
+    return result
+
+
+def estimate_ocr_result_size(value: Any) -> int:
+    """
+    估算OCR结果占用的内存
+    :param value: run_ocr 的结果字典 或单行识别的文本
+    :return: 字节数
+    """
+    if not isinstance(value, dict):
+        return sys.getsizeof(value)
+    size = sys.getsizeof(value)
+    for text, mrl in value.items():
+        size += sys.getsizeof(text) + 200 + 250 * len(mrl.arr)  # MatchResultList 和 MatchResult 对象的大致大小
+    return size
+
+
+def __debug_ocr_cache_benchmark():
+    """
+    对比不同大小的图片 计算哈希key的耗时 以及缓存命中时的耗时
+    """
+    cache = OcrResultCache()
+    rng = np.random.default_rng(0)
+    value = {'text_%d' % i: MatchResultList(only_best=False) for i in range(5)}
+    for mrl in value.values():
+        mrl.append(MatchResult(0.9, 1, 2, 3, 4))
+
+    for h, w in [(40, 200), (200, 600), (1080, 1920)]:
+        image = rng.integers(0, 256, size=(h, w, 3), dtype=np.uint8)
+        times = 200
+        start = time.perf_counter()
+        for _ in range(times):
+            key = ('run_ocr', OcrResultCache.get_image_key(image), 0.5, -1)
+        key_cost = (time.perf_counter() - start) / times
+
+        cache.put(key, value)
+        start = time.perf_counter()
+        for _ in range(times):
+            cache.get(('run_ocr', OcrResultCache.get_image_key(image), 0.5, -1))
+        hit_cost = (time.perf_counter() - start) / times
+        print('%dx%d 计算key %.1f 微秒 命中总耗时 %.1f 微秒' % (h, w, key_cost * 1e6, hit_cost * 1e6))
+
+    print(cache.stats_display_text)
+
+
+if __name__ == '__main__':
+    __debug_ocr_cache_benchmark()
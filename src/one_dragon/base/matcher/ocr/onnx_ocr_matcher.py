@@ -1,12 +1,14 @@
 import time
 
+import numpy as np
 import os
 from cv2.typing import MatLike
-from typing import List
+from typing import List, Optional
 
 from one_dragon.base.matcher.match_result import MatchResult, MatchResultList
 from one_dragon.base.matcher.ocr import ocr_utils
 from one_dragon.base.matcher.ocr.ocr_matcher import OcrMatcher
+from one_dragon.base.matcher.ocr.ocr_result_cache import OcrResultCache
 from one_dragon.utils import os_utils
 from one_dragon.utils import str_utils
 from one_dragon.utils.i18_utils import gt
@@ -19,10 +21,17 @@ class OnnxOcrMatcher(OcrMatcher):
     TODO 未测试使用 RGB图片是否有影响
     """
 
-    def __init__(self):
+    def __init__(self, cache_max_memory_bytes: int = 4 * 1024 * 1024,
+                 cache_ttl_seconds: float = 300):
+        """
+        :param cache_max_memory_bytes: OCR结果缓存的内存上限
+        :param cache_ttl_seconds: OCR结果缓存的有效时间
+        """
         OcrMatcher.__init__(self)
         self._model = None
         self._loading: bool = False
+        self.result_cache: OcrResultCache = OcrResultCache(max_memory_bytes=cache_max_memory_bytes,
+                                                           ttl_seconds=cache_ttl_seconds)
 
     def init_model(self) -> bool:
         log.info('正在加载OCR模型')
@@ -81,14 +90,39 @@ class OnnxOcrMatcher(OcrMatcher):
         :param merge_line_distance: 多少行距内合并结果 -1为不合并 理论中文情况不会出现过长分行的 这里只是为了兼容英语的情况
         :return: {key_word: []}
         """
+        cache_key = None
+        if isinstance(image, np.ndarray):
+            cache_key = ('run_ocr', OcrResultCache.get_image_key(image), threshold, merge_line_distance)
+            hit, cache_result = self.result_cache.get(cache_key)
+            if hit:
+                return cache_result
+
         start_time = time.time()
         result_map: dict = {}
         scan_result_list: list = self._model.ocr(image, cls=False)
         if len(scan_result_list) == 0:
             log.debug('OCR结果 %s 耗时 %.2f', result_map.keys(), time.time() - start_time)
+            if cache_key is not None:
+                self.result_cache.put(cache_key, result_map)
             return result_map
 
-        scan_result = scan_result_list[0]
+        result_map = self._to_result_map(scan_result_list[0], threshold, merge_line_distance)
+        log.debug('OCR结果 %s 耗时 %.2f', result_map.keys(), time.time() - start_time)
+        if cache_key is not None:
+            self.result_cache.put(cache_key, result_map)
+        return result_map
+
+    @staticmethod
+    def _to_result_map(scan_result: list, threshold: float = None,
+                       merge_line_distance: float = -1) -> dict[str, MatchResultList]:
+        """
+        将模型的结果转化为 {文本: 位置}
+        :param scan_result: [[文本框四个角的坐标, (文本, 置信度)]]
+        :param threshold: 匹配阈值
+        :param merge_line_distance: 多少行距内合并结果 -1为不合并
+        :return:
+        """
+        result_map: dict = {}
         for anchor in scan_result:
             anchor_position = anchor[0]
             anchor_text = anchor[1][0]
@@ -107,9 +141,88 @@ class OnnxOcrMatcher(OcrMatcher):
         if merge_line_distance != -1:
             result_map = ocr_utils.merge_ocr_result_to_multiple_line(result_map, join_space=True,
                                                                      merge_line_distance=merge_line_distance)
-        log.debug('OCR结果 %s 耗时 %.2f', result_map.keys(), time.time() - start_time)
         return result_map
 
+    def run_ocr_batch(self, image_list: List[MatLike], threshold: float = None,
+                      merge_line_distance: float = -1,
+                      single_line_list: Optional[List[bool]] = None) -> List[dict[str, MatchResultList]]:
+        """
+        对多张图片进行OCR
+        每张图片分别进行文本检测 所有的文本框加上单行文本的图片 合在一起只调用一次识别模型(按 rec_batch_num 分批)
+        :param image_list: 图片列表
+        :param threshold: 匹配阈值
+        :param merge_line_distance: 多少行距内合并结果 -1为不合并
+        :param single_line_list: 每张图片是否只有单行文本 是的话不进行文本检测 整张图片作为一个文本框
+        :return: 与图片一一对应的 {key_word: []}
+        """
+        start_time = time.time()
+        from onnxocr.predict_system import sorted_boxes
+        from onnxocr.utils import get_rotate_crop_image, get_minarea_rect_crop
+
+        result_list: List[Optional[dict[str, MatchResultList]]] = [None] * len(image_list)
+        cache_key_list: List[Optional[tuple]] = [None] * len(image_list)
+
+        crop_list: List[MatLike] = []  # 需要识别的图片
+        crop_owner_list: List[int] = []  # 每个识别图片属于哪张原图
+        crop_box_list: List[list] = []  # 每个识别图片在原图中的文本框
+        det_idx_set = set()  # 使用了文本检测的原图
+
+        for idx, image in enumerate(image_list):
+            single_line = single_line_list is not None and single_line_list[idx]
+            if image is None or image.shape[0] == 0 or image.shape[1] == 0:
+                result_list[idx] = {}
+                continue
+
+            cache_key_list[idx] = ('batch', OcrResultCache.get_image_key(image), single_line, threshold,
+                                   -1 if single_line else merge_line_distance)
+            hit, cache_result = self.result_cache.get(cache_key_list[idx])
+            if hit:
+                result_list[idx] = cache_result
+                continue
+
+            if single_line:
+                h, w = image.shape[:2]
+                crop_list.append(image)
+                crop_owner_list.append(idx)
+                crop_box_list.append([[0, 0], [w, 0], [w, h], [0, h]])
+                continue
+
+            det_idx_set.add(idx)
+            dt_boxes = self._model.text_detector(image)
+            if dt_boxes is None or isinstance(dt_boxes, tuple) or len(dt_boxes) == 0:
+                continue
+            for box in sorted_boxes(dt_boxes):
+                tmp_box = box.copy()
+                if self._model.args.det_box_type == 'quad':
+                    crop = get_rotate_crop_image(image, tmp_box)
+                else:
+                    crop = get_minarea_rect_crop(image, tmp_box)
+                crop_list.append(crop)
+                crop_owner_list.append(idx)
+                crop_box_list.append(box.tolist())
+
+        scan_result_list: List[list] = [[] for _ in image_list]
+        if len(crop_list) > 0:
+            rec_res = self._model.text_recognizer(crop_list)
+            for owner, box, rec_result in zip(crop_owner_list, crop_box_list, rec_res):
+                # 与 run_ocr 一致 有检测的文本框使用模型的 drop_score 过滤
+                if owner in det_idx_set and rec_result[1] < self._model.drop_score:
+                    continue
+                scan_result_list[owner].append([box, rec_result])
+
+        for idx in range(len(image_list)):
+            if result_list[idx] is not None:
+                continue
+            single_line = single_line_list is not None and single_line_list[idx]
+            result_list[idx] = self._to_result_map(
+                [i for i in scan_result_list[idx] if len(i[1][0]) > 0],
+                threshold, -1 if single_line else merge_line_distance)
+            if cache_key_list[idx] is not None:
+                self.result_cache.put(cache_key_list[idx], result_list[idx])
+
+        log.debug('批量OCR %d 张图片 识别 %d 个文本框 耗时 %.2f', len(image_list), len(crop_list), time.time() - start_time)
+        return result_list
+
     def _run_ocr_without_det(self, image: MatLike, threshold: float = None) -> str:
         """
         不使用检测模型分析图片内文字的分布
@@ -118,6 +231,13 @@ class OnnxOcrMatcher(OcrMatcher):
         :param threshold: 匹配阈值
         :return: [[("text", "score"),]] 由于禁用了空格，可以直接取第一个元素
         """
+        cache_key = None
+        if isinstance(image, np.ndarray):
+            cache_key = ('without_det', OcrResultCache.get_image_key(image), threshold)
+            hit, cache_result = self.result_cache.get(cache_key)
+            if hit:
+                return cache_result
+
         start_time = time.time()
         scan_result: list = self._model.ocr(image, det=False, cls=False)
         img_result = scan_result[0]  # 取第一张图片
@@ -126,9 +246,13 @@ class OnnxOcrMatcher(OcrMatcher):
 
         if threshold is not None and scan_result[0][1] < threshold:
             log.debug("OCR模型返回的识别结果置信度低于阈值")
-            return ""
-        log.debug('OCR结果 %s 耗时 %.2f', scan_result, time.time() - start_time)
-        return img_result[0][0]
+            result = ""
+        else:
+            log.debug('OCR结果 %s 耗时 %.2f', scan_result, time.time() - start_time)
+            result = img_result[0][0]
+        if cache_key is not None:
+            self.result_cache.put(cache_key, result)
+        return result
 
     def match_words(self, image: MatLike, words: List[str], threshold: float = None,
                     same_word: bool = False,
@@ -168,3 +292,102 @@ class OnnxOcrMatcher(OcrMatcher):
 
         return {key: all_match_result[key] for key in match_key if key in all_match_result}
 
+
+
+def __debug_ocr_batch_benchmark():
+    """
+    使用 .debug/images 中的截图 对比逐个区域OCR和批量OCR的耗时
+    """
+    from one_dragon.base.screen.screen_info import ScreenInfo
+    from one_dragon.utils import debug_utils, cv2_utils
+
+    ocr = OnnxOcrMatcher()
+    ocr.init_model()
+    ocr.result_cache.enabled = False
+
+    image_dir = debug_utils.get_debug_image_dir_path()
+    screen_list = []
+    for file_name in sorted(os.listdir(image_dir))[:10]:
+        if file_name.endswith('.png'):
+            screen_list.append(cv2_utils.read_image(os.path.join(image_dir, file_name)))
+
+    screen_info_dir = os_utils.get_path_under_work_dir('assets', 'game_data', 'screen_info')
+    area_list = []
+    for file_name in sorted(os.listdir(screen_info_dir)):
+        if not file_name.endswith('.yml'):
+            continue
+        screen_info = ScreenInfo(screen_id=file_name[:-4])
+        area_list.extend([a for a in screen_info.area_list if a.text is not None and len(a.text) > 0])
+    area_list = area_list[:30]
+
+    seq_cost: float = 0
+    batch_cost: float = 0
+    same_cnt: int = 0
+    for screen in screen_list:
+        part_list = [cv2_utils.crop_image_only(screen, a.rect) for a in area_list]
+
+        start = time.time()
+        seq_result = [ocr.run_ocr(part) for part in part_list]
+        seq_cost += time.time() - start
+
+        start = time.time()
+        batch_result = ocr.run_ocr_batch(part_list)
+        batch_cost += time.time() - start
+
+        same_cnt += sum(1 for r1, r2 in zip(seq_result, batch_result) if set(r1.keys()) == set(r2.keys()))
+
+    total = len(screen_list) * len(area_list)
+    print('区域 %d 个 逐个OCR %.2f 毫秒/区域 批量OCR %.2f 毫秒/区域 结果一致 %d/%d' % (
+        total, seq_cost * 1000 / max(1, total), batch_cost * 1000 / max(1, total), same_cnt, total))
+
+
+def __debug_single_line_benchmark():
+    """
+    对 assets/game_data/screen_info 中所有带画面截图的文本区域
+    对比 检测+识别 和 只识别 的耗时 以及只识别时是否仍能找到目标文本
+    可以找到目标文本的区域 可以考虑标记为单行文本
+    """
+    from one_dragon.base.screen.screen_info import ScreenInfo
+    from one_dragon.utils import cv2_utils
+    from one_dragon.utils.i18_utils import gt
+
+    ocr = OnnxOcrMatcher()
+    ocr.init_model()
+    ocr.result_cache.enabled = False
+
+    screen_info_dir = os_utils.get_path_under_work_dir('assets', 'game_data', 'screen_info')
+    det_cost: float = 0
+    rec_cost: float = 0
+    area_cnt: int = 0
+    for file_name in sorted(os.listdir(screen_info_dir)):
+        if not file_name.endswith('.yml'):
+            continue
+        screen_info = ScreenInfo(screen_id=file_name[:-4])
+        if screen_info.screen_image is None:
+            continue
+        for area in screen_info.area_list:
+            if not area.is_text_area:
+                continue
+            part = cv2_utils.crop_image_only(screen_info.screen_image, area.rect)
+
+            start = time.time()
+            det_result = ocr.run_ocr(part)
+            det_cost += time.time() - start
+
+            start = time.time()
+            rec_result = ocr.run_ocr_batch([part], single_line_list=[True])[0]
+            rec_cost += time.time() - start
+            area_cnt += 1
+
+            det_found = any(str_utils.find_by_lcs(gt(area.text), i, percent=area.lcs_percent) for i in det_result)
+            rec_found = any(str_utils.find_by_lcs(gt(area.text), i, percent=area.lcs_percent) for i in rec_result)
+            print('%s %s 单行标记 %s 检测+识别 %s 只识别 %s' % (
+                screen_info.screen_name, area.area_name, area.single_line, det_found, rec_found))
+
+    print('文本区域 %d 个 检测+识别 %.2f 毫秒/区域 只识别 %.2f 毫秒/区域' % (
+        area_cnt, det_cost * 1000 / max(1, area_cnt), rec_cost * 1000 / max(1, area_cnt)))
+
+
+if __name__ == '__main__':
+    __debug_ocr_batch_benchmark()
+    __debug_single_line_benchmark()
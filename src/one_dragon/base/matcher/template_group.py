@@ -0,0 +1,223 @@
+import cv2
+import numpy as np
+from cv2.typing import MatLike
+from typing import List, Optional, Tuple
+
+from one_dragon.base.matcher.match_result import MatchResult
+from one_dragon.base.screen.template_info import TemplateInfo
+from one_dragon.utils import cv2_utils
+
+
+class TemplateGroup:
+
+    def __init__(self, template_list: List[TemplateInfo],
+                 scale: int = 3,
+                 prefilter_margin: float = 0.15,
+                 verify_top_k: int = 3):
+        """
+        一组尺寸相同的模板 例如同一位置的所有角色头像
+        匹配时先在缩小后的图上 用一次矩阵运算算出所有模板在所有位置的近似相关系数(带掩码的 TM_CCOEFF_NORMED)
+        再对近似得分最高的几个模板 使用原图进行精确的模板匹配
+        尺寸与第一个模板不一致的模板 不参与预筛选 每次都直接精确匹配
+        :param template_list: 模板列表
+        :param scale: 预筛选时的缩小倍数
+        :param prefilter_margin: 近似得分低于 阈值-margin 的模板不再精确匹配
+        :param verify_top_k: 最多精确匹配多少个模板
+        """
+        self.scale: int = max(1, scale)
+        self.prefilter_margin: float = prefilter_margin
+        self.verify_top_k: int = verify_top_k
+
+        self.template_list: List[TemplateInfo] = [t for t in template_list if t.raw is not None]
+        self.template_id_list: List[str] = [t.template_id for t in self.template_list]
+
+        self.grouped_idx_list: List[int] = []  # 参与预筛选的模板下标
+        self.other_idx_list: List[int] = []  # 尺寸不一致 需要直接精确匹配的模板下标
+        self.template_shape: Optional[Tuple[int, int]] = None  # 原图尺寸 (h, w)
+        self.small_shape: Optional[Tuple[int, int]] = None  # 缩小后尺寸 (h, w)
+
+        # 预筛选使用的矩阵 n=模板数量 d=缩小后的像素数量
+        self._template_mat: Optional[np.ndarray] = None  # (3*d, n) 按通道排列 掩码内零均值的模板 已除以模板范数
+        self._mask_mat: Optional[np.ndarray] = None  # (d, n) 掩码
+        self._mask_cnt: Optional[np.ndarray] = None  # (n,) 掩码内像素数量
+
+        self._init_prefilter()
+
+    def _init_prefilter(self) -> None:
+        """
+        初始化预筛选使用的矩阵
+        :return:
+        """
+        if len(self.template_list) == 0:
+            return
+
+        self.template_shape = self.template_list[0].raw.shape[:2]
+        th, tw = self.template_shape
+        sh, sw = max(1, th // self.scale), max(1, tw // self.scale)
+        self.small_shape = (sh, sw)
+
+        template_vec_list = []
+        mask_vec_list = []
+        for idx, t in enumerate(self.template_list):
+            if t.raw.shape[:2] != self.template_shape or t.raw.ndim != 3:
+                self.other_idx_list.append(idx)
+                continue
+
+            small = cv2.resize(t.raw, (sw, sh), interpolation=cv2.INTER_AREA).astype(np.float32)
+            if t.mask is None:
+                small_mask = np.ones((sh, sw), dtype=np.float32)
+            else:
+                small_mask = (cv2.resize(t.mask, (sw, sh), interpolation=cv2.INTER_AREA) > 127).astype(np.float32)
+            cnt = float(np.sum(small_mask))
+            if cnt == 0:
+                self.other_idx_list.append(idx)
+                continue
+
+            # 掩码内 每个通道各自零均值
+            mask_3 = small_mask[:, :, np.newaxis]
+            mean = np.sum(small * mask_3, axis=(0, 1)) / cnt
+            centered = (small - mean) * mask_3
+            norm = float(np.sqrt(np.sum(centered ** 2)))
+            if norm == 0:
+                self.other_idx_list.append(idx)
+                continue
+
+            self.grouped_idx_list.append(idx)
+            template_vec_list.append((centered / norm).transpose(2, 0, 1).reshape(-1))
+            mask_vec_list.append(small_mask.reshape(-1))
+
+        if len(self.grouped_idx_list) == 0:
+            return
+
+        self._template_mat = np.stack(template_vec_list, axis=1)
+        self._mask_mat = np.stack(mask_vec_list, axis=1)
+        self._mask_cnt = np.sum(self._mask_mat, axis=0)
+
+    def prefilter(self, source: MatLike) -> np.ndarray:
+        """
+        计算参与预筛选的模板 在原图所有位置中的最大近似得分
+        :param source: 原图
+        :return: (n,) 与 grouped_idx_list 一一对应
+        """
+        if self._template_mat is None:
+            return np.zeros((0,), dtype=np.float32)
+
+        sh, sw = self.small_shape
+        small_source = cv2.resize(source,
+                                  (max(1, source.shape[1] // self.scale), max(1, source.shape[0] // self.scale)),
+                                  interpolation=cv2.INTER_AREA).astype(np.float32)
+        if small_source.shape[0] < sh or small_source.shape[1] < sw:
+            return np.zeros((len(self.grouped_idx_list),), dtype=np.float32)
+
+        # (oh, ow, 3, sh, sw) -> (窗口数量, 3, d) 按通道排列 与模板矩阵一致
+        windows = np.lib.stride_tricks.sliding_window_view(small_source, (sh, sw), axis=(0, 1))
+        windows = windows.reshape(-1, 3, sh * sw)
+        window_cnt = windows.shape[0]
+
+        # 分子 模板已经在掩码内零均值 因此不需要再减去窗口的均值
+        numerator = windows.reshape(window_cnt, -1) @ self._template_mat  # (窗口数量, n)
+
+        # 分母 窗口在各个模板掩码内 各通道的方差之和
+        channel_rows = windows.reshape(window_cnt * 3, -1)
+        channel_sum = (channel_rows @ self._mask_mat).reshape(window_cnt, 3, -1)
+        channel_sq_sum = (np.square(channel_rows) @ self._mask_mat).reshape(window_cnt, 3, -1)
+        var = np.sum(channel_sq_sum - np.square(channel_sum) / self._mask_cnt, axis=1)
+        denominator = np.sqrt(np.maximum(var, 0))
+
+        score = np.divide(numerator, denominator, out=np.zeros_like(numerator), where=denominator > 1e-6)
+        return np.max(score, axis=0)
+
+    def match_best(self, source: MatLike, threshold: float,
+                   candidate_id_list: Optional[List[str]] = None,
+                   ignore_inf: bool = True) -> Optional[MatchResult]:
+        """
+        在原图中找出最匹配的模板
+        :param source: 原图
+        :param threshold: 精确匹配的阈值
+        :param candidate_id_list: 候选的模板id 为空时使用全部
+        :param ignore_inf: 是否忽略无限大的结果
+        :return: 最佳匹配结果 data 为模板id 没有达到阈值时返回None
+        """
+        candidate_set = None if candidate_id_list is None else set(candidate_id_list)
+
+        to_verify: List[int] = []
+        prefilter_score = self.prefilter(source)
+        order = np.argsort(-prefilter_score, kind='stable')
+        for i in order:
+            idx = self.grouped_idx_list[i]
+            if candidate_set is not None and self.template_id_list[idx] not in candidate_set:
+                continue
+            if prefilter_score[i] < threshold - self.prefilter_margin:
+                break
+            to_verify.append(idx)
+            if len(to_verify) >= self.verify_top_k:
+                break
+
+        for idx in self.other_idx_list:
+            if candidate_set is not None and self.template_id_list[idx] not in candidate_set:
+                continue
+            to_verify.append(idx)
+
+        best: Optional[MatchResult] = None
+        for idx in to_verify:
+            t = self.template_list[idx]
+            if source.shape[0] < t.raw.shape[0] or source.shape[1] < t.raw.shape[1]:
+                continue
+            mr = cv2_utils.match_template(source, t.raw, threshold, mask=t.mask,
+                                          only_best=True, ignore_inf=ignore_inf).max
+            if mr is None:
+                continue
+            if best is None or mr.confidence > best.confidence:
+                mr.data = t.template_id
+                best = mr
+
+        return best
+
+
+def __debug_template_group_benchmark():
+    """
+    使用战斗画面的全部角色头像 对比逐个模板匹配和模板组匹配的耗时和结果
+    原图为头像放在识别区域大小的噪声图中
+    """
+    import time
+    from one_dragon.base.screen.template_loader import TemplateLoader
+
+    loader = TemplateLoader()
+    all_template_list = [t for t in loader.get_all_template_info_from_disk() if t.sub_dir == 'battle']
+    rng = np.random.default_rng(0)
+    # 识别区域比模板大的像素数量 与 battle.yml 中的区域一致
+    for prefix, threshold in [('avatar_1_', 0.8), ('avatar_2_', 0.8), ('avatar_chain_', 0.8), ('avatar_quick_', 0.9)]:
+        template_list = [t for t in all_template_list if t.template_id.startswith(prefix)]
+        group = TemplateGroup(template_list)
+
+        loop_cost: float = 0
+        group_cost: float = 0
+        same_cnt: int = 0
+        for target in template_list:
+            th, tw = target.raw.shape[:2]
+            source = rng.integers(0, 256, size=(th + 20, tw + 20, 3), dtype=np.uint8)
+            source[10:10 + th, 10:10 + tw] = target.raw
+
+            start = time.perf_counter()
+            loop_result: Optional[str] = None
+            for t in template_list:
+                mr = cv2_utils.match_template(source, t.raw, threshold, mask=t.mask, ignore_inf=True).max
+                if mr is not None:
+                    loop_result = t.template_id
+                    break
+            loop_cost += time.perf_counter() - start
+
+            start = time.perf_counter()
+            group_mr = group.match_best(source, threshold)
+            group_cost += time.perf_counter() - start
+
+            if group_mr is not None and group_mr.data == loop_result:
+                same_cnt += 1
+
+        print('%s 模板 %d 个 逐个匹配 %.2f 毫秒/次 模板组 %.2f 毫秒/次 结果一致 %d 个' %
+              (prefix, len(template_list),
+               loop_cost * 1000 / len(template_list), group_cost * 1000 / len(template_list), same_cnt))
+
+
+if __name__ == '__main__':
+    __debug_template_group_benchmark()
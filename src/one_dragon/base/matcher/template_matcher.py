@@ -1,8 +1,10 @@
 import cv2
+import threading
 from cv2.typing import MatLike
-from typing import Optional
+from typing import List, Optional, Tuple
 
 from one_dragon.base.matcher.match_result import MatchResultList, MatchResult
+from one_dragon.base.matcher.template_group import TemplateGroup
 from one_dragon.base.screen.template_info import TemplateInfo
 from one_dragon.base.screen.template_loader import TemplateLoader
 from one_dragon.utils import cv2_utils
@@ -13,6 +15,8 @@ class TemplateMatcher:
 
     def __init__(self, template_loader: TemplateLoader):
         self.template_loader: TemplateLoader = template_loader
+        self._template_group: dict[Tuple[str, Tuple[str, ...]], TemplateGroup] = {}
+        self._template_group_lock = threading.Lock()
 
     def match_template(self, source: MatLike,
                        template_sub_dir: str,
@@ -49,6 +53,45 @@ class TemplateMatcher:
         return cv2_utils.match_template(source, template.get_image(template_type), threshold, mask=mask_usage,
                                         only_best=only_best, ignore_inf=ignore_inf)
 
+    def get_template_group(self, template_sub_dir: str, template_id_list: List[str]) -> TemplateGroup:
+        """
+        获取一组模板 第一次使用时构建 之后复用
+        :param template_sub_dir: 模板的子文件夹
+        :param template_id_list: 模板id列表
+        :return:
+        """
+        key = (template_sub_dir, tuple(template_id_list))
+        with self._template_group_lock:
+            group = self._template_group.get(key)
+            if group is None:
+                template_list: List[TemplateInfo] = []
+                for template_id in template_id_list:
+                    template = self.template_loader.get_template(template_sub_dir, template_id)
+                    if template is not None:
+                        template_list.append(template)
+                group = TemplateGroup(template_list)
+                self._template_group[key] = group
+            return group
+
+    def match_template_group(self, source: MatLike,
+                             template_sub_dir: str,
+                             template_id_list: List[str],
+                             threshold: float = 0.5,
+                             candidate_id_list: Optional[List[str]] = None,
+                             ignore_inf: bool = True) -> Optional[MatchResult]:
+        """
+        在原图中 找出一组模板里最匹配的一个 适用于同一位置可能出现多种模板的情况 例如角色头像
+        :param source: 原图
+        :param template_sub_dir: 模板的子文件夹
+        :param template_id_list: 模板id列表 相同的列表会复用同一个模板组
+        :param threshold: 匹配阈值
+        :param candidate_id_list: 本次候选的模板id 为空时使用全部
+        :param ignore_inf: 是否忽略无限大的结果
+        :return: 置信度最高的结果 data 为模板id 没有达到阈值时返回None
+        """
+        group = self.get_template_group(template_sub_dir, template_id_list)
+        return group.match_best(source, threshold, candidate_id_list=candidate_id_list, ignore_inf=ignore_inf)
+
     def match_one_by_feature(self, source: MatLike,
                              template_sub_dir: str,
                              template_id: str,
@@ -4,11 +4,13 @@ from enum import Enum
 from typing import Optional, Callable
 
 from one_dragon.base.operation.application_run_record import AppRunRecord
+from one_dragon.base.operation.application_warmup import AppWarmup, AppWarmupResource
 from one_dragon.base.operation.one_dragon_context import OneDragonContext
 from one_dragon.base.operation.operation import Operation
 from one_dragon.base.operation.operation_base import OperationResult
+from one_dragon.utils.log_utils import log
 
-_app_preheat_executor = ThreadPoolExecutor(thread_name_prefix='od_app_preheat', max_workers=1)
+_app_preheat_executor = ThreadPoolExecutor(thread_name_prefix='od_app_preheat', max_workers=2)
 
 
 class ApplicationEventId(Enum):
@@ -55,12 +57,24 @@ class Application(Operation):
 
         self._retry_in_od: bool = retry_in_od  # 在一条龙中进行重试
 
+        self.need_warmup: bool = True
+        """运行前在后台预热用到的模板和模型"""
+
+        self._warmup: Optional[AppWarmup] = None
+
     def _init_before_execute(self) -> None:
         Operation._init_before_execute(self)
         if self.run_record is not None:
             self.run_record.update_status(AppRunRecord.STATUS_RUNNING)
 
         self.init_for_application()
+        if self.need_warmup:
+            try:
+                self._warmup = AppWarmup(self.ctx, self.app_id, self.get_warmup_resource())
+                self._warmup.start(self.get_preheat_executor())
+            except Exception:
+                log.error('应用预热失败 %s', self.app_id, exc_info=True)
+                self._warmup = None
         self.ctx.start_running()
         self.ctx.dispatch_event(ApplicationEventId.APPLICATION_START.value, self.app_id)
 
@@ -78,6 +92,9 @@ class Application(Operation):
         """
         super().after_operation_done(result)
         self._update_record_after_stop(result)
+        if self._warmup is not None:
+            self._warmup.finish()
+            self._warmup = None
         if self.stop_context_after_stop:
             self.ctx.stop_running()
         self.ctx.dispatch_event(ApplicationEventId.APPLICATION_STOP.value, self.app_id)
@@ -114,6 +131,14 @@ class Application(Operation):
     def get_preheat_executor() -> ThreadPoolExecutor:
         return _app_preheat_executor
 
+    def get_warmup_resource(self) -> AppWarmupResource:
+        """
+        应用声明需要预热的资源 由子类实现
+        运行中自动记录的资源 会在下次运行时一起预热
+        :return:
+        """
+        return AppWarmupResource()
+
     def init_for_application(self) -> bool:
         """
         初始化
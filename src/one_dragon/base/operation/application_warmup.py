@@ -0,0 +1,272 @@
+import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from one_dragon.base.config.yaml_config import YamlConfig
+from one_dragon.base.operation.one_dragon_context import OneDragonContext
+from one_dragon.base.screen.template_info import get_template_sub_dir_path
+from one_dragon.utils import os_utils
+from one_dragon.utils.log_utils import log
+from one_dragon.yolo.onnx_session_factory import OnnxSessionFactory, get_default_factory
+
+
+class AppWarmupResource:
+
+    def __init__(self,
+                 template_list: Optional[List[Tuple[str, str]]] = None,
+                 template_sub_dir_list: Optional[List[str]] = None,
+                 screen_list: Optional[List[str]] = None,
+                 model_list: Optional[List[Tuple[str, List[str]]]] = None):
+        """
+        应用运行时需要用到的资源 在运行前预热
+        :param template_list: 模板 (分类, 模板id)
+        :param template_sub_dir_list: 整个分类下的模板 例如战斗中的全部角色头像
+        :param screen_list: 画面 预热画面中全部模板区域的模板
+        :param model_list: 模型 (模型路径, 推理后端)
+        """
+        self.template_list: List[Tuple[str, str]] = [] if template_list is None else template_list
+        self.template_sub_dir_list: List[str] = [] if template_sub_dir_list is None else template_sub_dir_list
+        self.screen_list: List[str] = [] if screen_list is None else screen_list
+        self.model_list: List[Tuple[str, List[str]]] = [] if model_list is None else model_list
+
+    def merge(self, other: 'AppWarmupResource') -> 'AppWarmupResource':
+        """
+        合并两份资源 去重并保持顺序
+        :param other: 另一份资源
+        :return: 新的资源
+        """
+        def _merge(list_1: list, list_2: list) -> list:
+            result = []
+            for item in list_1 + list_2:
+                if item not in result:
+                    result.append(item)
+            return result
+
+        return AppWarmupResource(
+            template_list=_merge(self.template_list, other.template_list),
+            template_sub_dir_list=_merge(self.template_sub_dir_list, other.template_sub_dir_list),
+            screen_list=_merge(self.screen_list, other.screen_list),
+            model_list=_merge(self.model_list, other.model_list),
+        )
+
+    @property
+    def is_empty(self) -> bool:
+        return (len(self.template_list) == 0 and len(self.template_sub_dir_list) == 0
+                and len(self.screen_list) == 0 and len(self.model_list) == 0)
+
+
+def get_model_resource(model_dir_path: str, gpu: bool) -> Tuple[str, List[str]]:
+    """
+    模型的预热资源 与 OnnxModelLoader 加载的模型路径和推理后端一致
+    :param model_dir_path: 模型文件夹
+    :param gpu: 是否使用GPU
+    :return:
+    """
+    return os.path.join(model_dir_path, 'model.onnx'), OnnxSessionFactory.get_providers(gpu)
+
+
+class AppWarmupRecord(YamlConfig):
+
+    def __init__(self, app_id: str):
+        """
+        应用上次运行时 自动记录的资源 所有实例共用
+        :param app_id: 应用ID
+        """
+        YamlConfig.__init__(self, module_name=app_id, sub_dir=['app_warmup'])
+
+    @property
+    def resource(self) -> AppWarmupResource:
+        work_dir = os_utils.get_work_dir()
+        return AppWarmupResource(
+            template_list=[(i[0], i[1]) for i in self.get('template_list', [])],
+            screen_list=self.get('screen_list', []),
+            model_list=[(os.path.join(work_dir, i[0]), list(i[1])) for i in self.get('model_list', [])],
+        )
+
+    def update_resource(self, resource: AppWarmupResource) -> None:
+        """
+        保存记录的资源 模型路径保存为相对路径
+        :param resource: 资源
+        :return:
+        """
+        work_dir = os_utils.get_work_dir()
+        self.data['template_list'] = [list(i) for i in resource.template_list]
+        self.data['screen_list'] = list(resource.screen_list)
+        self.data['model_list'] = [[os.path.relpath(i[0], work_dir), list(i[1])] for i in resource.model_list]
+        self.save()
+
+
+class AppWarmup:
+
+    def __init__(self, ctx: OneDragonContext, app_id: str, declared: AppWarmupResource):
+        """
+        应用运行前的预热
+        在后台线程加载 应用声明的资源 和上次运行时自动记录的资源 避免在识别时才第一次读取模板和加载模型
+        应用运行期间记录用到的模板、画面和模型 停止后保存 下次运行时预热
+        :param ctx: 上下文
+        :param app_id: 应用ID
+        :param declared: 应用声明的资源
+        """
+        self.ctx: OneDragonContext = ctx
+        self.app_id: str = app_id
+        self.record: AppWarmupRecord = AppWarmupRecord(app_id)
+        self.resource: AppWarmupResource = declared.merge(self.record.resource)
+
+        self._model_run_cnt: Dict[Tuple[str, Tuple[str, ...]], int] = {}
+        self._future_list: List[Future] = []
+        self._template_record: Optional[Dict[Tuple[str, str], Tuple[float, bool]]] = None  # 本次运行的模板使用记录
+        self._screen_record: Optional[set[str]] = None  # 本次运行的到达画面记录
+
+        self.template_cnt: int = 0  # 预热的模板数量
+        self.template_seconds: float = 0  # 预热模板的耗时
+        self.model_cnt: int = 0  # 预热的模型数量
+        self.model_seconds: float = 0  # 预热模型的耗时
+
+    def start(self, executor: ThreadPoolExecutor) -> None:
+        """
+        开始记录使用的资源 并在后台预热 不等待预热完成
+        :param executor: 预热使用的线程池
+        :return:
+        """
+        self._template_record = self.ctx.template_loader.start_recording()
+        self._screen_record = self.ctx.screen_loader.start_visit_recording()
+        self._model_run_cnt = get_default_factory().get_pool_run_cnt()
+
+        if self.resource.is_empty:
+            return
+        self._future_list.append(executor.submit(self._preload_templates))
+        if len(self.resource.model_list) > 0:
+            self._future_list.append(executor.submit(self._preload_models))
+
+    def get_template_list(self) -> List[Tuple[str, str]]:
+        """
+        需要预热的全部模板
+        :return:
+        """
+        result: List[Tuple[str, str]] = list(self.resource.template_list)
+        for sub_dir in self.resource.template_sub_dir_list:
+            sub_dir_path = get_template_sub_dir_path(sub_dir)
+            if not os.path.isdir(sub_dir_path):
+                continue
+            for template_id in os.listdir(sub_dir_path):
+                if os.path.isdir(os.path.join(sub_dir_path, template_id)):
+                    result.append((sub_dir, template_id))
+        for screen_name in self.resource.screen_list:
+            screen_info = self.ctx.screen_loader.get_screen(screen_name)
+            if screen_info is None:
+                continue
+            for area in screen_info.area_list:
+                if area.is_template_area:
+                    result.append((area.template_sub_dir, area.template_id))
+        return list(dict.fromkeys(result))
+
+    def _preload_templates(self) -> None:
+        try:
+            start = time.perf_counter()
+            for sub_dir, template_id in self.get_template_list():
+                if self.ctx.template_loader.preload(sub_dir, template_id) is not None:
+                    self.template_cnt += 1
+            self.template_seconds = time.perf_counter() - start
+        except Exception:
+            log.error('预热模板失败', exc_info=True)
+
+    def _preload_models(self) -> None:
+        factory = get_default_factory()
+        start = time.perf_counter()
+        for model_path, providers in self.resource.model_list:
+            if not os.path.exists(model_path):  # 需要下载的模型 在使用时再处理
+                continue
+            try:
+                factory.get_session_pool(model_path, providers)
+                self.model_cnt += 1
+            except Exception:
+                log.error('预热模型失败 %s', model_path, exc_info=True)
+        self.model_seconds = time.perf_counter() - start
+
+    def finish(self) -> None:
+        """
+        应用停止后调用 保存这次使用的资源 并输出预热的效果
+        只保存这次使用的资源 不合并之前的记录 避免记录只增不减
+        :return:
+        """
+        if self._template_record is None or self._screen_record is None:
+            return
+        first_hit = self.ctx.template_loader.stop_recording(self._template_record)
+        visited_screen_set = self.ctx.screen_loader.stop_visit_recording(self._screen_record)
+        self._template_record = None
+        self._screen_record = None
+
+        model_list: List[Tuple[str, List[str]]] = []
+        for key, run_cnt in get_default_factory().get_pool_run_cnt().items():
+            if run_cnt > self._model_run_cnt.get(key, 0):
+                model_list.append((key[0], list(key[1])))
+        used = AppWarmupResource(
+            template_list=list(first_hit.keys()),
+            screen_list=sorted(visited_screen_set),
+            model_list=model_list,
+        )
+        try:
+            if not used.is_empty:  # 没有使用任何资源时 例如启动后马上停止 保留上次的记录
+                self.record.update_resource(used)
+        except Exception:
+            log.error('保存预热记录失败 %s', self.app_id, exc_info=True)
+
+        log.info(self.get_report_text(first_hit))
+
+    def get_report_text(self, first_hit: Dict[Tuple[str, str], Tuple[float, bool]]) -> str:
+        """
+        预热效果 运行中第一次使用各个模板的耗时 区分当时是否已经在内存中
+        :param first_hit: 每个模板第一次获取的耗时 和是否需要加载
+        :return:
+        """
+        warm_list = [cost for cost, cold in first_hit.values() if not cold]
+        cold_list = [cost for cost, cold in first_hit.values() if cold]
+
+        def _text(cost_list: List[float]) -> str:
+            if len(cost_list) == 0:
+                return '0个'
+            return '%d个 合计%.1fms 最大%.2fms' % (len(cost_list), sum(cost_list) * 1000, max(cost_list) * 1000)
+
+        return '%s 预热 模板%d个 %.0fms 模型%d个 %.0fms | 首次使用模板 已加载 %s | 需要加载 %s' % (
+            self.app_id, self.template_cnt, self.template_seconds * 1000, self.model_cnt, self.model_seconds * 1000,
+            _text(warm_list), _text(cold_list))
+
+
+def __debug_warmup_benchmark():
+    """
+    对比 没有预热 和 预热后 首次使用模板的耗时
+    """
+    from one_dragon.base.screen.template_loader import TemplateLoader
+
+    sub_dir_list = ['battle', 'agent_state']
+    key_list: List[Tuple[str, str]] = []
+    for sub_dir in sub_dir_list:
+        sub_dir_path = get_template_sub_dir_path(sub_dir)
+        for template_id in os.listdir(sub_dir_path):
+            if os.path.isdir(os.path.join(sub_dir_path, template_id)):
+                key_list.append((sub_dir, template_id))
+
+    for name, warmup in [('没有预热', False), ('预热后', True)]:
+        loader = TemplateLoader(use_pack=False)
+        preload_cost = 0
+        if warmup:
+            start = time.perf_counter()
+            for sub_dir, template_id in key_list:
+                loader.preload(sub_dir, template_id)
+            preload_cost = time.perf_counter() - start
+
+        record = loader.start_recording()
+        for sub_dir, template_id in key_list:
+            template = loader.get_template(sub_dir, template_id)
+            if template is not None:
+                _ = template.gray
+        first_hit = loader.stop_recording(record)
+        cost_list = [cost for cost, _ in first_hit.values()]
+        print('%s 预热 %.1fms 首次使用 %d 个模板 合计 %.1fms 最大 %.2fms 需要加载 %d 个' % (
+            name, preload_cost * 1000, len(cost_list), sum(cost_list) * 1000, max(cost_list) * 1000,
+            sum(1 for _, cold in first_hit.values() if cold)))
+
+
+if __name__ == '__main__':
+    __debug_warmup_benchmark()
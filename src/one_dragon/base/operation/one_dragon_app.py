@@ -29,6 +29,7 @@ class OneDragonApp(Application):
             op_name=gt(op_name, 'ui'),
             op_to_enter_game=op_to_enter_game
         )
+        self.need_warmup = False  # 各个应用运行时会各自预热
 
         self._to_run_app_list: List[Application] = []  # 需要执行的app列表 有序
         self._current_app_idx: int = 0  # 当前运行的app 下标
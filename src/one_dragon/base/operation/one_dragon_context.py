@@ -15,6 +15,7 @@ from one_dragon.base.matcher.ocr.onnx_ocr_matcher import OnnxOcrMatcher
 from one_dragon.base.matcher.template_matcher import TemplateMatcher
 from one_dragon.base.operation.context_event_bus import ContextEventBus
 from one_dragon.base.operation.one_dragon_env_context import OneDragonEnvContext
+from one_dragon.base.screen.frame_cache import FrameCache
 from one_dragon.base.screen.screen_loader import ScreenContext
 from one_dragon.base.screen.template_loader import TemplateLoader
 from one_dragon.utils import debug_utils, log_utils
@@ -73,6 +74,7 @@ class OneDragonContext(ContextEventBus, OneDragonEnvContext):
         self.template_loader: TemplateLoader = TemplateLoader()
         self.tm: TemplateMatcher = TemplateMatcher(self.template_loader)
         self.ocr: OcrMatcher = OnnxOcrMatcher()
+        self.frame_cache: FrameCache = FrameCache()  # 单帧识别缓存
         self.controller: ControllerBase = controller
 
         self.keyboard_controller = keyboard.Controller()
@@ -107,6 +109,8 @@ class OneDragonContext(ContextEventBus, OneDragonEnvContext):
             self.switch_context_pause_and_run()
         self.context_running_state = ContextRunStateEnum.STOP
         log.info('停止运行')
+        if isinstance(self.ocr, OnnxOcrMatcher):
+            log.debug(self.ocr.result_cache.stats_display_text)
         self.dispatch_event(ContextRunningStateEventEnum.STOP_RUNNING.value, self.context_running_state)
 
     @property
@@ -1,7 +1,6 @@
 import time
 
 import cv2
-import difflib
 import inspect
 from cv2.typing import MatLike
 from typing import Optional, ClassVar, Callable, List, Any, Tuple
@@ -19,6 +18,7 @@ from one_dragon.base.screen.screen_utils import OcrClickResultEnum, FindAreaResu
 from one_dragon.utils import debug_utils, cv2_utils, str_utils
 from one_dragon.utils.i18_utils import coalesce_gt, gt
 from one_dragon.utils.log_utils import log
+from one_dragon.utils.text_matcher import TextMatcher
 
 
 class Operation(OperationBase):
@@ -757,12 +757,11 @@ class Operation(OperationBase):
             ocr_result_list.append(ocr_result)
             mrl_list.append(mrl)
 
-        results = difflib.get_close_matches(gt(target_cn), ocr_result_list, n=1)
-        if results is None or len(results) == 0:
+        results = TextMatcher(ocr_result_list).get_close_matches(gt(target_cn), n=1)
+        if len(results) == 0:
             return self.round_retry(f'找不到 {target_cn}', wait=retry_wait, wait_round_time=retry_wait_round)
 
-        for result in results:
-            idx = ocr_result_list.index(result)
+        for idx in results:
             ocr_result = ocr_result_list[idx]
             mrl = mrl_list[idx]
             if str_utils.find_by_lcs(gt(target_cn), ocr_result, percent=lcs_percent):
@@ -0,0 +1,411 @@
+import cv2
+import numpy as np
+import threading
+from collections import OrderedDict
+from cv2.typing import MatLike
+from typing import Any, Callable, Hashable, List, Optional, Tuple
+
+from one_dragon.base.geometry.rectangle import Rect
+from one_dragon.base.matcher.match_result import MatchResult, MatchResultList
+from one_dragon.base.matcher.ocr.ocr_matcher import OcrMatcher
+from one_dragon.base.matcher.template_matcher import TemplateMatcher
+from one_dragon.base.screen.screen_area import ScreenArea
+from one_dragon.utils import cv2_utils
+
+
+class FrameCacheCategory:
+
+    CROP: str = 'crop'  # 裁剪
+    TEMPLATE: str = 'template'  # 模板匹配
+    OCR: str = 'ocr'  # OCR
+
+
+class _FrameEntry:
+
+    def __init__(self, screen: MatLike):
+        """
+        一张截图对应的缓存
+        持有截图的引用 保证缓存存在期间 id(screen) 不会被其它图片复用
+        """
+        self.screen: MatLike = screen
+        self.lock = threading.Lock()
+        self.result: dict[Hashable, Any] = {}
+        self.key_lock: dict[Hashable, threading.Lock] = {}
+
+    def get_key_lock(self, key: Hashable) -> threading.Lock:
+        with self.lock:
+            lock = self.key_lock.get(key)
+            if lock is None:
+                lock = threading.Lock()
+                self.key_lock[key] = lock
+            return lock
+
+
+class FrameCache:
+
+    def __init__(self, max_frames: int = 2,
+                 change_scale: int = 4,
+                 change_max_diff: int = 6):
+        """
+        单帧识别缓存
+        同一张截图在一次识别中 会被多个识别方法使用 这里将相同区域的裁剪、模板匹配、OCR结果只计算一次
+        以截图对象本身作为帧的标识 只保留最近的几帧 截图更换后旧的结果自然淘汰
+        另外 识别时可以选择在区域画面没有变化时 直接复用上一次的识别结果 适用于菜单、加载等长时间静止的画面
+        注意返回的结果是共享的 使用方不能修改
+        :param max_frames: 最多保留多少帧的结果 异步识别时 上一帧可能还在使用
+        :param change_scale: 判断区域变化时 区域缩小的倍数
+        :param change_max_diff: 缩小后的区域 每个像素的最大差值不超过这个值时 认为区域没有变化
+        """
+        self.max_frames: int = max_frames
+        self.enabled: bool = True
+        self.change_scale: int = max(1, change_scale)
+        self.change_max_diff: int = change_max_diff
+
+        self._lock = threading.Lock()
+        self._frames: OrderedDict[int, _FrameEntry] = OrderedDict()
+        self._last_region: dict[Hashable, Tuple[np.ndarray, Any]] = {}  # 上一次计算时 区域的缩略图和识别结果
+
+        self.hit_cnt: dict[str, int] = {}  # 命中次数
+        self.miss_cnt: dict[str, int] = {}  # 未命中次数
+        self.unchanged_cnt: dict[str, int] = {}  # 未命中 但区域没有变化而复用的次数
+
+    def _get_entry(self, screen: MatLike) -> _FrameEntry:
+        """
+        获取截图对应的缓存 不存在时新建 并淘汰最旧的帧
+        :param screen: 游戏截图
+        :return:
+        """
+        frame_id = id(screen)
+        with self._lock:
+            entry = self._frames.get(frame_id)
+            if entry is not None and entry.screen is screen:
+                self._frames.move_to_end(frame_id)
+                return entry
+
+            entry = _FrameEntry(screen)
+            self._frames[frame_id] = entry
+            self._frames.move_to_end(frame_id)
+            while len(self._frames) > self.max_frames:
+                self._frames.popitem(last=False)
+            return entry
+
+    def get_or_compute(self, screen: MatLike, category: str, key: Hashable, compute: Callable[[], Any],
+                       reuse_unchanged: bool = False, rect: Optional[Rect] = None) -> Any:
+        """
+        获取这一帧中的识别结果 不存在时进行计算
+        同一个key同时只会有一个线程计算 其它线程等待后直接使用结果
+        :param screen: 游戏截图
+        :param category: 结果分类 用于统计
+        :param key: 结果的唯一标识 同一帧内唯一
+        :param compute: 计算方法
+        :param reuse_unchanged: 区域画面与上一次计算时相同的话 直接复用上一次的结果
+        :param rect: 判断变化的区域 为空时使用整张截图
+        :return: 识别结果
+        """
+        if not self.enabled or screen is None:
+            return compute()
+
+        entry = self._get_entry(screen)
+        full_key = (category, key)
+        with entry.get_key_lock(full_key):
+            if full_key in entry.result:
+                self._add_cnt(self.hit_cnt, category)
+                return entry.result[full_key]
+
+            self._add_cnt(self.miss_cnt, category)
+            if not reuse_unchanged:
+                value = compute()
+                entry.result[full_key] = value
+                return value
+
+            thumbnail = self.get_region_thumbnail(screen, rect)
+            with self._lock:
+                last = self._last_region.get(full_key)
+            if last is not None and self.is_same_region(last[0], thumbnail):
+                self._add_cnt(self.unchanged_cnt, category)
+                value = last[1]
+            else:
+                value = compute()
+                with self._lock:
+                    self._last_region[full_key] = (thumbnail, value)
+            entry.result[full_key] = value
+            return value
+
+    def get_region_thumbnail(self, screen: MatLike, rect: Optional[Rect]) -> np.ndarray:
+        """
+        区域的缩略图 用于判断区域是否有变化
+        :param screen: 游戏截图
+        :param rect: 区域 为空时使用整张截图
+        :return:
+        """
+        part = self.crop(screen, rect)
+        h, w = part.shape[:2]
+        if self.change_scale > 1 and h >= self.change_scale and w >= self.change_scale:
+            part = cv2.resize(part, (w // self.change_scale, h // self.change_scale), interpolation=cv2.INTER_AREA)
+        return part.astype(np.int16)
+
+    def is_same_region(self, thumbnail_1: np.ndarray, thumbnail_2: np.ndarray) -> bool:
+        """
+        两个缩略图是否可以认为是同一个画面
+        :param thumbnail_1: 缩略图
+        :param thumbnail_2: 缩略图
+        :return:
+        """
+        if thumbnail_1.shape != thumbnail_2.shape:
+            return False
+        return int(np.max(np.abs(thumbnail_1 - thumbnail_2), initial=0)) <= self.change_max_diff
+
+    def _add_cnt(self, cnt_map: dict[str, int], category: str) -> None:
+        with self._lock:
+            cnt_map[category] = cnt_map.get(category, 0) + 1
+
+    def crop(self, screen: MatLike, rect: Optional[Rect]) -> MatLike:
+        """
+        裁剪截图中的区域
+        :param screen: 游戏截图
+        :param rect: 区域
+        :return: 裁剪后的图片
+        """
+        return self.get_or_compute(
+            screen, FrameCacheCategory.CROP, get_rect_key(rect),
+            lambda: cv2_utils.crop_image_only(screen, rect)
+        )
+
+    def match_template(self, screen: MatLike, tm: TemplateMatcher, rect: Optional[Rect],
+                       template_sub_dir: str, template_id: str,
+                       template_type: str = 'raw',
+                       threshold: float = 0.5,
+                       only_best: bool = True,
+                       ignore_inf: bool = True,
+                       reuse_unchanged: bool = False) -> MatchResultList:
+        """
+        在截图的区域中 匹配模板
+        :param screen: 游戏截图
+        :param tm: 模板匹配器
+        :param rect: 区域 为空时使用整张截图
+        :param template_sub_dir: 模板的子文件夹
+        :param template_id: 模板id
+        :param template_type: 模板类型
+        :param threshold: 匹配阈值
+        :param only_best: 只返回最好的结果
+        :param ignore_inf: 是否忽略无限大的结果
+        :param reuse_unchanged: 区域画面没有变化时 复用上一次的结果
+        :return: 匹配结果 坐标相对于区域
+        """
+        key = (get_rect_key(rect), template_sub_dir, template_id, template_type, threshold, only_best, ignore_inf)
+        return self.get_or_compute(
+            screen, FrameCacheCategory.TEMPLATE, key,
+            lambda: tm.match_template(self.crop(screen, rect), template_sub_dir, template_id,
+                                      template_type=template_type, threshold=threshold,
+                                      only_best=only_best, ignore_inf=ignore_inf),
+            reuse_unchanged=reuse_unchanged, rect=rect
+        )
+
+    def match_template_group(self, screen: MatLike, tm: TemplateMatcher, rect: Optional[Rect],
+                             template_sub_dir: str, template_id_list: List[str],
+                             threshold: float = 0.5,
+                             candidate_id_list: Optional[List[str]] = None,
+                             ignore_inf: bool = True,
+                             reuse_unchanged: bool = False) -> Optional[MatchResult]:
+        """
+        在截图的区域中 找出一组模板里最匹配的一个
+        :param screen: 游戏截图
+        :param tm: 模板匹配器
+        :param rect: 区域 为空时使用整张截图
+        :param template_sub_dir: 模板的子文件夹
+        :param template_id_list: 模板id列表
+        :param threshold: 匹配阈值
+        :param candidate_id_list: 本次候选的模板id 为空时使用全部
+        :param ignore_inf: 是否忽略无限大的结果
+        :param reuse_unchanged: 区域画面没有变化时 复用上一次的结果
+        :return: 置信度最高的结果 坐标相对于区域 data 为模板id
+        """
+        key = (get_rect_key(rect), template_sub_dir, tuple(template_id_list), threshold,
+               None if candidate_id_list is None else tuple(candidate_id_list), ignore_inf)
+        return self.get_or_compute(
+            screen, FrameCacheCategory.TEMPLATE, key,
+            lambda: tm.match_template_group(self.crop(screen, rect), template_sub_dir, template_id_list,
+                                            threshold=threshold, candidate_id_list=candidate_id_list,
+                                            ignore_inf=ignore_inf),
+            reuse_unchanged=reuse_unchanged, rect=rect
+        )
+
+    def run_ocr(self, screen: MatLike, ocr: OcrMatcher, rect: Optional[Rect],
+                color_range: Optional[List] = None, dilate_k: int = 2,
+                threshold: float = None, merge_line_distance: float = -1,
+                reuse_unchanged: bool = False) -> dict[str, MatchResultList]:
+        """
+        对截图的区域进行OCR
+        :param screen: 游戏截图
+        :param ocr: OCR
+        :param rect: 区域 为空时使用整张截图
+        :param color_range: 筛选的颜色范围
+        :param dilate_k: 颜色掩码的膨胀大小 0为不膨胀
+        :param threshold: 匹配阈值
+        :param merge_line_distance: 多少行距内合并结果
+        :param reuse_unchanged: 区域画面没有变化时 复用上一次的结果
+        :return: 识别结果 坐标相对于区域
+        """
+        key = (get_rect_key(rect), get_color_range_key(color_range), dilate_k, threshold, merge_line_distance)
+
+        def _run() -> dict[str, MatchResultList]:
+            part = self.crop_for_ocr(screen, rect, color_range, dilate_k)
+            return ocr.run_ocr(part, threshold=threshold, merge_line_distance=merge_line_distance)
+
+        return self.get_or_compute(screen, FrameCacheCategory.OCR, key, _run,
+                                   reuse_unchanged=reuse_unchanged, rect=rect)
+
+    def crop_for_ocr(self, screen: MatLike, rect: Optional[Rect],
+                     color_range: Optional[List] = None, dilate_k: int = 2) -> MatLike:
+        """
+        裁剪用于OCR的区域 并按颜色范围筛选
+        :param screen: 游戏截图
+        :param rect: 区域 为空时使用整张截图
+        :param color_range: 筛选的颜色范围
+        :param dilate_k: 颜色掩码的膨胀大小 0为不膨胀
+        :return:
+        """
+        part = self.crop(screen, rect)
+        if color_range is not None:
+            mask = cv2.inRange(part,
+                               np.array(color_range[0], dtype=np.uint8),
+                               np.array(color_range[1], dtype=np.uint8))
+            mask = cv2_utils.dilate(mask, dilate_k)
+            part = cv2.bitwise_and(part, part, mask=mask)
+        return part
+
+    def run_ocr_batch(self, screen: MatLike, ocr: OcrMatcher, area_list: List[ScreenArea],
+                      threshold: float = None,
+                      single_line_list: Optional[List[bool]] = None,
+                      reuse_unchanged: bool = False) -> List[dict[str, MatchResultList]]:
+        """
+        对截图中的多个区域进行OCR 没有缓存的区域合并成一次批量OCR
+        非单行的结果与 run_ocr 共用缓存
+        :param screen: 游戏截图
+        :param ocr: OCR
+        :param area_list: 区域列表 使用区域的范围和颜色筛选
+        :param threshold: 匹配阈值
+        :param single_line_list: 每个区域是否只有单行文本 是的话跳过文本检测 为空时使用区域的 single_line
+        :param reuse_unchanged: 区域画面没有变化时 复用上一次的结果
+        :return: 与区域一一对应的识别结果 坐标相对于区域
+        """
+        result_list: List[Optional[dict[str, MatchResultList]]] = [None] * len(area_list)
+        full_key_list: List[tuple] = []
+        thumbnail_list: List[Optional[np.ndarray]] = [None] * len(area_list)
+        entry = self._get_entry(screen) if self.enabled and screen is not None else None
+
+        todo_idx_list: List[int] = []
+        for idx, area in enumerate(area_list):
+            single_line = area.single_line if single_line_list is None else single_line_list[idx]
+            key = (get_rect_key(area.rect), get_color_range_key(area.color_range), 2, threshold, -1)
+            if single_line:
+                key = key + ('single_line',)
+            full_key = (FrameCacheCategory.OCR, key)
+            full_key_list.append(full_key)
+
+            if entry is None:
+                todo_idx_list.append(idx)
+                continue
+
+            with entry.lock:
+                cached = entry.result.get(full_key)
+            if cached is not None:
+                self._add_cnt(self.hit_cnt, FrameCacheCategory.OCR)
+                result_list[idx] = cached
+                continue
+
+            self._add_cnt(self.miss_cnt, FrameCacheCategory.OCR)
+            if reuse_unchanged:
+                thumbnail_list[idx] = self.get_region_thumbnail(screen, area.rect)
+                with self._lock:
+                    last = self._last_region.get(full_key)
+                if last is not None and self.is_same_region(last[0], thumbnail_list[idx]):
+                    self._add_cnt(self.unchanged_cnt, FrameCacheCategory.OCR)
+                    result_list[idx] = last[1]
+                    with entry.lock:
+                        entry.result[full_key] = last[1]
+                    continue
+
+            todo_idx_list.append(idx)
+
+        if len(todo_idx_list) > 0:
+            part_list = [self.crop_for_ocr(screen, area_list[idx].rect, area_list[idx].color_range)
+                         for idx in todo_idx_list]
+            todo_single_line_list = [area_list[idx].single_line if single_line_list is None else single_line_list[idx]
+                                     for idx in todo_idx_list]
+            batch_result_list = ocr.run_ocr_batch(part_list, threshold=threshold,
+                                                  single_line_list=todo_single_line_list)
+            for idx, value in zip(todo_idx_list, batch_result_list):
+                result_list[idx] = value
+                if entry is None:
+                    continue
+                with entry.lock:
+                    entry.result[full_key_list[idx]] = value
+                if thumbnail_list[idx] is not None:
+                    with self._lock:
+                        self._last_region[full_key_list[idx]] = (thumbnail_list[idx], value)
+
+        return result_list
+
+    def clear(self) -> None:
+        """
+        清除所有缓存的帧 以及用于复用的上一次结果
+        :return:
+        """
+        with self._lock:
+            self._frames.clear()
+            self._last_region.clear()
+
+    def reset_stats(self) -> None:
+        """
+        重置命中统计
+        :return:
+        """
+        with self._lock:
+            self.hit_cnt.clear()
+            self.miss_cnt.clear()
+            self.unchanged_cnt.clear()
+
+    def get_stats(self) -> dict[str, Tuple[int, int]]:
+        """
+        获取命中统计
+        :return: {分类: (命中次数, 未命中次数)}
+        """
+        with self._lock:
+            categories = set(self.hit_cnt.keys()) | set(self.miss_cnt.keys())
+            return {c: (self.hit_cnt.get(c, 0), self.miss_cnt.get(c, 0)) for c in categories}
+
+    @property
+    def stats_display_text(self) -> str:
+        """
+        命中统计的展示文本
+        :return:
+        """
+        text_list = []
+        for category, (hit, miss) in sorted(self.get_stats().items()):
+            total = hit + miss
+            text_list.append('%s 命中 %d/%d (%.1f%%)' % (category, hit, total, 100.0 * hit / total if total > 0 else 0))
+            unchanged = self.unchanged_cnt.get(category, 0)
+            if unchanged > 0:
+                text_list.append('%s 画面未变复用 %d/%d' % (category, unchanged, miss))
+        return ' '.join(text_list)
+
+
+def get_rect_key(rect: Optional[Rect]) -> Optional[Tuple[int, int, int, int]]:
+    """
+    区域作为缓存key
+    :param rect: 区域
+    :return:
+    """
+    return None if rect is None else (rect.x1, rect.y1, rect.x2, rect.y2)
+
+
+def get_color_range_key(color_range: Optional[List]) -> Optional[Tuple]:
+    """
+    颜色范围作为缓存key 兼容list和np.ndarray
+    :param color_range: 颜色范围
+    :return:
+    """
+    if color_range is None:
+        return None
+    return tuple(tuple(int(c) for c in color) for color in color_range)
@@ -18,6 +18,7 @@ class ScreenArea:
                  id_mark: bool = False,
                  goto_list: List[str] = None,
                  color_range: List[List[int]] = None,
+                 single_line: bool = False,
                  ):
         self.area_name: str = area_name
         self.pc_rect: Rect = pc_rect
@@ -30,6 +31,7 @@ class ScreenArea:
         self.id_mark: bool = id_mark  # 是否用于画面的唯一标识
         self.goto_list: List[str] = [] if goto_list is None else goto_list # 交互后 可能会跳转的画面名称列表
         self.color_range: List[List[int]] = color_range  # 识别时候的筛选的颜色范围 文本时候有效
+        self.single_line: bool = single_line  # 区域内只有单行文本 识别时跳过文本检测 文本时候有效
 
     @property
     def rect(self) -> Rect:
@@ -119,6 +121,8 @@ class ScreenArea:
         order_dict['template_id'] = self.template_id
         order_dict['template_match_threshold'] = self.template_match_threshold
         order_dict['color_range'] = self.color_range
+        if self.single_line:  # 只在需要时保存 默认为 False
+            order_dict['single_line'] = self.single_line
         order_dict['goto_list'] = self.goto_list
 
         return order_dict
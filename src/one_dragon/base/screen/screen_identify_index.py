@@ -0,0 +1,121 @@
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from one_dragon.base.matcher.match_result import MatchResultList
+from one_dragon.base.screen.frame_cache import get_color_range_key, get_rect_key
+from one_dragon.base.screen.screen_area import ScreenArea
+from one_dragon.base.screen.screen_info import ScreenInfo
+
+
+class ScreenIdProbe:
+
+    def __init__(self, key: Hashable, area: ScreenArea):
+        """
+        画面标识区域的一次判断 不同画面中 位置和内容都相同的标识区域 共用一个判断
+        :param key: 判断的唯一标识
+        :param area: 其中一个标识区域 用于识别
+        """
+        self.key: Hashable = key
+        self.area: ScreenArea = area
+        self.is_text: bool = area.is_text_area
+        self.ocr_key: Optional[Tuple] = get_ocr_key(area) if area.is_text_area else None
+        self.screen_name_list: List[str] = []  # 使用这个判断的画面
+
+    @property
+    def pixel_cnt(self) -> int:
+        return max(0, self.area.rect.width) * max(0, self.area.rect.height)
+
+
+class ScreenIdentifyState:
+
+    def __init__(self):
+        """
+        一次画面识别中 已经得到的判断结果
+        """
+        self.probe_result: Dict[Hashable, bool] = {}
+        self.ocr_result: Dict[Tuple, dict[str, MatchResultList]] = {}
+        self.template_cnt: int = 0  # 进行模板匹配的次数
+        self.ocr_cnt: int = 0  # 进行OCR的区域数
+        self.checked_screen_cnt: int = 0  # 判断过的画面数
+
+
+class ScreenIdentifyIndex:
+
+    def __init__(self, screen_info_list: List[ScreenInfo]):
+        """
+        画面识别的索引 加载画面后预先计算
+        - 所有画面的标识区域去重 同一帧中相同的判断只进行一次 结果可以直接否定共用这个判断的其它画面
+        - 每个画面按 模板匹配 -> 其它画面不使用的文本 -> 面积小的文本 的顺序判断 有一个不符合就提前结束
+        :param screen_info_list: 画面列表
+        """
+        self.probe_map: Dict[Hashable, ScreenIdProbe] = {}
+        self.screen_probe_map: Dict[str, List[ScreenIdProbe]] = {}
+
+        for screen_info in screen_info_list:
+            probe_list: List[ScreenIdProbe] = []
+            valid = True
+            for area in screen_info.area_list:
+                if not area.id_mark:
+                    continue
+                key = get_probe_key(area)
+                if key is None:  # 没有配置文本或模板 这个画面永远不会被识别到
+                    valid = False
+                    break
+                probe = self.probe_map.get(key)
+                if probe is None:
+                    probe = ScreenIdProbe(key, area)
+                    self.probe_map[key] = probe
+                if screen_info.screen_name not in probe.screen_name_list:
+                    probe.screen_name_list.append(screen_info.screen_name)
+                if probe not in probe_list:
+                    probe_list.append(probe)
+            if valid and len(probe_list) > 0:
+                self.screen_probe_map[screen_info.screen_name] = probe_list
+
+        for probe_list in self.screen_probe_map.values():
+            # 固定的判断顺序 模板优先 文本中优先使用其它画面不会出现的 区分能力更强
+            probe_list.sort(key=lambda p: (p.is_text, len(p.screen_name_list) if p.is_text else 0, p.pixel_cnt))
+
+    def get_probe_list(self, screen_name: str) -> Optional[List[ScreenIdProbe]]:
+        """
+        画面需要的判断 按判断顺序排列
+        :param screen_name: 画面名称
+        :return: 为空时 这个画面不能通过标识区域识别
+        """
+        return self.screen_probe_map.get(screen_name)
+
+    @property
+    def stats_display_text(self) -> str:
+        """
+        索引的展示文本
+        :return:
+        """
+        area_cnt = sum(len(i.screen_name_list) for i in self.probe_map.values())
+        text_cnt = sum(1 for i in self.probe_map.values() if i.is_text)
+        ocr_cnt = len(set(i.ocr_key for i in self.probe_map.values() if i.is_text))
+        return '画面 %d 个 标识区域 %d 个 去重后判断 %d 个(模板 %d 文本 %d) OCR区域 %d 个' % (
+            len(self.screen_probe_map), area_cnt, len(self.probe_map),
+            len(self.probe_map) - text_cnt, text_cnt, ocr_cnt)
+
+
+def get_ocr_key(area: ScreenArea) -> Tuple:
+    """
+    文本区域的OCR结果key 相同的区域只需要OCR一次
+    :param area: 文本区域
+    :return:
+    """
+    return get_rect_key(area.rect), get_color_range_key(area.color_range), area.single_line
+
+
+def get_probe_key(area: ScreenArea) -> Optional[Tuple]:
+    """
+    标识区域的判断key 判断方式相同的区域结果一定相同
+    :param area: 标识区域
+    :return:
+    """
+    if area.is_text_area:
+        return 'text', get_ocr_key(area), area.text, area.lcs_percent
+    elif area.is_template_area:
+        return ('template', get_rect_key(area.rect), area.template_sub_dir, area.template_id,
+                area.template_match_threshold)
+    else:
+        return None
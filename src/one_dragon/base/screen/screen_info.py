@@ -76,6 +76,7 @@ class ScreenInfo(YamlOperator):
                 template_sub_dir=data_area.get('template_sub_dir'),
                 template_match_threshold=data_area.get('template_match_threshold'),
                 color_range=data_area.get('color_range'),
+                single_line=data_area.get('single_line', False),
                 pc_alt=self.pc_alt,
                 id_mark=data_area.get('id_mark', False),
                 goto_list=data_area.get('goto_list', [])
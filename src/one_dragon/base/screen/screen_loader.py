@@ -3,8 +3,9 @@ from cv2.typing import MatLike
 from typing import Optional
 
 from one_dragon.base.screen.screen_area import ScreenArea
+from one_dragon.base.screen.screen_identify_index import ScreenIdentifyIndex
 from one_dragon.base.screen.screen_info import ScreenInfo
-from one_dragon.utils.log_utils import log
+from one_dragon.base.screen.screen_route_table import ScreenRouteTable
 
 
 class ScreenRouteNode:
@@ -47,11 +48,14 @@ class ScreenContext:
         self.screen_info_list: list[ScreenInfo] = []
         self.screen_info_map: dict[str, ScreenInfo] = {}
         self._screen_area_map: dict[str, ScreenArea] = {}
-        self.screen_route_map: dict[str, dict[str, ScreenRoute]] = {}
+        self.screen_route_map: dict[str, dict[str, ScreenRoute]] = {}  # 已经使用过的路径
+        self._route_table: ScreenRouteTable = ScreenRouteTable([], [], [])
+        self.identify_index: ScreenIdentifyIndex = ScreenIdentifyIndex([])  # 画面识别的索引
 
         self.load_all()
         self.last_screen_name: Optional[str] = None  # 上一个画面名字
         self.current_screen_name: Optional[str] = None  # 当前的画面名字
+        self._visited_record_list: list[set[str]] = []  # 正在进行的到达画面记录 用于记录应用使用了哪些画面
 
     def load_all(self) -> None:
         """
@@ -73,6 +77,7 @@ class ScreenContext:
                 for screen_area in screen_info.area_list:
                     self._screen_area_map[f'{screen_info.screen_name}.{screen_area.area_name}'] = screen_area
 
+        self.identify_index = ScreenIdentifyIndex(self.screen_info_list)
         self.init_screen_route()
 
     def get_screen(self, screen_name: str) -> ScreenInfo:
@@ -94,71 +99,11 @@ class ScreenContext:
 
     def init_screen_route(self) -> None:
         """
-        初始化画面间的跳转路径
+        初始化画面间的跳转路径 只计算前驱数组 具体的路径在使用时再生成
         :return:
         """
-        # 先对任意两个画面之间做初始化
-        for screen_1 in self.screen_info_list:
-            self.screen_route_map[screen_1.screen_name] = {}
-            for screen_2 in self.screen_info_list:
-                self.screen_route_map[screen_1.screen_name][screen_2.screen_name] = ScreenRoute(
-                    from_screen=screen_1.screen_name,
-                    to_screen=screen_2.screen_name
-                )
-
-        # 根据画面的goto_list来初始化边
-        for screen_info in self.screen_info_list:
-            for area in screen_info.area_list:
-                if area.goto_list is None or len(area.goto_list) == 0:
-                    continue
-                from_screen_route = self.screen_route_map[screen_info.screen_name]
-                if from_screen_route is None:
-                    log.error('画面路径没有初始化 %s', screen_info.screen_name)
-                    continue
-                for goto_screen_name in area.goto_list:
-                    if goto_screen_name not in from_screen_route:
-                        log.error('画面路径 %s -> %s 无法找到目标画面', screen_info.screen_name, goto_screen_name)
-                        continue
-                    from_screen_route[goto_screen_name].node_list.append(
-                        ScreenRouteNode(
-                            from_screen=screen_info.screen_name,
-                            from_area=area.area_name,
-                            to_screen=goto_screen_name
-                        )
-                    )
-
-        # Floyd算出任意两个画面之间的路径
-        screen_len = len(self.screen_info_list)
-        for k in range(screen_len):
-            screen_k = self.screen_info_list[k]
-            for i in range(screen_len):
-                if i == k:
-                    continue
-                screen_i = self.screen_info_list[i]
-
-                route_ik: ScreenRoute = self.screen_route_map[screen_i.screen_name][screen_k.screen_name]
-                if not route_ik.can_go:  # 无法从 i 到 k
-                    continue
-
-                for j in range(screen_len):
-                    if k == j or i == j:
-                        continue
-                    screen_j = self.screen_info_list[j]
-
-                    route_kj: ScreenRoute = self.screen_route_map[screen_k.screen_name][screen_j.screen_name]
-                    if not route_kj.can_go:  # 无法从 k 到 j
-                        continue
-
-                    route_ij: ScreenRoute = self.screen_route_map[screen_i.screen_name][screen_j.screen_name]
-
-                    if (not route_ij.can_go  # 当前无法从 i 到 j
-                        or len(route_ik.node_list) + len(route_kj.node_list) < len(route_ij.node_list)  # 新的更短
-                    ):
-                        route_ij.node_list = []
-                        for node_ik in route_ik.node_list:
-                            route_ij.node_list.append(node_ik)
-                        for node_kj in route_kj.node_list:
-                            route_ij.node_list.append(node_kj)
+        self.screen_route_map = {}
+        self._route_table = ScreenRouteTable.build(self.screen_info_list)
 
     def get_screen_route(self, from_screen: str, to_screen: str) -> Optional[ScreenRoute]:
         """
@@ -168,13 +113,48 @@ class ScreenContext:
         :return:
         """
         from_route = self.screen_route_map.get(from_screen, None)
-        if from_route is None:
+        if from_route is not None and to_screen in from_route:
+            return from_route[to_screen]
+
+        node_list = self._route_table.get_node_list(from_screen, to_screen)
+        if node_list is None:
             return None
-        return from_route.get(to_screen, None)
+
+        route = ScreenRoute(from_screen=from_screen, to_screen=to_screen)
+        route.node_list = [
+            ScreenRouteNode(from_screen=node[0], from_area=node[1], to_screen=node[2])
+            for node in node_list
+        ]
+        if from_route is None:
+            from_route = {}
+            self.screen_route_map[from_screen] = from_route
+        from_route[to_screen] = route
+        return route
 
     def update_current_screen_name(self, screen_name: str) -> None:
         """
         更新当前的画面名字
         """
         self.last_screen_name = self.current_screen_name
-        self.current_screen_name = screen_name
\ No newline at end of file
+        self.current_screen_name = screen_name
+        if screen_name is not None:
+            for record in self._visited_record_list:
+                record.add(screen_name)
+
+    def start_visit_recording(self) -> set[str]:
+        """
+        开始记录到达过的画面 应用嵌套运行时 每个应用各自记录
+        :return: 这次的记录 停止时传入
+        """
+        record: set[str] = set()
+        self._visited_record_list = self._visited_record_list + [record]
+        return record
+
+    def stop_visit_recording(self, record: set[str]) -> set[str]:
+        """
+        停止记录到达过的画面
+        :param record: 开始记录时返回的记录
+        :return: 记录期间到达过的画面
+        """
+        self._visited_record_list = [i for i in self._visited_record_list if i is not record]
+        return set(record)
\ No newline at end of file
@@ -0,0 +1,101 @@
+from typing import List, Optional, Tuple
+
+from one_dragon.base.screen.screen_info import ScreenInfo
+from one_dragon.utils.log_utils import log
+
+
+class ScreenRouteTable:
+
+    def __init__(self, screen_name_list: List[str],
+                 pre_screen: List[List[int]],
+                 pre_area: List[List[Optional[str]]]):
+        """
+        任意两个画面之间的最短跳转路径 使用前驱数组保存
+        pre_screen[i][j] 为从画面i出发 到达画面j前的上一个画面 -1 为无法到达
+        pre_area[i][j] 为在上一个画面中 需要点击的区域
+        :param screen_name_list: 画面名称 下标与前驱数组一致
+        :param pre_screen: 前驱画面
+        :param pre_area: 前驱画面中点击的区域
+        """
+        self.screen_name_list: List[str] = screen_name_list
+        self.screen_idx_map: dict[str, int] = {name: idx for idx, name in enumerate(screen_name_list)}
+        self.pre_screen: List[List[int]] = pre_screen
+        self.pre_area: List[List[Optional[str]]] = pre_area
+
+    @staticmethod
+    def build(screen_info_list: List[ScreenInfo]) -> 'ScreenRouteTable':
+        """
+        根据画面的 goto_list 计算路径 每个画面出发进行一次广度优先搜索
+        同样步数的路径中 优先使用画面顺序和区域顺序靠前的
+        :param screen_info_list: 画面列表
+        :return:
+        """
+        screen_name_list = [i.screen_name for i in screen_info_list]
+        screen_idx_map = {name: idx for idx, name in enumerate(screen_name_list)}
+        screen_len = len(screen_name_list)
+
+        # 邻接表 (目标画面下标, 点击的区域)
+        adj_list: List[List[Tuple[int, str]]] = [[] for _ in range(screen_len)]
+        for idx, screen_info in enumerate(screen_info_list):
+            for area in screen_info.area_list:
+                if area.goto_list is None or len(area.goto_list) == 0:
+                    continue
+                for goto_screen_name in area.goto_list:
+                    goto_idx = screen_idx_map.get(goto_screen_name)
+                    if goto_idx is None:
+                        log.error('画面路径 %s -> %s 无法找到目标画面', screen_info.screen_name, goto_screen_name)
+                        continue
+                    adj_list[idx].append((goto_idx, area.area_name))
+
+        pre_screen: List[List[int]] = []
+        pre_area: List[List[Optional[str]]] = []
+        for source in range(screen_len):
+            pre_screen_row = [-1] * screen_len
+            pre_area_row: List[Optional[str]] = [None] * screen_len
+            visited = [False] * screen_len
+            visited[source] = True
+            queue = [source]
+            for current in queue:  # 遍历时追加 相当于队列
+                for goto_idx, area_name in adj_list[current]:
+                    if goto_idx == source and current == source and pre_screen_row[source] == -1:
+                        # 点击后停留在原画面 作为到自身的路径
+                        pre_screen_row[source] = source
+                        pre_area_row[source] = area_name
+                    if visited[goto_idx]:
+                        continue
+                    visited[goto_idx] = True
+                    pre_screen_row[goto_idx] = current
+                    pre_area_row[goto_idx] = area_name
+                    queue.append(goto_idx)
+            pre_screen.append(pre_screen_row)
+            pre_area.append(pre_area_row)
+
+        return ScreenRouteTable(screen_name_list, pre_screen, pre_area)
+
+    def get_node_list(self, from_screen: str, to_screen: str) -> Optional[List[Tuple[str, str, str]]]:
+        """
+        两个画面之间的路径
+        :param from_screen: 出发画面
+        :param to_screen: 目标画面
+        :return: 画面不存在时返回空 无法到达时返回空列表 否则为每一步的 (当前画面, 点击区域, 下一个画面)
+        """
+        from_idx = self.screen_idx_map.get(from_screen)
+        to_idx = self.screen_idx_map.get(to_screen)
+        if from_idx is None or to_idx is None:
+            return None
+
+        pre_screen_row = self.pre_screen[from_idx]
+        pre_area_row = self.pre_area[from_idx]
+        if pre_screen_row[to_idx] == -1:
+            return []
+
+        node_list: List[Tuple[str, str, str]] = []
+        current = to_idx
+        while True:
+            pre = pre_screen_row[current]
+            node_list.append((self.screen_name_list[pre], pre_area_row[current], self.screen_name_list[current]))
+            current = pre
+            if current == from_idx:
+                break
+        node_list.reverse()
+        return node_list
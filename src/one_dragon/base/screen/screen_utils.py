@@ -1,14 +1,14 @@
-import cv2
-import numpy as np
 from cv2.typing import MatLike
 from enum import Enum
 from typing import Optional, List
 
 from one_dragon.base.geometry.point import Point
+from one_dragon.base.matcher.match_result import MatchResultList
 from one_dragon.base.operation.one_dragon_context import OneDragonContext
 from one_dragon.base.screen.screen_area import ScreenArea
+from one_dragon.base.screen.screen_identify_index import ScreenIdProbe, ScreenIdentifyState
 from one_dragon.base.screen.screen_info import ScreenInfo
-from one_dragon.utils import cv2_utils, str_utils
+from one_dragon.utils import str_utils
 from one_dragon.utils.i18_utils import gt
 
 
@@ -27,25 +27,29 @@ class FindAreaResultEnum(Enum):
     AREA_NO_CONFIG: int = -2  # 区域配置找不到
 
 
-def find_area(ctx: OneDragonContext, screen: MatLike, screen_name: str, area_name: str) -> FindAreaResultEnum:
+def find_area(ctx: OneDragonContext, screen: MatLike, screen_name: str, area_name: str,
+              reuse_unchanged: bool = False) -> FindAreaResultEnum:
     """
     游戏截图中 是否能找到对应的区域
     :param ctx: 上下文
     :param screen: 游戏截图
     :param screen_name: 画面名称
     :param area_name: 区域名称
+    :param reuse_unchanged: 区域画面没有变化时 复用上一次的识别结果
     :return: 结果
     """
     area: ScreenArea = ctx.screen_loader.get_area(screen_name, area_name)
-    return find_area_in_screen(ctx, screen, area)
+    return find_area_in_screen(ctx, screen, area, reuse_unchanged=reuse_unchanged)
 
 
-def find_area_in_screen(ctx: OneDragonContext, screen: MatLike, area: ScreenArea) -> FindAreaResultEnum:
+def find_area_in_screen(ctx: OneDragonContext, screen: MatLike, area: ScreenArea,
+                        reuse_unchanged: bool = False) -> FindAreaResultEnum:
     """
     游戏截图中 是否能找到对应的区域
     :param ctx: 上下文
     :param screen: 游戏截图
     :param area: 区域
+    :param reuse_unchanged: 区域画面没有变化时 复用上一次的识别结果
     :return: 结果
     """
     if area is None:
@@ -53,29 +57,16 @@ def find_area_in_screen(ctx: OneDragonContext, screen: MatLike, area: ScreenArea
 
     find: bool = False
     if area.is_text_area:
-        rect = area.rect
-        part = cv2_utils.crop_image_only(screen, rect)
-
-        if area.color_range is None:
-            to_ocr = part
+        if area.single_line:  # 单行文本 跳过文本检测 只进行识别
+            ocr_result_map = ctx.frame_cache.run_ocr_batch(screen, ctx.ocr, [area], reuse_unchanged=reuse_unchanged)[0]
         else:
-            mask = cv2.inRange(part,
-                               np.array(area.color_range[0], dtype=np.uint8),
-                               np.array(area.color_range[1], dtype=np.uint8))
-            mask = cv2_utils.dilate(mask, 2)
-            to_ocr = cv2.bitwise_and(part, part, mask=mask)
-
-        ocr_result_map = ctx.ocr.run_ocr(to_ocr)
-        for ocr_result, mrl in ocr_result_map.items():
-            if str_utils.find_by_lcs(gt(area.text), ocr_result, percent=area.lcs_percent):
-                find = True
-                break
+            ocr_result_map = ctx.frame_cache.run_ocr(screen, ctx.ocr, area.rect, color_range=area.color_range,
+                                                     reuse_unchanged=reuse_unchanged)
+        find = is_text_in_ocr_result(area, ocr_result_map)
     elif area.is_template_area:
-        rect = area.rect
-        part = cv2_utils.crop_image_only(screen, rect)
-
-        mrl = ctx.tm.match_template(part, area.template_sub_dir, area.template_id,
-                                    threshold=area.template_match_threshold)
+        mrl = ctx.frame_cache.match_template(screen, ctx.tm, area.rect, area.template_sub_dir, area.template_id,
+                                             threshold=area.template_match_threshold,
+                                             reuse_unchanged=reuse_unchanged)
         find = mrl.max is not None
 
     return FindAreaResultEnum.TRUE if find else FindAreaResultEnum.FALSE
@@ -94,11 +85,10 @@ def find_and_click_area(ctx: OneDragonContext, screen: MatLike, screen_name: str
     if area is None:
         return OcrClickResultEnum.AREA_NO_CONFIG
     if area.is_text_area:
-        rect = area.rect
-        part = cv2_utils.crop_image_only(screen, rect)
-        # cv2_utils.show_image(part, win_name='debug')
-
-        ocr_result_map = ctx.ocr.run_ocr(part)
+        if area.single_line:  # 单行文本 跳过文本检测 只进行识别
+            ocr_result_map = ctx.frame_cache.run_ocr_batch(screen, ctx.ocr, [area])[0]
+        else:
+            ocr_result_map = ctx.frame_cache.run_ocr(screen, ctx.ocr, area.rect)
         for ocr_result, mrl in ocr_result_map.items():
             if str_utils.find_by_lcs(gt(area.text), ocr_result, percent=area.lcs_percent):
                 to_click = mrl.max.center + area.left_top
@@ -110,10 +100,8 @@ def find_and_click_area(ctx: OneDragonContext, screen: MatLike, screen_name: str
         return OcrClickResultEnum.OCR_CLICK_NOT_FOUND
     elif area.is_template_area:
         rect = area.rect
-        part = cv2_utils.crop_image_only(screen, rect)
-
-        mrl = ctx.tm.match_template(part, area.template_sub_dir, area.template_id,
-                                    threshold=area.template_match_threshold)
+        mrl = ctx.frame_cache.match_template(screen, ctx.tm, rect, area.template_sub_dir, area.template_id,
+                                             threshold=area.template_match_threshold)
         if mrl.max is None:
             return OcrClickResultEnum.OCR_CLICK_NOT_FOUND
         elif ctx.controller.click(mrl.max.center + rect.left_top, pc_alt=area.pc_alt):
@@ -125,46 +113,142 @@ def find_and_click_area(ctx: OneDragonContext, screen: MatLike, screen_name: str
         return OcrClickResultEnum.OCR_CLICK_SUCCESS
 
 
-def get_match_screen_name(ctx: OneDragonContext, screen: MatLike) -> str:
+def get_match_screen_name(ctx: OneDragonContext, screen: MatLike,
+                          state: Optional[ScreenIdentifyState] = None) -> str:
     """
     根据游戏截图 匹配一个最合适的画面
+    按 get_screen_candidate_list 的顺序 使用画面识别的索引判断
     :param ctx: 上下文
     :param screen: 游戏截图
+    :param state: 识别中的结果 传入时可以获取识别的统计
     :return: 画面名字
     """
+    if state is None:
+        state = ScreenIdentifyState()
+    for screen_name in get_screen_candidate_list(ctx):
+        if is_target_screen_by_index(ctx, screen, screen_name, state):
+            return screen_name
+
+
+def get_screen_candidate_list(ctx: OneDragonContext) -> List[str]:
+    """
+    识别画面时的判断顺序
+    有记录上次所在画面时 从这个画面开始按跳转关系广度优先搜索 最后是搜索中没有出现的画面
+    :param ctx: 上下文
+    :return: 画面名称列表
+    """
     bfs_list = []
     if ctx.screen_loader.current_screen_name is not None:  # 如果有记录上次所在画面 则从这个画面开始搜索
         bfs_list.append(ctx.screen_loader.current_screen_name)
     if ctx.screen_loader.last_screen_name is not None:
         bfs_list.append(ctx.screen_loader.last_screen_name)
-    if len(bfs_list) > 0:
-        bfs_idx = 0
-        while bfs_idx < len(bfs_list):
-            current_screen_name = bfs_list[bfs_idx]
-            bfs_idx += 1
-            if is_target_screen(ctx, screen, screen_name=current_screen_name):
-                return current_screen_name
-
-            screen_info = ctx.screen_loader.get_screen(current_screen_name)
-            if screen_info is None:
-                continue
-            for area in screen_info.area_list:
-                if area.goto_list is None or len(area.goto_list) == 0:
-                    continue
-                for goto_screen in area.goto_list:
-                    if goto_screen not in bfs_list:
-                        bfs_list.append(goto_screen)
-
-        # 最后 尝试搜索中没有出现的画面
-        for screen_info in ctx.screen_loader.screen_info_list:
-            if screen_info.screen_name in bfs_list:
+
+    bfs_idx = 0
+    while bfs_idx < len(bfs_list):
+        current_screen_name = bfs_list[bfs_idx]
+        bfs_idx += 1
+
+        screen_info = ctx.screen_loader.get_screen(current_screen_name)
+        if screen_info is None:
+            continue
+        for area in screen_info.area_list:
+            if area.goto_list is None or len(area.goto_list) == 0:
                 continue
-            if is_target_screen(ctx, screen, screen_info=screen_info):
-                return screen_info.screen_name
+            for goto_screen in area.goto_list:
+                if goto_screen not in bfs_list:
+                    bfs_list.append(goto_screen)
+
+    # 最后 尝试搜索中没有出现的画面
+    for screen_info in ctx.screen_loader.screen_info_list:
+        if screen_info.screen_name not in bfs_list:
+            bfs_list.append(screen_info.screen_name)
+
+    return bfs_list
+
+
+def is_target_screen_by_index(ctx: OneDragonContext, screen: MatLike, screen_name: str,
+                              state: ScreenIdentifyState) -> bool:
+    """
+    使用画面识别的索引 判断是否目标画面 结果与 is_target_screen 一致
+    - 同一次识别中 已经得到的判断结果直接复用 任一不符合时 不需要识别就可以否定
+    - 先进行模板匹配 再进行OCR
+    - 文本区域先单独OCR一个 通过后剩余的再合并成一次批量OCR
+    :param ctx: 上下文
+    :param screen: 游戏截图
+    :param screen_name: 画面名称
+    :param state: 识别中的结果
+    :return:
+    """
+    probe_list = ctx.screen_loader.identify_index.get_probe_list(screen_name)
+    if probe_list is None:
+        return False
+
+    for probe in probe_list:
+        if state.probe_result.get(probe.key) is False:
+            return False
+    state.checked_screen_cnt += 1
+
+    text_probe_list: List[ScreenIdProbe] = []
+    for probe in probe_list:
+        if probe.key in state.probe_result:
+            continue
+        if not probe.is_text:
+            if not _check_template_probe(ctx, screen, probe, state):
+                return False
+        elif probe.ocr_key in state.ocr_result:  # 同一区域已经OCR过 只需要比较文本
+            if not _check_text_probe(probe, state):
+                return False
+        else:
+            text_probe_list.append(probe)
+
+    if len(text_probe_list) == 0:
+        return True
+
+    # 先OCR一个区域 大部分不符合的画面在这里就可以否定
+    _run_probe_ocr(ctx, screen, text_probe_list[:1], state)
+    if not _check_text_probe(text_probe_list[0], state):
+        return False
+
+    _run_probe_ocr(ctx, screen, text_probe_list[1:], state)
+    return all(_check_text_probe(probe, state) for probe in text_probe_list[1:])
+
+
+def _check_template_probe(ctx: OneDragonContext, screen: MatLike, probe: ScreenIdProbe,
+                          state: ScreenIdentifyState) -> bool:
+    # 画面标识区域在停留期间基本不变 画面没有变化时复用上次的结果
+    result = find_area_in_screen(ctx, screen, probe.area, reuse_unchanged=True) == FindAreaResultEnum.TRUE
+    state.template_cnt += 1
+    state.probe_result[probe.key] = result
+    return result
+
+
+def _run_probe_ocr(ctx: OneDragonContext, screen: MatLike, probe_list: List[ScreenIdProbe],
+                   state: ScreenIdentifyState) -> None:
+    area_list: List[ScreenArea] = []
+    ocr_key_list: List[tuple] = []
+    for probe in probe_list:
+        if probe.ocr_key in state.ocr_result or probe.ocr_key in ocr_key_list:
+            continue
+        area_list.append(probe.area)
+        ocr_key_list.append(probe.ocr_key)
+    if len(area_list) == 0:
+        return
+
+    if len(area_list) == 1 and not area_list[0].single_line:
+        area = area_list[0]
+        ocr_result_list = [ctx.frame_cache.run_ocr(screen, ctx.ocr, area.rect, color_range=area.color_range,
+                                                   reuse_unchanged=True)]
     else:
-        for screen_info in ctx.screen_loader.screen_info_list:
-            if is_target_screen(ctx, screen, screen_info=screen_info):
-                return screen_info.screen_name
+        ocr_result_list = ctx.frame_cache.run_ocr_batch(screen, ctx.ocr, area_list, reuse_unchanged=True)
+    state.ocr_cnt += len(area_list)
+    for ocr_key, ocr_result_map in zip(ocr_key_list, ocr_result_list):
+        state.ocr_result[ocr_key] = ocr_result_map
+
+
+def _check_text_probe(probe: ScreenIdProbe, state: ScreenIdentifyState) -> bool:
+    result = is_text_in_ocr_result(probe.area, state.ocr_result[probe.ocr_key])
+    state.probe_result[probe.key] = result
+    return result
 
 
 def is_target_screen(ctx: OneDragonContext, screen: MatLike,
@@ -185,18 +269,69 @@ def is_target_screen(ctx: OneDragonContext, screen: MatLike,
         if screen_info is None:
             return False
 
-    existed_id_mark: bool = False
-    fit_id_mark: bool = True
-    for screen_area in screen_info.area_list:
-        if not screen_area.id_mark:
+    id_area_list: List[ScreenArea] = [i for i in screen_info.area_list if i.id_mark]
+    if len(id_area_list) == 0:
+        return False
+
+    # 先匹配耗时较少的模板区域 不符合时可以提前结束
+    text_area_list: List[ScreenArea] = []
+    for screen_area in id_area_list:
+        if screen_area.is_text_area:
+            text_area_list.append(screen_area)
             continue
-        existed_id_mark = True
+        # 画面标识区域在停留期间基本不变 画面没有变化时复用上次的结果
+        if find_area_in_screen(ctx, screen, screen_area, reuse_unchanged=True) != FindAreaResultEnum.TRUE:
+            return False
 
-        if find_area_in_screen(ctx, screen, screen_area) != FindAreaResultEnum.TRUE:
-            fit_id_mark = False
-            break
+    result_list = find_area_list_in_screen(ctx, screen, text_area_list, reuse_unchanged=True)
+    return all(result == FindAreaResultEnum.TRUE for result in result_list)
 
-    return existed_id_mark and fit_id_mark
+
+def find_area_list_in_screen(ctx: OneDragonContext, screen: MatLike, area_list: List[ScreenArea],
+                             reuse_unchanged: bool = False) -> List[FindAreaResultEnum]:
+    """
+    游戏截图中 是否能找到各个区域
+    多个文本区域会合并成一次批量OCR
+    :param ctx: 上下文
+    :param screen: 游戏截图
+    :param area_list: 区域列表
+    :param reuse_unchanged: 区域画面没有变化时 复用上一次的识别结果
+    :return: 与区域一一对应的结果
+    """
+    result_list: List[FindAreaResultEnum] = []
+    text_idx_list: List[int] = []
+    for idx, area in enumerate(area_list):
+        if area is not None and area.is_text_area:
+            text_idx_list.append(idx)
+            result_list.append(FindAreaResultEnum.FALSE)
+        else:
+            result_list.append(find_area_in_screen(ctx, screen, area, reuse_unchanged=reuse_unchanged))
+
+    if len(text_idx_list) == 1:
+        idx = text_idx_list[0]
+        result_list[idx] = find_area_in_screen(ctx, screen, area_list[idx], reuse_unchanged=reuse_unchanged)
+    elif len(text_idx_list) > 1:
+        text_area_list = [area_list[idx] for idx in text_idx_list]
+        ocr_result_list = ctx.frame_cache.run_ocr_batch(screen, ctx.ocr, text_area_list,
+                                                        reuse_unchanged=reuse_unchanged)
+        for idx, ocr_result_map in zip(text_idx_list, ocr_result_list):
+            if is_text_in_ocr_result(area_list[idx], ocr_result_map):
+                result_list[idx] = FindAreaResultEnum.TRUE
+
+    return result_list
+
+
+def is_text_in_ocr_result(area: ScreenArea, ocr_result_map: dict[str, MatchResultList]) -> bool:
+    """
+    OCR结果中 是否有区域的目标文本
+    :param area: 文本区域
+    :param ocr_result_map: 区域的OCR结果
+    :return:
+    """
+    for ocr_result in ocr_result_map.keys():
+        if str_utils.find_by_lcs(gt(area.text), ocr_result, percent=area.lcs_percent):
+            return True
+    return False
 
 
 def find_by_ocr(ctx: OneDragonContext, screen: MatLike, target_cn: str,
@@ -214,11 +349,8 @@ def find_by_ocr(ctx: OneDragonContext, screen: MatLike, target_cn: str,
     """
     if lcs_percent is None:
         lcs_percent = area.lcs_percent
-    to_ocr_part = screen if area is None else cv2_utils.crop_image_only(screen, area.rect)
-    if color_range is not None:
-        mask = cv2.inRange(to_ocr_part, color_range[0], color_range[1])
-        to_ocr_part = cv2.bitwise_and(to_ocr_part, to_ocr_part, mask=mask)
-    ocr_result_map = ctx.ocr.run_ocr(to_ocr_part)
+    ocr_result_map = ctx.frame_cache.run_ocr(screen, ctx.ocr, None if area is None else area.rect,
+                                             color_range=color_range, dilate_k=0)
 
     to_click: Optional[Point] = None
     for ocr_result, mrl in ocr_result_map.items():
@@ -228,4 +360,72 @@ def find_by_ocr(ctx: OneDragonContext, screen: MatLike, target_cn: str,
             to_click = mrl.max.center
             break
 
-    return to_click is not None
\ No newline at end of file
+    return to_click is not None
+
+
+def __debug_screen_identify_benchmark(image_dir: Optional[str] = None):
+    """
+    对每个画面保存的截图 对比逐个画面判断 和 使用画面识别索引 的结果、识别次数和耗时
+    截图按画面名称放在子文件夹中 例如 .debug/screen/菜单/xxx.png
+    每张截图都当作未知画面识别 不使用上次所在的画面
+    :param image_dir: 截图目录
+    """
+    import os
+    import time
+    from one_dragon.base.screen.frame_cache import FrameCacheCategory
+    from one_dragon.utils import cv2_utils, debug_utils
+    from one_dragon.utils.latency_histogram import LatencyHistogram
+
+    if image_dir is None:
+        image_dir = os.path.join(debug_utils.get_debug_dir_path(), 'screen')
+
+    ctx = OneDragonContext()
+    ctx.init_by_config()
+    ctx.ocr.init_model()
+    print(ctx.screen_loader.identify_index.stats_display_text)
+
+    item_list = []
+    for screen_name in sorted(os.listdir(image_dir)):
+        sub_dir = os.path.join(image_dir, screen_name)
+        if not os.path.isdir(sub_dir):
+            continue
+        for file_name in sorted(os.listdir(sub_dir)):
+            image = cv2_utils.read_image(os.path.join(sub_dir, file_name))
+            if image is not None:
+                item_list.append((screen_name, image))
+    print('截图 %d 张' % len(item_list))
+
+    def _linear(screen) -> Optional[str]:
+        for screen_name in get_screen_candidate_list(ctx):
+            if is_target_screen(ctx, screen, screen_name=screen_name):
+                return screen_name
+
+    def _index(screen) -> Optional[str]:
+        return get_match_screen_name(ctx, screen, state=ScreenIdentifyState())
+
+    ctx.screen_loader.current_screen_name = None
+    ctx.screen_loader.last_screen_name = None
+    for name, method in [('逐个画面', _linear), ('画面索引', _index)]:
+        latency = LatencyHistogram(name)
+        correct_cnt = 0
+        template_cnt = 0
+        ocr_cnt = 0
+        for screen_name, image in item_list:
+            ctx.frame_cache.clear()  # 每张截图都重新识别 不复用之前的结果
+            ctx.frame_cache.reset_stats()
+            start = time.perf_counter()
+            result = method(image)
+            latency.record(time.perf_counter() - start)
+            if result == screen_name:
+                correct_cnt += 1
+            stats = ctx.frame_cache.get_stats()
+            template_cnt += stats.get(FrameCacheCategory.TEMPLATE, (0, 0))[1]
+            ocr_cnt += stats.get(FrameCacheCategory.OCR, (0, 0))[1]
+        total = max(1, len(item_list))
+        print('%s 正确 %d/%d 平均每张 模板匹配 %.1f 次 OCR %.1f 次' % (
+            name, correct_cnt, len(item_list), template_cnt / total, ocr_cnt / total))
+        print(latency.display_text)
+
+
+if __name__ == '__main__':
+    __debug_screen_identify_benchmark()
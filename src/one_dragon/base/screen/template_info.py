@@ -30,7 +30,17 @@ class TemplateShapeEnum(Enum):
 
 class TemplateInfo(YamlOperator):
 
-    def __init__(self, sub_dir: str, template_id: str):
+    def __init__(self, sub_dir: str, template_id: str,
+                 config_data: Optional[dict] = None,
+                 raw: Optional[MatLike] = None,
+                 mask: Optional[MatLike] = None):
+        """
+        :param sub_dir: 模板分类
+        :param template_id: 模板id
+        :param config_data: 已经读取的配置 传入时不再读取配置文件 模板包中使用
+        :param raw: 已经读取的原图 与 config_data 一起传入时 不再读取图片
+        :param mask: 已经读取的掩码
+        """
         # 旧的模板ID 在开发工具中使用 方便更改后迁移文件
         self.old_sub_dir: str = sub_dir
         self.old_template_id: str = template_id
@@ -40,7 +50,12 @@ class TemplateInfo(YamlOperator):
 
         self.screen_image: Optional[MatLike] = None
 
-        YamlOperator.__init__(self, file_path=self.get_yml_file_path())
+        if config_data is None:
+            YamlOperator.__init__(self, file_path=self.get_yml_file_path())
+        else:
+            YamlOperator.__init__(self)
+            self.file_path = self.get_yml_file_path()
+            self.data = config_data
 
         self.template_name: str = self.get('template_name', '')
         self.template_shape: str = self.get('template_shape', TemplateShapeEnum.RECTANGLE.value.value)
@@ -52,13 +67,32 @@ class TemplateInfo(YamlOperator):
         self.auto_mask: bool = self.get('auto_mask', True)
         self.point_updated: bool = False  # 点位是否更改过 开发工具中用
 
-        self.raw: MatLike = cv2_utils.read_image(get_template_raw_path(self.sub_dir, self.template_id))  # 原图
-        self.mask: MatLike = cv2_utils.read_image(get_template_mask_path(self.sub_dir, self.template_id))  # 掩码
+        if config_data is None:
+            self.raw: MatLike = cv2_utils.read_image(get_template_raw_path(self.sub_dir, self.template_id))  # 原图
+            self.mask: MatLike = cv2_utils.read_image(get_template_mask_path(self.sub_dir, self.template_id))  # 掩码
+        else:
+            self.raw: MatLike = raw
+            self.mask: MatLike = mask
 
         # 运算后保存在内存的
         self._gray: MatLike = None  # 灰度图
         self._kps: List[cv2.KeyPoint] = None  # 关键点
         self._desc: MatLike = None  # 描述
+        self._kps_np: Optional[np.ndarray] = None  # 模板包中的关键点 使用时再转换
+
+    def set_precomputed(self, gray: Optional[MatLike] = None,
+                        kps_np: Optional[np.ndarray] = None, desc: Optional[MatLike] = None) -> None:
+        """
+        设置预先计算的灰度图和特征 模板包中使用
+        :param gray: 灰度图
+        :param kps_np: 关键点 cv2_utils.feature_keypoints_to_np 的格式
+        :param desc: 描述
+        :return:
+        """
+        self._gray = gray
+        if kps_np is not None and desc is not None:
+            self._kps_np = kps_np
+            self._desc = desc
 
     def get_yml_file_path(self) -> str:
         return get_template_config_path(self.sub_dir, self.template_id)
@@ -130,6 +164,9 @@ class TemplateInfo(YamlOperator):
     def features(self) -> Tuple[List[cv2.KeyPoint], MatLike]:
         if self._kps is not None:
             return self._kps, self._desc
+        if self._kps_np is not None:
+            self._kps = tuple(cv2_utils.feature_keypoints_from_np(self._kps_np))
+            return self._kps, self._desc
         if self.raw is not None:
             self._kps, self._desc = cv2_utils.feature_detect_and_compute(self.raw, self.mask)
         return self._kps, self._desc
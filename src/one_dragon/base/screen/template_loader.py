@@ -1,15 +1,32 @@
 import os
+import threading
+import time
 from cv2.typing import MatLike
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 
 from one_dragon.base.screen.template_info import TemplateInfo, is_template_existed
+from one_dragon.base.screen.template_pack import TemplatePack, get_template_pack_path
 from one_dragon.utils import os_utils
 
 
 class TemplateLoader:
 
-    def __init__(self):
+    def __init__(self, use_pack: bool = True, pack_path: Optional[str] = None):
+        """
+        模板加载器
+        :param use_pack: 优先使用 build_template_pack 生成的模板包 没有模板包或模板已修改时使用散装文件
+        :param pack_path: 模板包路径 为空时使用默认路径
+        """
         self.template: dict[str, TemplateInfo] = {}
+        self.use_pack: bool = use_pack
+        self.pack_path: Optional[str] = pack_path
+        self._pack: Optional[TemplatePack] = None
+        self._pack_lock = threading.Lock()
+
+        # 正在进行的使用记录 每个记录为 模板 -> (第一次获取的耗时, 是否需要加载)
+        # 只在开始和停止时整体替换列表 获取模板时不需要加锁
+        self._record_list: List[Dict[Tuple[str, str], Tuple[float, bool]]] = []
+        self._record_lock = threading.Lock()
 
     def get_all_template_info_from_disk(self, need_raw: bool = True, need_config: bool = False) -> List[TemplateInfo]:
         """
@@ -50,9 +67,12 @@ class TemplateLoader:
         :param only_mask:
         :return: 模板图片
         """
-        if not is_template_existed(sub_dir, template_id, need_raw=not only_mask):
-            return None
-        template: TemplateInfo = TemplateInfo(sub_dir, template_id)
+        pack = self.get_pack()
+        template: Optional[TemplateInfo] = pack.get_template(sub_dir, template_id) if pack is not None else None
+        if template is None:
+            if not is_template_existed(sub_dir, template_id, need_raw=not only_mask):
+                return None
+            template = TemplateInfo(sub_dir, template_id)
 
         key = '%s:%s' % (sub_dir, template_id)
         self.template[key] = template
@@ -66,10 +86,59 @@ class TemplateLoader:
         :return: 模板图片
         """
         key = '%s:%s' % (sub_dir, template_id)
-        if key in self.template:
-            return self.template[key]
-        else:
-            return self.load_template(sub_dir, template_id)
+        template_key = (sub_dir, template_id)
+        to_record_list = [i for i in self._record_list if template_key not in i]
+        if len(to_record_list) == 0:
+            if key in self.template:
+                return self.template[key]
+            else:
+                return self.load_template(sub_dir, template_id)
+
+        start = time.perf_counter()
+        template = self.template.get(key)
+        cold = template is None
+        if cold:
+            template = self.load_template(sub_dir, template_id)
+        hit = (time.perf_counter() - start, cold)
+        for record in to_record_list:
+            record[template_key] = hit
+        return template
+
+    def preload(self, sub_dir: str, template_id: str) -> Optional[TemplateInfo]:
+        """
+        预热 加载模板并计算灰度图 不计入使用记录
+        :param sub_dir: 子文件夹
+        :param template_id: 模板id
+        :return:
+        """
+        key = '%s:%s' % (sub_dir, template_id)
+        template = self.template.get(key)
+        if template is None:
+            template = self.load_template(sub_dir, template_id)
+        if template is not None:
+            _ = template.gray
+        return template
+
+    def start_recording(self) -> Dict[Tuple[str, str], Tuple[float, bool]]:
+        """
+        开始记录模板的使用情况 应用开始运行时调用
+        应用嵌套运行时 每个应用各自记录 互不影响
+        :return: 这次的记录 停止时传入
+        """
+        record: Dict[Tuple[str, str], Tuple[float, bool]] = {}
+        with self._record_lock:
+            self._record_list = self._record_list + [record]
+        return record
+
+    def stop_recording(self, record: Dict[Tuple[str, str], Tuple[float, bool]]) -> Dict[Tuple[str, str], Tuple[float, bool]]:
+        """
+        停止记录
+        :param record: 开始记录时返回的记录
+        :return: 记录期间使用过的模板 以及第一次获取的耗时 和当时是否需要加载
+        """
+        with self._record_lock:
+            self._record_list = [i for i in self._record_list if i is not record]
+        return dict(record)
 
     def get_template_mask(self, sub_dir: str, template_id: str) -> MatLike:
         """
@@ -83,3 +152,26 @@ class TemplateLoader:
             return self.template[key].mask
         else:
             return self.load_template(sub_dir, template_id, only_mask=True).mask
+
+    def get_pack(self) -> Optional[TemplatePack]:
+        """
+        模板包 第一次使用时打开
+        :return: 不使用模板包 或模板包不存在时返回空
+        """
+        if not self.use_pack:
+            return None
+        with self._pack_lock:
+            if self._pack is None:
+                self._pack = TemplatePack(self.pack_path if self.pack_path is not None else get_template_pack_path())
+            return self._pack if self._pack.is_valid else None
+
+    def close(self) -> None:
+        """
+        清除加载的模板 并关闭模板包
+        :return:
+        """
+        self.template.clear()
+        with self._pack_lock:
+            if self._pack is not None:
+                self._pack.close()
+                self._pack = None
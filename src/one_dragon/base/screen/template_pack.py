@@ -0,0 +1,330 @@
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+
+import cv2
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+from one_dragon.base.screen.template_info import TemplateInfo, get_template_raw_path, get_template_mask_path, \
+    get_template_config_path
+from one_dragon.utils import os_utils, cv2_utils
+from one_dragon.utils.log_utils import log
+
+TEMPLATE_PACK_FILE_NAME = 'template_pack.bin'
+_PACK_MAGIC = b'ODTPACK1'
+_PACK_VERSION = 1
+_PACK_ALIGN = 64  # 每个数组按64字节对齐
+
+
+def get_template_pack_path() -> str:
+    """
+    模板包的默认路径
+    :return:
+    """
+    return os.path.join(os_utils.get_path_under_work_dir('assets', 'template'), TEMPLATE_PACK_FILE_NAME)
+
+
+def _get_template_file_path_list(sub_dir: str, template_id: str) -> List[str]:
+    return [get_template_raw_path(sub_dir, template_id),
+            get_template_mask_path(sub_dir, template_id),
+            get_template_config_path(sub_dir, template_id)]
+
+
+def get_template_file_size(sub_dir: str, template_id: str) -> List[Optional[int]]:
+    """
+    模板原图、掩码、配置文件的大小 文件不存在时为空
+    :param sub_dir: 模板分类
+    :param template_id: 模板id
+    :return:
+    """
+    size_list = []
+    for file_path in _get_template_file_path_list(sub_dir, template_id):
+        try:
+            size_list.append(os.stat(file_path).st_size)
+        except OSError:
+            size_list.append(None)
+    return size_list
+
+
+def is_template_file_modified(sub_dir: str, template_id: str, size_list: List[Optional[int]],
+                              pack_mtime_ns: int) -> bool:
+    """
+    模板打包后 散装文件是否修改过 例如在开发工具中保存了模板
+    文件大小变化 或修改时间晚于模板包时 认为修改过
+    :param sub_dir: 模板分类
+    :param template_id: 模板id
+    :param size_list: 打包时的文件大小
+    :param pack_mtime_ns: 模板包的修改时间
+    :return:
+    """
+    for file_path, size in zip(_get_template_file_path_list(sub_dir, template_id), size_list):
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            if size is not None:
+                return True
+            continue
+        if size is None or stat.st_size != size or stat.st_mtime_ns > pack_mtime_ns:
+            return True
+    return False
+
+
+class TemplatePack:
+
+    def __init__(self, pack_path: str, check_modified: bool = True):
+        """
+        内存映射的模板包 由 build_template_pack 生成
+        启动时只读取索引 模板的图片在使用时直接映射成只读的数组 不需要解码和复制
+        :param pack_path: 模板包路径
+        :param check_modified: 使用模板前检查散装文件是否修改过 修改过时不使用模板包的数据
+        """
+        self.pack_path: str = pack_path
+        self.check_modified: bool = check_modified
+
+        self._file = None
+        self._mmap: Optional[mmap.mmap] = None
+        self._data_offset: int = 0
+        self._pack_mtime_ns: int = 0
+        self._entry_map: Dict[Tuple[str, str], dict] = {}
+        self._use_features: bool = True  # 是否使用预先计算的特征 OpenCV版本不一致时在使用时重新计算
+        self._lock = threading.Lock()
+
+        self._open()
+
+    def _open(self) -> None:
+        if not os.path.exists(self.pack_path):
+            return
+        try:
+            self._pack_mtime_ns = os.stat(self.pack_path).st_mtime_ns
+            self._file = open(self.pack_path, 'rb')
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic = self._mmap[:8]
+            if magic != _PACK_MAGIC:
+                raise ValueError('模板包格式不正确')
+            index_len = struct.unpack('<Q', self._mmap[8:16])[0]
+            index = json.loads(self._mmap[16:16 + index_len].decode('utf-8'))
+            if index.get('version') != _PACK_VERSION:
+                raise ValueError('模板包版本不一致')
+            if index.get('opencv') != cv2.__version__:
+                # 不同版本的特征可能不一致 只使用图片
+                log.info('模板包的OpenCV版本 %s 与当前 %s 不一致 不使用预先计算的特征',
+                         index.get('opencv'), cv2.__version__)
+                self._use_features = False
+            self._data_offset = _align(16 + index_len)
+            for entry in index['template_list']:
+                self._entry_map[(entry['sub_dir'], entry['template_id'])] = entry
+        except Exception:
+            log.error('读取模板包失败 %s', self.pack_path, exc_info=True)
+            self.close()
+
+    @property
+    def is_valid(self) -> bool:
+        return self._mmap is not None
+
+    @property
+    def template_cnt(self) -> int:
+        return len(self._entry_map)
+
+    def _get_array(self, entry: dict, name: str) -> Optional[np.ndarray]:
+        """
+        模板包中的数组 只读 与模板包共用内存
+        """
+        arr_info = entry['arrays'].get(name)
+        if arr_info is None:
+            return None
+        offset, shape, dtype = arr_info
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape)) if len(shape) > 0 else 1
+        return np.frombuffer(self._mmap, dtype=dtype, count=count,
+                             offset=self._data_offset + offset).reshape(shape)
+
+    def get_template(self, sub_dir: str, template_id: str) -> Optional[TemplateInfo]:
+        """
+        从模板包中获取模板
+        :param sub_dir: 模板分类
+        :param template_id: 模板id
+        :return: 模板包中没有 或散装文件已经修改过时 返回空
+        """
+        if self._mmap is None:
+            return None
+        entry = self._entry_map.get((sub_dir, template_id))
+        if entry is None:
+            return None
+        if self.check_modified and is_template_file_modified(sub_dir, template_id, entry['file_size'],
+                                                             self._pack_mtime_ns):
+            return None
+
+        with self._lock:
+            if self._mmap is None:
+                return None
+            template = TemplateInfo(sub_dir, template_id,
+                                    config_data=entry['config'],
+                                    raw=self._get_array(entry, 'raw'),
+                                    mask=self._get_array(entry, 'mask'))
+            template.set_precomputed(gray=self._get_array(entry, 'gray'),
+                                     kps_np=self._get_array(entry, 'kps') if self._use_features else None,
+                                     desc=self._get_array(entry, 'desc') if self._use_features else None)
+        return template
+
+    def close(self) -> None:
+        """
+        关闭模板包 已经获取的模板仍引用映射的内存 需要在不再使用模板后调用
+        :return:
+        """
+        with self._lock:
+            self._entry_map.clear()
+            if self._mmap is not None:
+                try:
+                    self._mmap.close()
+                except BufferError:  # 仍有数组在使用 由垃圾回收释放
+                    pass
+                self._mmap = None
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def _align(offset: int) -> int:
+    return (offset + _PACK_ALIGN - 1) // _PACK_ALIGN * _PACK_ALIGN
+
+
+def build_template_pack(pack_path: Optional[str] = None, with_features: bool = True) -> int:
+    """
+    把所有模板打包成一个文件 发布前或模板更新后运行
+    包含 配置、原图、掩码、灰度图 和预先计算的特征
+    开发工具仍然使用散装的模板文件 修改后的模板在重新打包前 会自动使用散装文件
+    :param pack_path: 模板包路径 为空时使用默认路径
+    :param with_features: 是否预先计算特征
+    :return: 打包的模板数量
+    """
+    from one_dragon.base.screen.template_loader import TemplateLoader
+
+    if pack_path is None:
+        pack_path = get_template_pack_path()
+
+    entry_list: List[dict] = []
+    blob_list: List[bytes] = []
+    data_len: int = 0
+
+    def _add_array(arrays: dict, name: str, arr: Optional[np.ndarray]) -> None:
+        nonlocal data_len
+        if arr is None:
+            return
+        arr = np.ascontiguousarray(arr)
+        offset = _align(data_len)
+        if offset > data_len:
+            blob_list.append(b'\0' * (offset - data_len))
+        blob = arr.tobytes()
+        blob_list.append(blob)
+        data_len = offset + len(blob)
+        arrays[name] = [offset, list(arr.shape), arr.dtype.str]
+
+    for template in TemplateLoader().get_all_template_info_from_disk(need_raw=True):
+        if template.raw is None:
+            continue
+        arrays = {}
+        _add_array(arrays, 'raw', template.raw)
+        _add_array(arrays, 'mask', template.mask)
+        _add_array(arrays, 'gray', template.gray)
+        if with_features:
+            kps, desc = cv2_utils.feature_detect_and_compute(template.raw, template.mask)
+            if desc is not None and len(kps) > 0:
+                _add_array(arrays, 'kps', cv2_utils.feature_keypoints_to_np(kps).astype(np.float32))
+                _add_array(arrays, 'desc', desc)
+        entry_list.append({
+            'sub_dir': template.sub_dir,
+            'template_id': template.template_id,
+            'config': template.data,
+            'file_size': get_template_file_size(template.sub_dir, template.template_id),
+            'arrays': arrays,
+        })
+
+    index = json.dumps({'version': _PACK_VERSION, 'opencv': cv2.__version__, 'template_list': entry_list},
+                       ensure_ascii=False, default=str).encode('utf-8')
+    header_len = 16 + len(index)
+
+    temp_path = pack_path + '.tmp'
+    with open(temp_path, 'wb') as file:
+        file.write(_PACK_MAGIC)
+        file.write(struct.pack('<Q', len(index)))
+        file.write(index)
+        file.write(b'\0' * (_align(header_len) - header_len))
+        for blob in blob_list:
+            file.write(blob)
+    os.replace(temp_path, pack_path)  # 写入完成后再替换 避免读到不完整的模板包
+
+    log.info('模板打包完成 %d 个 %.1fMB %s', len(entry_list), os.path.getsize(pack_path) / 1024 / 1024, pack_path)
+    return len(entry_list)
+
+
+def __debug_template_pack_benchmark():
+    """
+    对比 散装文件 和 模板包 加载全部模板的耗时 以及首次使用灰度图和特征的耗时
+    """
+    from one_dragon.base.screen.template_loader import TemplateLoader
+
+    key_list = [(t.sub_dir, t.template_id) for t in TemplateLoader().get_all_template_info_from_disk()]
+
+    start = time.perf_counter()
+    build_template_pack()
+    print('打包耗时 %.2fs' % (time.perf_counter() - start))
+
+    for name, use_pack in [('散装文件', False), ('模板包', True)]:
+        loader = TemplateLoader(use_pack=use_pack)
+        start = time.perf_counter()
+        loader.get_template(*key_list[0])  # 模板包在第一次使用时打开
+        open_cost = time.perf_counter() - start
+
+        start = time.perf_counter()
+        template_list = [loader.get_template(sub_dir, template_id) for sub_dir, template_id in key_list]
+        load_cost = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for t in template_list:
+            _ = t.gray
+        gray_cost = time.perf_counter() - start
+
+        feature_list = template_list[:20]
+        start = time.perf_counter()
+        for t in feature_list:
+            _ = t.features
+        feature_cost = time.perf_counter() - start
+
+        print('%s 打开 %.1fms 加载 %d 个模板 %.1fms(%.3fms/个) 灰度图 %.1fms 特征 %.1fms/个' % (
+            name, open_cost * 1000, len(template_list), load_cost * 1000, load_cost * 1000 / len(template_list),
+            gray_cost * 1000, feature_cost * 1000 / len(feature_list)))
+        loader.close()
+
+    # 结果一致
+    loose = TemplateLoader(use_pack=False)
+    packed = TemplateLoader(use_pack=True)
+    diff_cnt = 0
+    for sub_dir, template_id in key_list:
+        t1 = loose.get_template(sub_dir, template_id)
+        t2 = packed.get_template(sub_dir, template_id)
+        if (not np.array_equal(t1.raw, t2.raw) or (t1.mask is None) != (t2.mask is None)
+                or (t1.mask is not None and not np.array_equal(t1.mask, t2.mask))
+                or t1.template_shape != t2.template_shape
+                or [(p.x, p.y) for p in t1.point_list] != [(p.x, p.y) for p in t2.point_list]):
+            diff_cnt += 1
+    print('结果不一致 %d 个' % diff_cnt)
+    packed.close()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='把所有模板打包成一个内存映射的文件')
+    parser.add_argument('--output', default=None, help='模板包路径 默认为 assets/template/%s' % TEMPLATE_PACK_FILE_NAME)
+    parser.add_argument('--no-features', action='store_true', help='不预先计算特征')
+    parser.add_argument('--benchmark', action='store_true', help='打包后对比加载耗时')
+    opt = parser.parse_args()
+
+    if opt.benchmark:
+        __debug_template_pack_benchmark()
+    else:
+        build_template_pack(opt.output, with_features=not opt.no_features)
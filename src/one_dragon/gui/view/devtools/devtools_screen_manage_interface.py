@@ -121,7 +121,7 @@ class DevtoolsScreenManageInterface(VerticalScrollInterface):
         self.area_table.setBorderVisible(True)
         self.area_table.setBorderRadius(8)
         self.area_table.setWordWrap(True)
-        self.area_table.setColumnCount(10)
+        self.area_table.setColumnCount(11)
         self.area_table.verticalHeader().hide()
         self.area_table.setHorizontalHeaderLabels([
             gt('操作', 'ui'),
@@ -133,6 +133,7 @@ class DevtoolsScreenManageInterface(VerticalScrollInterface):
             gt('阈值', 'ui'),
             gt('颜色范围', 'ui'),
             gt('唯一标识', 'ui'),
+            gt('单行文本', 'ui'),
             gt('前往画面', 'ui')
         ])
         self.area_table.setColumnWidth(0, 40)  # 操作
@@ -242,6 +243,11 @@ class DevtoolsScreenManageInterface(VerticalScrollInterface):
             id_check.setProperty('area_name', area_item.area_name)
             id_check.stateChanged.connect(self.on_area_id_check_changed)
 
+            single_line_check = CheckBox()
+            single_line_check.setChecked(area_item.single_line)
+            single_line_check.setProperty('area_name', area_item.area_name)
+            single_line_check.stateChanged.connect(self.on_area_single_line_check_changed)
+
             self.area_table.setCellWidget(idx, 0, del_btn)
             self.area_table.setItem(idx, 1, QTableWidgetItem(area_item.area_name))
             self.area_table.setItem(idx, 2, QTableWidgetItem(str(area_item.pc_rect)))
@@ -251,7 +257,8 @@ class DevtoolsScreenManageInterface(VerticalScrollInterface):
             self.area_table.setItem(idx, 6, QTableWidgetItem(str(area_item.template_match_threshold)))
             self.area_table.setItem(idx, 7, QTableWidgetItem(str(area_item.color_range_display_text)))
             self.area_table.setCellWidget(idx, 8, id_check)
-            self.area_table.setItem(idx, 9, QTableWidgetItem(area_item.goto_list_display_text))
+            self.area_table.setCellWidget(idx, 9, single_line_check)
+            self.area_table.setItem(idx, 10, QTableWidgetItem(area_item.goto_list_display_text))
 
 
         add_btn = ToolButton(FluentIcon.ADD, parent=None)
@@ -266,6 +273,7 @@ class DevtoolsScreenManageInterface(VerticalScrollInterface):
         self.area_table.setItem(area_cnt, 7, QTableWidgetItem(''))
         self.area_table.setItem(area_cnt, 8, QTableWidgetItem(''))
         self.area_table.setItem(area_cnt, 9, QTableWidgetItem(''))
+        self.area_table.setItem(area_cnt, 10, QTableWidgetItem(''))
 
         self.area_table.blockSignals(False)
 
@@ -527,7 +535,7 @@ class DevtoolsScreenManageInterface(VerticalScrollInterface):
                     area_item.color_range = arr
             except Exception:
                 area_item.color_range = None
-        elif column == 9:
+        elif column == 10:
             area_item.goto_list = text.split(',')
 
     def _on_image_drag_released(self, x1: int, y1: int, x2: int, y2: int) -> None:
@@ -560,3 +568,13 @@ class DevtoolsScreenManageInterface(VerticalScrollInterface):
             if row_idx < 0 or row_idx >= len(self.chosen_screen.area_list):
                 return
             self.chosen_screen.area_list[row_idx].id_mark = btn.isChecked()
+
+    def on_area_single_line_check_changed(self):
+        if self.chosen_screen is None:
+            return
+        btn: CheckBox = self.sender()
+        if btn is not None:
+            row_idx = self.area_table.indexAt(btn.pos()).row()
+            if row_idx < 0 or row_idx >= len(self.chosen_screen.area_list):
+                return
+            self.chosen_screen.area_list[row_idx].single_line = btn.isChecked()
@@ -0,0 +1,293 @@
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+
+from one_dragon.utils.latency_histogram import LatencyHistogram
+from one_dragon.utils.log_utils import log
+
+
+class _RecognitionTask:
+
+    def __init__(self, fn: Callable, args: tuple, kwargs: dict,
+                 frame_time: Optional[float]):
+        self.fn: Callable = fn
+        self.args: tuple = args
+        self.kwargs: dict = kwargs
+        self.frame_time: Optional[float] = frame_time
+        self.submit_time: float = time.perf_counter()
+        self.future: Future = Future()
+
+
+class _RecognitionChecker:
+
+    def __init__(self, name: str, priority: int, max_running: int):
+        """
+        一种识别 例如闪光识别、连携技识别
+        :param name: 名称
+        :param priority: 优先级 越大越先执行
+        :param max_running: 最多同时执行多少个
+        """
+        self.name: str = name
+        self.priority: int = priority
+        self.max_running: int = max(1, max_running)
+
+        self.running_cnt: int = 0
+        self.pending: Optional[_RecognitionTask] = None  # 每种识别最多只有一个等待中的任务 新的画面会替换旧的
+
+        self.submit_cnt: int = 0
+        self.drop_cnt: int = 0
+        self.done_cnt: int = 0
+        self.wait_latency: LatencyHistogram = LatencyHistogram('%s 排队' % name)
+        self.run_latency: LatencyHistogram = LatencyHistogram('%s 执行' % name)
+
+    def reset_stats(self) -> None:
+        self.submit_cnt = 0
+        self.drop_cnt = 0
+        self.done_cnt = 0
+        self.wait_latency.reset()
+        self.run_latency.reset()
+
+
+class RecognitionScheduler:
+
+    def __init__(self, name: str, max_workers: int = 4):
+        """
+        识别任务调度器 用固定数量的线程执行各种识别 避免每帧提交大量任务导致CPU争抢
+        - 每种识别有自己的优先级和同时执行上限
+        - 每种识别最多只保留一个等待中的任务 新画面提交时丢弃旧画面的任务 保证总是识别最新的画面
+        - 统计排队长度、丢弃数量、排队和执行耗时
+        :param name: 名称 用于线程名和日志
+        :param max_workers: 工作线程数量
+        """
+        self.name: str = name
+        self.max_workers: int = max(1, max_workers)
+
+        self._condition = threading.Condition()
+        self._checker_map: Dict[str, _RecognitionChecker] = {}
+        self._checker_list: List[_RecognitionChecker] = []  # 按优先级从高到低排列
+        self._pending_cnt: int = 0
+        self._worker_list: List[threading.Thread] = []
+
+        # 排队长度统计 每次提交时采样
+        self.queue_depth_max: int = 0
+        self._queue_depth_sum: int = 0
+        self._queue_depth_samples: int = 0
+
+    def register_checker(self, name: str, priority: int = 0, max_running: int = 1) -> None:
+        """
+        注册一种识别 重复注册时更新优先级和上限
+        :param name: 名称
+        :param priority: 优先级 越大越先执行
+        :param max_running: 最多同时执行多少个
+        :return:
+        """
+        with self._condition:
+            checker = self._checker_map.get(name)
+            if checker is None:
+                checker = _RecognitionChecker(name, priority, max_running)
+                self._checker_map[name] = checker
+                self._checker_list.append(checker)
+            else:
+                checker.priority = priority
+                checker.max_running = max(1, max_running)
+            self._checker_list.sort(key=lambda c: c.priority, reverse=True)
+
+    def submit(self, checker_name: str, fn: Callable, *args,
+               frame_time: Optional[float] = None, **kwargs) -> Future:
+        """
+        提交一个识别任务
+        如果这种识别已经有等待中的任务 画面较旧的一个会被取消
+        :param checker_name: 识别名称 未注册时使用默认优先级注册
+        :param fn: 识别方法
+        :param frame_time: 画面时间 用于判断新旧 为空时认为是最新的
+        :return: 被取消时 future.cancelled() 为True
+        """
+        task = _RecognitionTask(fn, args, kwargs, frame_time)
+        dropped: Optional[_RecognitionTask] = None
+        with self._condition:
+            checker = self._checker_map.get(checker_name)
+            if checker is None:
+                checker = _RecognitionChecker(checker_name, 0, 1)
+                self._checker_map[checker_name] = checker
+                self._checker_list.append(checker)
+                self._checker_list.sort(key=lambda c: c.priority, reverse=True)
+
+            checker.submit_cnt += 1
+            old = checker.pending
+            if old is not None and old.frame_time is not None and frame_time is not None and old.frame_time > frame_time:
+                # 等待中的画面更新 丢弃本次提交
+                dropped = task
+            else:
+                if old is not None:
+                    dropped = old
+                else:
+                    self._pending_cnt += 1
+                checker.pending = task
+            if dropped is not None:
+                checker.drop_cnt += 1
+
+            self.queue_depth_max = max(self.queue_depth_max, self._pending_cnt)
+            self._queue_depth_sum += self._pending_cnt
+            self._queue_depth_samples += 1
+
+            self._ensure_workers()
+            self._condition.notify()
+
+        if dropped is not None:
+            dropped.future.cancel()
+
+        return task.future
+
+    def _ensure_workers(self) -> None:
+        """
+        按需启动工作线程 需要在持有锁时调用
+        :return:
+        """
+        while len(self._worker_list) < self.max_workers:
+            t = threading.Thread(target=self._worker_loop, daemon=True,
+                                 name='%s_%d' % (self.name, len(self._worker_list)))
+            self._worker_list.append(t)
+            t.start()
+
+    def _take_task(self) -> Tuple[_RecognitionChecker, _RecognitionTask]:
+        """
+        取出优先级最高 且没有超过同时执行上限的任务
+        :return:
+        """
+        with self._condition:
+            while True:
+                for checker in self._checker_list:
+                    if checker.pending is None or checker.running_cnt >= checker.max_running:
+                        continue
+                    task = checker.pending
+                    checker.pending = None
+                    checker.running_cnt += 1
+                    self._pending_cnt -= 1
+                    return checker, task
+                self._condition.wait()
+
+    def _worker_loop(self) -> None:
+        while True:
+            checker, task = self._take_task()
+            try:
+                if not task.future.set_running_or_notify_cancel():
+                    continue
+                start_time = time.perf_counter()
+                checker.wait_latency.record(start_time - task.submit_time)
+                try:
+                    result = task.fn(*task.args, **task.kwargs)
+                except BaseException as e:
+                    task.future.set_exception(e)
+                else:
+                    task.future.set_result(result)
+                checker.run_latency.record(time.perf_counter() - start_time)
+            except Exception:
+                log.error('%s 执行识别任务失败', self.name, exc_info=True)
+            finally:
+                with self._condition:
+                    checker.running_cnt -= 1
+                    checker.done_cnt += 1
+                    self._condition.notify_all()
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        当前等待中的任务数量
+        :return:
+        """
+        with self._condition:
+            return self._pending_cnt
+
+    @property
+    def queue_depth_avg(self) -> float:
+        return self._queue_depth_sum / self._queue_depth_samples if self._queue_depth_samples > 0 else 0
+
+    def reset_stats(self) -> None:
+        """
+        清空统计
+        :return:
+        """
+        with self._condition:
+            self.queue_depth_max = 0
+            self._queue_depth_sum = 0
+            self._queue_depth_samples = 0
+            for checker in self._checker_list:
+                checker.reset_stats()
+
+    @property
+    def stats_display_text(self) -> str:
+        """
+        统计的展示文本 每种识别一行
+        :return:
+        """
+        line_list = ['%s 线程 %d 排队长度 平均 %.2f 最大 %d' % (
+            self.name, self.max_workers, self.queue_depth_avg, self.queue_depth_max
+        )]
+        with self._condition:
+            checker_list = list(self._checker_list)
+        for checker in checker_list:
+            if checker.submit_cnt == 0:
+                continue
+            line_list.append('%s 提交 %d 丢弃 %d 完成 %d | %s | %s' % (
+                checker.name, checker.submit_cnt, checker.drop_cnt, checker.done_cnt,
+                checker.wait_latency.display_text, checker.run_latency.display_text
+            ))
+        return '\n'.join(line_list)
+
+
+def __debug_scheduler_benchmark():
+    """
+    模拟每帧提交多种识别 每种识别耗时不同
+    对比 每帧直接提交到大线程池 和 使用调度器 的完成数量和画面延迟
+    """
+    import numpy as np
+    from concurrent.futures import ThreadPoolExecutor
+
+    def work(ms: float, frame_time: float, delay_list: List[float]):
+        # numpy 运算会释放GIL 接近模型推理和模板匹配的情况
+        a = np.random.rand(64, 64)
+        end = time.perf_counter() + ms / 1000
+        while time.perf_counter() < end:
+            a = a @ a
+            a /= np.max(a)
+        delay_list.append(time.perf_counter() - frame_time)
+
+    checker_cost = {'dodge_flash': 15, 'agent': 25, 'quick_assist': 8, 'chain_attack': 20}
+    fps = 60
+    duration = 3
+
+    for mode in ['executor', 'scheduler']:
+        executor = ThreadPoolExecutor(max_workers=16)
+        scheduler = RecognitionScheduler('debug', max_workers=2)
+        for idx, name in enumerate(checker_cost):
+            scheduler.register_checker(name, priority=len(checker_cost) - idx)
+
+        delay_list: List[float] = []
+        future_list: List[Future] = []
+        start = time.perf_counter()
+        while time.perf_counter() - start < duration:
+            frame_time = time.perf_counter()
+            for name, ms in checker_cost.items():
+                if mode == 'executor':
+                    future_list.append(executor.submit(work, ms, frame_time, delay_list))
+                else:
+                    future_list.append(scheduler.submit(name, work, ms, frame_time, delay_list, frame_time=frame_time))
+            time.sleep(1.0 / fps)
+
+        backlog = sum(1 for f in future_list if not f.done())
+        for f in future_list:
+            if not f.cancelled():
+                f.result()
+        executor.shutdown()
+
+        delay_ms = np.array(delay_list) * 1000
+        print('%s 提交 %d 完成 %d 结束时积压 %d 画面延迟 平均 %.1fms P90 %.1fms 最大 %.1fms' % (
+            mode, len(future_list), len(delay_list), backlog,
+            np.mean(delay_ms), np.percentile(delay_ms, 90), np.max(delay_ms)))
+        if mode == 'scheduler':
+            print(scheduler.stats_display_text)
+
+
+if __name__ == '__main__':
+    __debug_scheduler_benchmark()
@@ -1,5 +1,6 @@
 import base64
 import os
+from functools import lru_cache
 from typing import Union, List, Optional, Tuple
 
 import cv2
@@ -135,20 +136,92 @@ def match_template(source: MatLike, template: MatLike, threshold,
     # show_image(mask, win_name='mask')
     result = cv2.matchTemplate(source, template, cv2.TM_CCOEFF_NORMED, mask=mask)
 
+    return _match_result_from_response(result, tx, ty, threshold, only_best=only_best, ignore_inf=ignore_inf)
+
+
+def _match_result_from_response(result: np.ndarray, tx: int, ty: int, threshold: float,
+                                only_best: bool = True, ignore_inf: bool = False) -> MatchResultList:
+    """
+    从模板匹配的结果图中 提取匹配结果
+    :param result: cv2.matchTemplate 的结果图
+    :param tx: 模板宽度
+    :param ty: 模板高度
+    :param threshold: 阈值
+    :param only_best: 只返回最好的结果
+    :param ignore_inf: 是否忽略无限大的结果
+    :return: 所有匹配结果
+    """
     match_result_list = MatchResultList(only_best=only_best)
-    filtered_locations = np.where(np.logical_and(
-        result >= threshold,
-        np.isfinite(result) if ignore_inf else np.ones_like(result))
-    )  # 过滤低置信度的匹配结果
+    # 过滤低置信度的匹配结果 NaN在比较时天然不通过
+    valid = result >= threshold
+    if ignore_inf:
+        valid &= np.isfinite(result)
+    if not valid.any():
+        return match_result_list
+
+    # 不通过的位置置为负无穷 方便后续直接取最大值
+    response = np.where(valid, result, -np.inf).astype(np.float32, copy=False)
+
+    if only_best:
+        # 与逐个遍历一致 同置信度时取扫描顺序中第一个
+        idx = int(np.argmax(response))
+        y, x = divmod(idx, response.shape[1])
+        match_result_list.append(MatchResult(response[y, x], x, y, tx, ty))
+        return match_result_list
 
-    # 遍历所有匹配结果，并输出位置和置信度
-    for pt in zip(*filtered_locations[::-1]):
-        confidence = result[pt[1], pt[0]]  # 获取置信度
-        match_result_list.append(MatchResult(confidence, pt[0], pt[1], tx, ty))
+    for x, y, confidence in _find_response_peaks(response, valid, merge_distance=10):
+        match_result_list.append(MatchResult(confidence, x, y, tx, ty), auto_merge=False)
 
     return match_result_list
 
 
+@lru_cache
+def _get_peak_kernel(radius: int) -> np.ndarray:
+    """
+    非极大值抑制使用的圆形邻域
+    :param radius: 半径
+    :return:
+    """
+    return cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * radius + 1, 2 * radius + 1))
+
+
+def _find_response_peaks(response: np.ndarray, valid: np.ndarray,
+                         merge_distance: float = 10) -> List[Tuple[int, int, float]]:
+    """
+    在匹配结果图中 使用非极大值抑制找出多个峰值
+    通过阈值的点较多时 先用膨胀找出邻域内的局部最大值作为候选 再按置信度从高到低保留互相距离超过 merge_distance 的点
+    :param response: 匹配结果图 无效位置为负无穷
+    :param valid: 有效位置
+    :param merge_distance: 多少距离内的结果合并为一个
+    :return: 按扫描顺序排列的 (x, y, 置信度)
+    """
+    ys, xs = np.nonzero(valid)
+    if len(ys) > 256:
+        local_max = cv2.dilate(response, _get_peak_kernel(int(merge_distance)))
+        ys, xs = np.nonzero(np.logical_and(valid, response >= local_max))
+
+    confidences = response[ys, xs]
+    order = np.argsort(-confidences, kind='stable')
+    ys, xs, confidences = ys[order], xs[order], confidences[order]
+
+    # 每轮保留当前置信度最高的点 并抑制其邻域内的点 轮数等于最终结果数量
+    alive = np.ones(len(ys), dtype=bool)
+    keep = []
+    max_dis2 = merge_distance ** 2
+    idx = 0
+    while True:
+        keep.append(idx)
+        alive &= (xs - xs[idx]) ** 2 + (ys - ys[idx]) ** 2 > max_dis2
+        remain = np.flatnonzero(alive[idx + 1:])
+        if len(remain) == 0:
+            break
+        idx += 1 + int(remain[0])
+
+    ys, xs, confidences = ys[keep], xs[keep], confidences[keep]
+    scan_order = np.lexsort((xs, ys))
+    return [(int(xs[i]), int(ys[i]), float(confidences[i])) for i in scan_order]
+
+
 def concat_vertically(img: MatLike, next_img: MatLike, decision_height: int = 150):
     """
     垂直拼接图片。
@@ -762,3 +835,60 @@ def color_in_range(img: MatLike, lower: List[int], upper: List[int],
         return part
     else:
         return connection_erase(part, noise_threshold)
+
+
+def __debug_match_template_benchmark():
+    """
+    使用 assets/template 中的全部模板 对比逐像素遍历和向量化峰值提取的耗时
+    原图由模板放大模糊后的背景再贴上模板构成 背景与模板相似 会有大量位置通过阈值
+    两种方式使用同一份 cv2.matchTemplate 的结果图 只统计提取结果的耗时
+    """
+    import time
+    from one_dragon.base.screen.template_loader import TemplateLoader
+
+    def extract_by_loop(result, tx, ty, threshold, only_best) -> MatchResultList:
+        # 旧的实现 逐个通过阈值的像素构造结果
+        match_result_list = MatchResultList(only_best=only_best)
+        filtered_locations = np.where(np.logical_and(result >= threshold, np.isfinite(result)))
+        for pt in zip(*filtered_locations[::-1]):
+            match_result_list.append(MatchResult(result[pt[1], pt[0]], pt[0], pt[1], tx, ty))
+        return match_result_list
+
+    template_list = [t for t in TemplateLoader().get_all_template_info_from_disk() if t.raw is not None]
+    response_list = []
+    for t in template_list:
+        th, tw = t.raw.shape[:2]
+        source = cv2.GaussianBlur(cv2.resize(t.raw, (tw * 2, th * 2)), (5, 5), 0)
+        source[th // 2:th // 2 + th, tw // 2:tw // 2 + tw] = t.raw
+        response_list.append((cv2.matchTemplate(source, t.raw, cv2.TM_CCOEFF_NORMED, mask=t.mask), tw, th))
+
+    for only_best in [True, False]:
+        loop_cost: float = 0
+        vector_cost: float = 0
+        pass_cnt: int = 0
+        old_cnt: int = 0
+        new_cnt: int = 0
+        diff_cnt: int = 0
+        for result, tw, th in response_list:
+            pass_cnt += int(np.sum(np.logical_and(result >= 0.5, np.isfinite(result))))
+
+            start = time.perf_counter()
+            old = extract_by_loop(result, tw, th, 0.5, only_best)
+            loop_cost += time.perf_counter() - start
+
+            start = time.perf_counter()
+            new = _match_result_from_response(result, tw, th, 0.5, only_best=only_best, ignore_inf=True)
+            vector_cost += time.perf_counter() - start
+
+            old_cnt += len(old)
+            new_cnt += len(new)
+            if only_best and ((old.max is None) != (new.max is None) or (
+                    old.max is not None and (old.max.x, old.max.y) != (new.max.x, new.max.y))):
+                diff_cnt += 1
+
+        print('only_best=%s 模板 %d 个 通过阈值像素 %d 个 逐个遍历 %.3f 秒 结果 %d 个 向量化 %.3f 秒 结果 %d 个 最佳结果不一致 %d 个' %
+              (only_best, len(response_list), pass_cnt, loop_cost, old_cnt, vector_cost, new_cnt, diff_cnt))
+
+
+if __name__ == '__main__':
+    __debug_match_template_benchmark()
@@ -0,0 +1,92 @@
+import threading
+from typing import List, Optional
+
+
+class LatencyHistogram:
+
+    def __init__(self, name: str,
+                 bucket_ms: Optional[List[float]] = None):
+        """
+        耗时分布统计 按毫秒分桶计数
+        :param name: 名称 用于展示
+        :param bucket_ms: 各个桶的上限(毫秒) 最后会自动补一个无上限的桶
+        """
+        self.name: str = name
+        self.bucket_ms: List[float] = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000] if bucket_ms is None else bucket_ms
+        self._lock = threading.Lock()
+        self.bucket_cnt: List[int] = [0] * (len(self.bucket_ms) + 1)
+        self.total_cnt: int = 0
+        self.total_ms: float = 0
+        self.max_ms: float = 0
+
+    def record(self, seconds: float) -> None:
+        """
+        记录一次耗时
+        :param seconds: 耗时(秒)
+        :return:
+        """
+        ms = max(0.0, seconds * 1000)
+        idx = len(self.bucket_ms)
+        for i, upper in enumerate(self.bucket_ms):
+            if ms <= upper:
+                idx = i
+                break
+        with self._lock:
+            self.bucket_cnt[idx] += 1
+            self.total_cnt += 1
+            self.total_ms += ms
+            if ms > self.max_ms:
+                self.max_ms = ms
+
+    def reset(self) -> None:
+        """
+        清空统计
+        :return:
+        """
+        with self._lock:
+            self.bucket_cnt = [0] * (len(self.bucket_ms) + 1)
+            self.total_cnt = 0
+            self.total_ms = 0
+            self.max_ms = 0
+
+    @property
+    def avg_ms(self) -> float:
+        return self.total_ms / self.total_cnt if self.total_cnt > 0 else 0
+
+    def percentile_ms(self, percent: float) -> float:
+        """
+        分位数 返回所在桶的上限 落在最后一个桶时返回最大值
+        :param percent: 百分比 0~100
+        :return:
+        """
+        with self._lock:
+            if self.total_cnt == 0:
+                return 0
+            target = self.total_cnt * percent / 100.0
+            acc = 0
+            for i, cnt in enumerate(self.bucket_cnt):
+                acc += cnt
+                if acc >= target and cnt > 0:
+                    return self.bucket_ms[i] if i < len(self.bucket_ms) else self.max_ms
+            return self.max_ms
+
+    @property
+    def display_text(self) -> str:
+        """
+        展示文本
+        :return:
+        """
+        if self.total_cnt == 0:
+            return '%s 无记录' % self.name
+        bucket_text_list = []
+        with self._lock:
+            for i, cnt in enumerate(self.bucket_cnt):
+                if cnt == 0:
+                    continue
+                upper = ('<=%gms' % self.bucket_ms[i]) if i < len(self.bucket_ms) else ('>%gms' % self.bucket_ms[-1])
+                bucket_text_list.append('%s:%d' % (upper, cnt))
+        return '%s 次数 %d 平均 %.1fms P50 %gms P90 %gms 最大 %.1fms [%s]' % (
+            self.name, self.total_cnt, self.avg_ms,
+            self.percentile_ms(50), self.percentile_ms(90), self.max_ms,
+            ' '.join(bucket_text_list)
+        )
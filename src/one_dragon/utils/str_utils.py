@@ -1,7 +1,8 @@
-import difflib
 import re
 from typing import Optional, List, Tuple
 
+from one_dragon.utils import text_matcher
+
 
 _WITH_CHINESE_PATTERN = re.compile(r'[\u4e00-\u9fff]+')
 
@@ -50,21 +51,9 @@ def longest_common_subsequence_length(str1: str, str2: str) -> int:
     :param str2:
     :return: 长度
     """
-    m = len(str1)
-    n = len(str2)
-
-    # 创建一个二维数组用于存储中间结果
-    dp = [[0] * (n + 1) for _ in range(m + 1)]
-
-    # 动态规划求解
-    for i in range(1, m + 1):
-        for j in range(1, n + 1):
-            if str1[i - 1] == str2[j - 1]:
-                dp[i][j] = dp[i - 1][j - 1] + 1
-            else:
-                dp[i][j] = max(dp[i - 1][j], dp[i][j - 1])
-
-    return dp[m][n]
+    if len(str1) == 0 or len(str2) == 0:
+        return 0
+    return text_matcher.lcs_length_by_mask(text_matcher.lcs_bit_mask(str1), len(str1), str2)
 
 
 def get_positive_digits(v: str, err: Optional[int] = None) -> Optional[int]:
@@ -136,11 +125,7 @@ def find_best_match_by_difflib(word: str, target_word_list: List[str], cutoff=0.
     :param target_word_list:
     :return:
     """
-    results = difflib.get_close_matches(word, target_word_list, n=1, cutoff=cutoff)
-    if results is not None and len(results) > 0:
-        return target_word_list.index(results[0])
-    else:
-        return None
+    return text_matcher.TextMatcher(target_word_list).find_best_idx(word, cutoff=cutoff)
 
 
 def find_most_similar(str_list1: List[str], str_list2: List[str]) -> Tuple[Optional[int], Optional[int]]:
@@ -150,20 +135,7 @@ def find_most_similar(str_list1: List[str], str_list2: List[str]) -> Tuple[Optio
     :param str_list2:
     :return:
     """
-    for str1 in str_list1:
-        str2_results = difflib.get_close_matches(str1, str_list2, n=1)
-        if str2_results is None or len(str2_results) == 0:
-            continue
-
-        str2 = str2_results[0]
-
-        str1_results = difflib.get_close_matches(str2, str_list1, n=1)
-        if str1_results is None or len(str1_results) == 0 or str1_results[0] != str1:
-            continue
-
-        return (str_list1.index(str1_results[0]), str_list2.index(str2_results[0]))
-
-    return (None, None)
+    return text_matcher.find_most_similar(text_matcher.TextMatcher(str_list1), text_matcher.TextMatcher(str_list2))
 
 
 def with_chinese(s: str) -> bool:
@@ -0,0 +1,244 @@
+import heapq
+import threading
+from collections import OrderedDict
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Tuple
+
+from one_dragon.utils.i18_utils import gt
+
+
+def lcs_bit_mask(word: str) -> Dict[str, int]:
+    """
+    位并行LCS使用的字符掩码 第i位为1表示第i个字符是这个字符
+    :param word: 字符串
+    :return:
+    """
+    mask_map: Dict[str, int] = {}
+    for idx, ch in enumerate(word):
+        mask_map[ch] = mask_map.get(ch, 0) | (1 << idx)
+    return mask_map
+
+
+def lcs_length_by_mask(mask_map: Dict[str, int], word_len: int, other: str) -> int:
+    """
+    位并行计算最长公共子序列长度 每个字符只需要几次整数运算
+    参考 Hyyrö, Bit-Parallel LCS-length Computation Revisited
+    :param mask_map: 其中一个字符串的字符掩码 lcs_bit_mask
+    :param word_len: 其中一个字符串的长度
+    :param other: 另一个字符串
+    :return: 长度
+    """
+    if word_len == 0:
+        return 0
+    full = (1 << word_len) - 1
+    v = full
+    for ch in other:
+        m = mask_map.get(ch)
+        if m is None:
+            continue
+        u = v & m
+        v = ((v + u) | (v - u)) & full
+    return word_len - bin(v).count('1')
+
+
+class TextMatcher:
+
+    def __init__(self, word_list: List[str], translate: bool = False):
+        """
+        预先建立索引的词表 用于OCR结果和词表的模糊匹配
+        - 字符倒排索引 只计算有共同字符的词 相似度上限低于当前结果时提前结束
+        - 相似度与 difflib.get_close_matches 完全一致 可以直接替换
+        - 最长公共子序列使用位并行计算
+        :param word_list: 词表
+        :param translate: 是否对词表使用 gt 翻译 只在建立索引时翻译一次
+        """
+        self.word_list: List[str] = word_list
+        self.target_list: List[str] = [gt(i) for i in word_list] if translate else list(word_list)
+
+        self._first_idx: List[int] = []  # 相同的词 都返回第一次出现的下标 与 list.index 一致
+        self._char_cnt: List[Dict[str, int]] = []
+        self._char_index: Dict[str, List[int]] = {}  # 字符 -> 包含这个字符的词
+        self._lcs_mask: List[Dict[str, int]] = []
+
+        word_2_idx: Dict[str, int] = {}
+        for idx, target in enumerate(self.target_list):
+            if target not in word_2_idx:
+                word_2_idx[target] = idx
+            self._first_idx.append(word_2_idx[target])
+
+            char_cnt: Dict[str, int] = {}
+            for ch in target:
+                char_cnt[ch] = char_cnt.get(ch, 0) + 1
+            self._char_cnt.append(char_cnt)
+            for ch in char_cnt:
+                if ch not in self._char_index:
+                    self._char_index[ch] = []
+                self._char_index[ch].append(idx)
+            self._lcs_mask.append(lcs_bit_mask(target))
+
+    def __len__(self) -> int:
+        return len(self.target_list)
+
+    def get_close_matches(self, word: str, n: int = 3, cutoff: float = 0.6) -> List[int]:
+        """
+        与 difflib.get_close_matches(word, target_list, n, cutoff) 的结果一致
+        :param word: 需要匹配的文本
+        :param n: 最多返回的数量
+        :param cutoff: 相似度阈值
+        :return: 匹配的词的下标 按相似度从高到低
+        """
+        if not n > 0:
+            raise ValueError("n must be > 0: %r" % (n,))
+        if not 0.0 <= cutoff <= 1.0:
+            raise ValueError("cutoff must be in [0.0, 1.0]: %r" % (cutoff,))
+        if len(self.target_list) == 0:
+            return []
+
+        word_len = len(word)
+        if cutoff > 0:
+            # 只有共同字符的词 相似度才会大于0
+            inter_cnt: Dict[int, int] = {}
+            word_char_cnt: Dict[str, int] = {}
+            for ch in word:
+                word_char_cnt[ch] = word_char_cnt.get(ch, 0) + 1
+            for ch, cnt in word_char_cnt.items():
+                for idx in self._char_index.get(ch, []):
+                    inter_cnt[idx] = inter_cnt.get(idx, 0) + min(cnt, self._char_cnt[idx][ch])
+            candidate_list = list(inter_cnt.items())
+            if word_len == 0:  # 两个空字符串的相似度为1
+                candidate_list = [(idx, 0) for idx, target in enumerate(self.target_list) if len(target) == 0]
+        else:
+            candidate_list = [(idx, -1) for idx in range(len(self.target_list))]
+
+        # 相似度的上限 与 SequenceMatcher 的 real_quick_ratio 和 quick_ratio 一致
+        bound_list: List[Tuple[float, int]] = []
+        for idx, inter in candidate_list:
+            target_len = len(self.target_list[idx])
+            length = target_len + word_len
+            if length == 0:
+                bound = 1.0
+            else:
+                bound = 2.0 * min(target_len, word_len) / length
+                if inter >= 0:
+                    bound = min(bound, 2.0 * inter / length)
+            if bound >= cutoff:
+                bound_list.append((bound, idx))
+        bound_list.sort(key=lambda i: -i[0])
+
+        s = SequenceMatcher()
+        s.set_seq2(word)
+        result: List[Tuple[float, str, int]] = []  # 最小堆 保留最好的n个
+        for bound, idx in bound_list:
+            if len(result) >= n and bound < result[0][0]:  # 剩下的不可能更好
+                break
+            target = self.target_list[idx]
+            s.set_seq1(target)
+            score = s.ratio()
+            if score < cutoff:
+                continue
+            item = (score, target, self._first_idx[idx])
+            if len(result) < n:
+                heapq.heappush(result, item)
+            elif item > result[0]:
+                heapq.heapreplace(result, item)
+
+        result.sort(reverse=True)
+        return [i[2] for i in result]
+
+    def find_best_idx(self, word: str, cutoff: float = 0.6) -> Optional[int]:
+        """
+        找出最相似的一个词
+        :param word: 需要匹配的文本
+        :param cutoff: 相似度阈值
+        :return: 匹配的词的下标
+        """
+        result = self.get_close_matches(word, n=1, cutoff=cutoff)
+        return result[0] if len(result) > 0 else None
+
+    def find_best_idx_batch(self, word_list: List[str], cutoff: float = 0.6) -> List[Optional[int]]:
+        """
+        多个文本分别找出最相似的词 相同的文本只计算一次
+        :param word_list: 需要匹配的文本
+        :param cutoff: 相似度阈值
+        :return: 每个文本匹配的词的下标
+        """
+        result_map: Dict[str, Optional[int]] = {}
+        result_list: List[Optional[int]] = []
+        for word in word_list:
+            if word not in result_map:
+                result_map[word] = self.find_best_idx(word, cutoff=cutoff)
+            result_list.append(result_map[word])
+        return result_list
+
+    def find_best_idx_by_lcs(self, word: str, lcs_percent_threshold: Optional[float] = None) -> Optional[int]:
+        """
+        找出最长公共子序列占词长度比例最大的词 与 str_utils.find_best_match_by_lcs 一致
+        :param word: 需要匹配的文本
+        :param lcs_percent_threshold: 要求的比例
+        :return: 匹配的词的下标
+        """
+        target_idx: Optional[int] = None
+        target_lcs_percent: Optional[float] = None
+        for idx, target in enumerate(self.target_list):
+            lcs = lcs_length_by_mask(self._lcs_mask[idx], len(target), word)
+            if lcs == 0:  # 至少要有一个匹配
+                continue
+            lcs_percent = lcs * 1.0 / len(target)
+            if lcs_percent_threshold is not None and lcs_percent < lcs_percent_threshold:
+                continue
+            if target_idx is None or lcs_percent > target_lcs_percent:
+                target_idx = idx
+                target_lcs_percent = lcs_percent
+        return target_idx
+
+
+_matcher_cache: OrderedDict[Tuple[Tuple[str, ...], bool], TextMatcher] = OrderedDict()
+_matcher_cache_lock = threading.Lock()
+_MATCHER_CACHE_SIZE = 64
+
+
+def get_text_matcher(word_list: List[str], translate: bool = False) -> TextMatcher:
+    """
+    获取词表的匹配器 相同的词表只建立一次索引
+    适合固定的词表 例如游戏数据 每帧都不同的OCR结果直接使用 TextMatcher
+    :param word_list: 词表
+    :param translate: 是否对词表使用 gt 翻译
+    :return:
+    """
+    key = (tuple(word_list), translate)
+    with _matcher_cache_lock:
+        matcher = _matcher_cache.get(key)
+        if matcher is not None:
+            _matcher_cache.move_to_end(key)
+            return matcher
+
+    matcher = TextMatcher(list(word_list), translate=translate)
+    with _matcher_cache_lock:
+        _matcher_cache[key] = matcher
+        while len(_matcher_cache) > _MATCHER_CACHE_SIZE:
+            _matcher_cache.popitem(last=False)
+    return matcher
+
+
+def find_most_similar(matcher_1: TextMatcher, matcher_2: TextMatcher) -> Tuple[Optional[int], Optional[int]]:
+    """
+    两个词表之间的双向匹配 找出最匹配的一组下标 与 str_utils.find_most_similar 一致
+    :param matcher_1: 词表1
+    :param matcher_2: 词表2
+    :return: 两个词表中的下标
+    """
+    back_map: Dict[int, Optional[int]] = {}  # 词表2的下标 -> 反向匹配到的词表1下标
+    for str_1 in matcher_1.target_list:
+        idx_2 = matcher_2.find_best_idx(str_1)
+        if idx_2 is None:
+            continue
+
+        if idx_2 not in back_map:
+            back_map[idx_2] = matcher_1.find_best_idx(matcher_2.target_list[idx_2])
+        idx_1 = back_map[idx_2]
+        if idx_1 is None or matcher_1.target_list[idx_1] != str_1:
+            continue
+
+        return idx_1, idx_2
+
+    return None, None
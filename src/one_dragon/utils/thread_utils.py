@@ -4,6 +4,8 @@ from one_dragon.utils.log_utils import log
 
 
 def handle_future_result(future: Future):
+    if future.cancelled():  # 主动取消的任务 不需要处理
+        return
     try:
         future.result()
     except Exception:
@@ -1,7 +1,7 @@
 import time
 
 import cv2
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 from cv2.typing import MatLike
@@ -46,6 +46,9 @@ class DetectContext:
         self.scale_width: int = 0
         """缩放后的宽度"""
 
+        self.roi: Optional[Tuple[int, int, int, int]] = None
+        """只识别图片中的这个区域 (x1, y1, x2, y2) 为空时识别整张图片"""
+
 
 class DetectClass:
 
@@ -106,11 +109,24 @@ class DetectFrameResult:
 
     def __init__(self,
                  raw_image: MatLike,
-                 results: List[DetectObjectResult],
+                 results: Optional[List[DetectObjectResult]] = None,
                  run_time: Optional[float] = None,
+                 boxes: Optional[np.ndarray] = None,
+                 scores: Optional[np.ndarray] = None,
+                 class_ids: Optional[np.ndarray] = None,
+                 idx_2_class: Optional[Dict[int, DetectClass]] = None,
                  ):
         """
         一帧画面的识别结果
+        结果以数组保存 (boxes, scores, class_ids) 只有访问 results 时才创建 DetectObjectResult
+        也可以直接传入 results 兼容原来的用法
+        :param raw_image: 识别的原始图片
+        :param results: 识别的结果
+        :param run_time: 识别时间
+        :param boxes: 目标框 xyxy (n, 4) int
+        :param scores: 得分 (n,)
+        :param class_ids: 类别下标 (n,)
+        :param idx_2_class: 类别下标对应的类别
         """
         self.run_time: float = time.time() if run_time is None else run_time
         """识别时间"""
@@ -118,46 +134,85 @@ class DetectFrameResult:
         self.raw_image: MatLike = raw_image
         """识别的原始图片"""
 
-        self.results: List[DetectObjectResult] = results
-        """识别的结果"""
-
+        if results is not None:
+            boxes = np.array([[r.x1, r.y1, r.x2, r.y2] for r in results], dtype=np.int32).reshape((-1, 4))
+            scores = np.array([r.score for r in results], dtype=np.float32)
+            class_ids = np.array([r.detect_class.class_id for r in results], dtype=np.int32)
+            idx_2_class = {r.detect_class.class_id: r.detect_class for r in results}
 
-def nms(boxes, scores, iou_threshold):
-    # Sort by score
-    sorted_indices = np.argsort(scores)[::-1]
+        self.boxes: np.ndarray = boxes if boxes is not None else np.zeros((0, 4), dtype=np.int32)
+        """目标框 xyxy"""
 
-    keep_boxes = []
-    while sorted_indices.size > 0:
-        # Pick the last box
-        box_id = sorted_indices[0]
-        keep_boxes.append(box_id)
+        self.scores: np.ndarray = scores if scores is not None else np.zeros((0,), dtype=np.float32)
+        """得分（置信度）"""
 
-        # Compute IoU of the picked box with the rest
-        ious = compute_iou(boxes[box_id, :], boxes[sorted_indices[1:], :])
+        self.class_ids: np.ndarray = class_ids if class_ids is not None else np.zeros((0,), dtype=np.int32)
+        """类别下标"""
 
-        # Remove boxes with IoU over the threshold
-        keep_indices = np.where(ious < iou_threshold)[0]
+        self.idx_2_class: Dict[int, DetectClass] = idx_2_class if idx_2_class is not None else {}
+        """类别下标对应的类别"""
 
-        # print(keep_indices.shape, sorted_indices.shape)
-        sorted_indices = sorted_indices[keep_indices + 1]
+        self._results: Optional[List[DetectObjectResult]] = results
 
-    return keep_boxes
+    @property
+    def results(self) -> List[DetectObjectResult]:
+        """
+        识别的结果 第一次访问时创建
+        :return:
+        """
+        if self._results is None:
+            self._results = [
+                DetectObjectResult(rect=box, score=float(score), detect_class=self.idx_2_class[int(class_id)])
+                for box, score, class_id in zip(self.boxes.tolist(), self.scores.tolist(), self.class_ids.tolist())
+            ]
+        return self._results
 
+    def __len__(self) -> int:
+        return len(self.scores)
 
-def multiclass_nms(boxes, scores, class_ids, iou_threshold):
+    def has_class_id(self, class_id: int) -> bool:
+        """
+        是否识别到了特定类别 不需要创建结果对象
+        :param class_id: 类别下标
+        :return:
+        """
+        return bool(np.any(self.class_ids == class_id))
 
-    unique_class_ids = np.unique(class_ids)
 
-    keep_boxes = []
-    for class_id in unique_class_ids:
-        class_indices = np.where(class_ids == class_id)[0]
-        class_boxes = boxes[class_indices,:]
-        class_scores = scores[class_indices]
+def nms(boxes, scores, iou_threshold):
+    """
+    非极大值抑制
+    :param boxes: 目标框 xyxy (n, 4)
+    :param scores: 得分 (n,)
+    :param iou_threshold: iou阈值 与得分更高的框 iou 超过阈值时被去掉
+    :return: 保留的下标 按得分从高到低
+    """
+    if len(scores) == 0:
+        return np.zeros((0,), dtype=np.int64)
+    boxes = np.asarray(boxes, dtype=np.float32)
+    xywh = boxes.copy()
+    xywh[:, 2:] -= boxes[:, :2]
+    indices = cv2.dnn.NMSBoxes(xywh, np.asarray(scores, dtype=np.float32), 0, float(iou_threshold))
+    return np.asarray(indices, dtype=np.int64).reshape(-1)
 
-        class_keep_boxes = nms(class_boxes, class_scores, iou_threshold)
-        keep_boxes.extend(class_indices[class_keep_boxes])
 
-    return keep_boxes
+def multiclass_nms(boxes, scores, class_ids, iou_threshold):
+    """
+    按类别进行非极大值抑制
+    每个类别的框平移到互不重叠的区域后 只做一次 nms 不需要按类别循环
+    :param boxes: 目标框 xyxy (n, 4)
+    :param scores: 得分 (n,)
+    :param class_ids: 类别下标 (n,)
+    :param iou_threshold: iou阈值
+    :return: 保留的下标 按得分从高到低
+    """
+    if len(scores) == 0:
+        return np.zeros((0,), dtype=np.int64)
+    boxes = np.asarray(boxes, dtype=np.float32)
+    # 使用坐标的范围作为平移量 画面边缘的框在 xywh2xyxy 后会有负数坐标
+    offset = float(np.max(boxes) - np.min(boxes)) + 1
+    offset_boxes = boxes + (np.asarray(class_ids, dtype=np.float32) * offset)[:, np.newaxis]
+    return nms(offset_boxes, scores, iou_threshold)
 
 
 def compute_iou(box, boxes):
@@ -1,12 +1,15 @@
+import threading
 import time
 
-import onnxruntime as ort
+import numpy as np
 import os
 import urllib.request
 import zipfile
 from typing import Optional, List
 
 from one_dragon.yolo.log_utils import log
+from one_dragon.yolo.onnx_utils import InputTensorBuffer
+from one_dragon.yolo.onnx_session_factory import OnnxSessionFactory, OnnxSessionPool, get_default_factory
 
 _GH_PROXY_URL = 'https://ghgo.xyz'
 
@@ -21,6 +24,7 @@ class OnnxModelLoader:
                  personal_proxy: Optional[str] = '',
                  gpu: bool = False,
                  backup_model_name: Optional[str] = None,
+                 session_factory: Optional[OnnxSessionFactory] = None,
                  ):
         self.model_name: str = model_name
         self.backup_model_name: str = backup_model_name  # 备用模型 默认在本地一定有的模型 在新模型无法下载使用时使用
@@ -30,13 +34,17 @@ class OnnxModelLoader:
         self.gh_proxy: bool = gh_proxy
         self.personal_proxy: Optional[str] = personal_proxy
         self.gpu: bool = gpu  # 是否使用GPU加速
+        self.session_factory: OnnxSessionFactory = session_factory  # 为空时使用全局共用的
+        self.max_batch_size: int = 8  # 批量推理时 每次最多输入的图片数量
 
         # 从模型中读取到的输入输出信息
-        self.session: ort.InferenceSession = None
+        self.session: OnnxSessionPool = None
         self.input_names: List[str] = []
         self.onnx_input_width: int = 0
         self.onnx_input_height: int = 0
+        self.dynamic_batch: bool = False  # 模型的 batch 维度是否可变 导出时没有使用 dynamic 的模型只能逐张推理
         self.output_names: List[str] = []
+        self._input_buffer_local = threading.local()  # 每个线程一个预处理缓冲区
 
         if not self.check_and_download_model():  # 新模型不ok
             log.error(f'模型 {self.model_name} 未下载成功 尝试使用备用模型 {self.backup_model_name}')
@@ -122,18 +130,12 @@ class OnnxModelLoader:
         加载模型
         :return:
         """
-        availables = ort.get_available_providers()
-        providers = ['DmlExecutionProvider' if self.gpu else 'CPUExecutionProvider']
-        if self.gpu and 'DmlExecutionProvider' not in availables:
-            log.error('机器未支持DirectML 使用CPU')
-            providers = ['CPUExecutionProvider']
+        providers = OnnxSessionFactory.get_providers(self.gpu)
 
         onnx_path = os.path.join(self.model_dir_path, 'model.onnx')
         log.info('加载模型 %s', onnx_path)
-        self.session = ort.InferenceSession(
-            onnx_path,
-            providers=providers
-        )
+        factory = self.session_factory if self.session_factory is not None else get_default_factory()
+        self.session = factory.get_session_pool(onnx_path, providers)
         self.get_input_details()
         self.get_output_details()
 
@@ -142,9 +144,47 @@ class OnnxModelLoader:
         self.input_names = [model_inputs[i].name for i in range(len(model_inputs))]
 
         shape = model_inputs[0].shape
+        self.dynamic_batch = not isinstance(shape[0], int)
         self.onnx_input_height = shape[2]
         self.onnx_input_width = shape[3]
 
+    def get_input_buffer(self) -> InputTensorBuffer:
+        """
+        当前线程的预处理缓冲区 每个线程只在第一次使用时申请
+        :return:
+        """
+        buffer = getattr(self._input_buffer_local, 'buffer', None)
+        if (buffer is None
+                or buffer.onnx_input_width != self.onnx_input_width
+                or buffer.onnx_input_height != self.onnx_input_height):
+            buffer = InputTensorBuffer(self.onnx_input_width, self.onnx_input_height)
+            self._input_buffer_local.buffer = buffer
+        return buffer
+
+    def inference_batch(self, context_list: list) -> List[List[np.ndarray]]:
+        """
+        批量预处理和推理 模型的 batch 维度固定时逐张推理
+        :param context_list: 推理上下文 需要有 img 和 roi 预处理后会写入 scale_height 和 scale_width
+        :return: 每个上下文对应的模型输出 与单张推理的输出一样 batch 维度为1
+        """
+        buffer = self.get_input_buffer()
+        output_list: List[List[np.ndarray]] = []
+        if not self.dynamic_batch:
+            for context in context_list:
+                input_tensor, context.scale_height, context.scale_width = buffer.prepare(context.img, context.roi)
+                output_list.append(self.session.run(self.output_names, {self.input_names[0]: input_tensor}))
+            return output_list
+
+        for start_idx in range(0, len(context_list), self.max_batch_size):
+            chunk = context_list[start_idx:start_idx + self.max_batch_size]
+            input_tensor = buffer.get_batch_tensor(len(chunk))
+            for i, context in enumerate(chunk):
+                _, context.scale_height, context.scale_width = buffer.prepare(context.img, context.roi, out=input_tensor[i])
+            outputs = self.session.run(self.output_names, {self.input_names[0]: input_tensor})
+            for i in range(len(chunk)):
+                output_list.append([output[i:i + 1] for output in outputs])
+        return output_list
+
     def get_output_details(self):
         model_outputs = self.session.get_outputs()
         self.output_names = [model_outputs[i].name for i in range(len(model_outputs))]
@@ -0,0 +1,276 @@
+import os
+import queue
+import threading
+import time
+
+import onnxruntime as ort
+from typing import Dict, List, Optional, Tuple
+
+from one_dragon.yolo.log_utils import log
+
+
+class OnnxSessionPool:
+
+    def __init__(self, session_list: List[ort.InferenceSession]):
+        """
+        同一个模型的多个会话 与 InferenceSession 的 run/get_inputs/get_outputs 用法一致
+        每次推理取一个空闲的会话 没有空闲时等待 限制了同一个模型同时推理的数量
+        :param session_list: 会话列表
+        """
+        self.session_list: List[ort.InferenceSession] = session_list
+        self._idle: queue.Queue = queue.Queue()
+        for session in session_list:
+            self._idle.put(session)
+        self.run_cnt: int = 0  # 推理次数 用于记录应用使用了哪些模型
+
+    def run(self, output_names, input_feed, run_options=None):
+        self.run_cnt += 1
+        session = self._idle.get()
+        try:
+            return session.run(output_names, input_feed, run_options)
+        finally:
+            self._idle.put(session)
+
+    def get_inputs(self):
+        return self.session_list[0].get_inputs()
+
+    def get_outputs(self):
+        return self.session_list[0].get_outputs()
+
+    def get_providers(self):
+        return self.session_list[0].get_providers()
+
+    @property
+    def pool_size(self) -> int:
+        return len(self.session_list)
+
+
+class OnnxSessionFactory:
+
+    def __init__(self,
+                 intra_op_num_threads: Optional[int] = None,
+                 inter_op_num_threads: int = 1,
+                 graph_optimization_level: ort.GraphOptimizationLevel = ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+                 enable_cpu_mem_arena: bool = True,
+                 cache_optimized_model: bool = True,
+                 pool_size: int = 2):
+        """
+        统一创建onnx会话
+        默认每个会话都会使用全部CPU核心 OCR、闪光识别、YOLO检测同时推理时线程数量远超核心数 互相争抢
+        这里限制每个会话的线程数 并用会话池控制同一个模型同时推理的数量
+        :param intra_op_num_threads: 每个会话算子内的线程数 为空时按CPU核心数和会话池大小计算
+        :param inter_op_num_threads: 每个会话算子间的线程数 顺序执行时不使用
+        :param graph_optimization_level: 图优化等级
+        :param enable_cpu_mem_arena: 是否使用内存池 输入尺寸固定时可以减少内存申请
+        :param cache_optimized_model: 是否把CPU上优化后的模型保存到模型旁边 下次直接加载 减少启动耗时
+        :param pool_size: 每个模型的会话数量
+        """
+        self.pool_size: int = max(1, pool_size)
+        if intra_op_num_threads is None:
+            intra_op_num_threads = max(1, min(4, (os.cpu_count() or 1) // self.pool_size))
+        self.intra_op_num_threads: int = intra_op_num_threads
+        self.inter_op_num_threads: int = inter_op_num_threads
+        self.graph_optimization_level: ort.GraphOptimizationLevel = graph_optimization_level
+        self.enable_cpu_mem_arena: bool = enable_cpu_mem_arena
+        self.cache_optimized_model: bool = cache_optimized_model
+
+        self._lock = threading.Lock()
+        self._pool_map: Dict[Tuple[str, Tuple[str, ...]], OnnxSessionPool] = {}
+
+    @staticmethod
+    def get_providers(gpu: bool) -> List[str]:
+        """
+        使用的推理后端
+        :param gpu: 是否使用GPU
+        :return:
+        """
+        if gpu and 'DmlExecutionProvider' not in ort.get_available_providers():
+            log.error('机器未支持DirectML 使用CPU')
+            return ['CPUExecutionProvider']
+        return ['DmlExecutionProvider' if gpu else 'CPUExecutionProvider']
+
+    def get_session_options(self, providers: List[str], optimized_model_path: Optional[str] = None,
+                            load_optimized: bool = False) -> ort.SessionOptions:
+        """
+        会话配置
+        :param providers: 使用的推理后端
+        :param optimized_model_path: 不为空时 把优化后的模型保存到这个路径
+        :param load_optimized: 加载的是已经优化过的模型 不需要再优化
+        :return:
+        """
+        so = ort.SessionOptions()
+        so.intra_op_num_threads = self.intra_op_num_threads
+        so.inter_op_num_threads = self.inter_op_num_threads
+        so.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        so.enable_cpu_mem_arena = self.enable_cpu_mem_arena
+        so.graph_optimization_level = (ort.GraphOptimizationLevel.ORT_DISABLE_ALL if load_optimized
+                                       else self.graph_optimization_level)
+        if 'DmlExecutionProvider' in providers:
+            so.enable_mem_pattern = False  # DirectML 不支持
+        if optimized_model_path is not None:
+            so.optimized_model_filepath = optimized_model_path
+        return so
+
+    def get_optimized_model_path(self, model_path: str, providers: List[str]) -> Optional[str]:
+        """
+        优化后模型的保存路径 与 onnxruntime 版本和优化等级相关
+        只缓存CPU的模型 GPU优化后的模型与显卡相关
+        :param model_path: 原模型路径
+        :param providers: 使用的推理后端
+        :return:
+        """
+        if not self.cache_optimized_model or providers != ['CPUExecutionProvider']:
+            return None
+        base, _ = os.path.splitext(model_path)
+        return '%s.ort%s.opt%d.onnx' % (base, ort.__version__, int(self.graph_optimization_level))
+
+    def create_session(self, model_path: str, providers: List[str]) -> ort.InferenceSession:
+        """
+        创建一个会话 有优化后的缓存时直接加载缓存
+        :param model_path: 模型路径
+        :param providers: 使用的推理后端
+        :return:
+        """
+        optimized_path = self.get_optimized_model_path(model_path, providers)
+        if (optimized_path is not None and os.path.exists(optimized_path)
+                and os.path.getmtime(optimized_path) >= os.path.getmtime(model_path)):
+            try:
+                return ort.InferenceSession(
+                    optimized_path,
+                    sess_options=self.get_session_options(providers, load_optimized=True),
+                    providers=providers
+                )
+            except Exception:
+                log.error('加载优化后的模型失败 使用原模型 %s', optimized_path, exc_info=True)
+
+        try:
+            return ort.InferenceSession(
+                model_path,
+                sess_options=self.get_session_options(providers, optimized_model_path=optimized_path),
+                providers=providers
+            )
+        except Exception:
+            if optimized_path is None:
+                raise
+            # 例如模型目录没有写入权限
+            log.error('保存优化后的模型失败 %s', optimized_path, exc_info=True)
+            return ort.InferenceSession(
+                model_path,
+                sess_options=self.get_session_options(providers),
+                providers=providers
+            )
+
+    def get_session_pool(self, model_path: str, providers: List[str]) -> OnnxSessionPool:
+        """
+        获取模型的会话池 同一个模型和推理后端只会创建一次
+        :param model_path: 模型路径
+        :param providers: 使用的推理后端
+        :return:
+        """
+        key = (os.path.abspath(model_path), tuple(providers))
+        with self._lock:
+            pool = self._pool_map.get(key)
+            if pool is None:
+                start_time = time.time()
+                session_list = [self.create_session(model_path, providers) for _ in range(self.pool_size)]
+                pool = OnnxSessionPool(session_list)
+                self._pool_map[key] = pool
+                log.info('创建会话池 %s 数量 %d 线程 %d 耗时 %.2fs',
+                         model_path, self.pool_size, self.intra_op_num_threads, time.time() - start_time)
+            return pool
+
+    def get_pool_run_cnt(self) -> Dict[Tuple[str, Tuple[str, ...]], int]:
+        """
+        每个会话池的推理次数
+        :return: key=(模型路径, 推理后端) value=推理次数
+        """
+        with self._lock:
+            return {key: pool.run_cnt for key, pool in self._pool_map.items()}
+
+    def clear(self) -> None:
+        """
+        释放所有会话
+        :return:
+        """
+        with self._lock:
+            self._pool_map.clear()
+
+
+_default_factory: Optional[OnnxSessionFactory] = None
+_default_factory_lock = threading.Lock()
+
+
+def get_default_factory() -> OnnxSessionFactory:
+    """
+    全局共用的会话工厂
+    :return:
+    """
+    global _default_factory
+    with _default_factory_lock:
+        if _default_factory is None:
+            _default_factory = OnnxSessionFactory()
+        return _default_factory
+
+
+def set_default_factory(factory: OnnxSessionFactory) -> None:
+    """
+    替换全局共用的会话工厂 需要在加载模型前调用
+    :param factory: 会话工厂
+    :return:
+    """
+    global _default_factory
+    with _default_factory_lock:
+        _default_factory = factory
+
+
+def __debug_session_benchmark(model_path: str, input_shape: Tuple[int, ...],
+                              thread_cnt: int = 4, times: int = 50):
+    """
+    多个线程同时推理同一个模型 对比默认配置的单个会话 和 会话工厂的会话池 的吞吐
+    :param model_path: 模型路径
+    :param input_shape: 输入尺寸
+    :param thread_cnt: 同时推理的线程数
+    :param times: 每个线程推理的次数
+    """
+    import numpy as np
+    from concurrent.futures import ThreadPoolExecutor
+
+    providers = ['CPUExecutionProvider']
+    x = np.random.rand(*input_shape).astype(np.float32)
+
+    start = time.time()
+    default_session = ort.InferenceSession(model_path, providers=providers)
+    default_load = time.time() - start
+
+    factory = OnnxSessionFactory()
+    start = time.time()
+    pool = factory.get_session_pool(model_path, providers)
+    pool_load = time.time() - start
+
+    factory_2 = OnnxSessionFactory()
+    start = time.time()
+    factory_2.get_session_pool(model_path, providers)
+    cached_load = time.time() - start
+
+    for name, session in [('默认会话', default_session), ('会话池', pool)]:
+        input_name = session.get_inputs()[0].name
+        session.run(None, {input_name: x})  # 预热
+
+        def _work():
+            for _ in range(times):
+                session.run(None, {input_name: x})
+
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=thread_cnt) as executor:
+            for f in [executor.submit(_work) for _ in range(thread_cnt)]:
+                f.result()
+        cost = time.time() - start
+        print('%s %d线程 共 %d 次 %.1f 次/秒' % (name, thread_cnt, thread_cnt * times, thread_cnt * times / cost))
+
+    print('加载耗时 默认 %.3fs 会话池 %.3fs 使用优化缓存 %.3fs' % (default_load, pool_load, cached_load))
+
+
+if __name__ == '__main__':
+    __debug_session_benchmark(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..',
+                                           'assets', 'models', 'onnx_ocr', 'cls.onnx'),
+                              (6, 3, 48, 192))
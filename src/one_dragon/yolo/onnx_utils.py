@@ -1,8 +1,9 @@
-from typing import Tuple
+import time
 
 import cv2
 import numpy as np
 from cv2.typing import MatLike
+from typing import Optional, Tuple
 
 
 def scale_input_image_u(image: MatLike, onnx_input_width: int, onnx_input_height: int) -> Tuple[np.ndarray, int, int]:
@@ -38,3 +39,106 @@ def scale_input_image_u(image: MatLike, onnx_input_width: int, onnx_input_height
     input_tensor = input_img[np.newaxis, :, :, :].astype(np.float32)
 
     return input_tensor, scale_height, scale_width
+
+
+class InputTensorBuffer:
+
+    def __init__(self, onnx_input_width: int, onnx_input_height: int):
+        """
+        模型输入的预处理缓冲区 结果与 scale_input_image_u 一致
+        缩放直接写入预先分配的画布 再拆分通道和归一化写入预先分配的 float32 NCHW 张量
+        每帧不再申请 画布、float64 图片、转置副本 等多张整图的内存
+        返回的张量会在下一次预处理时被覆盖 同一个缓冲区不能多线程共用
+        :param onnx_input_width: 模型需要的图片宽度
+        :param onnx_input_height: 模型需要的图片高度
+        """
+        self.onnx_input_width: int = onnx_input_width
+        self.onnx_input_height: int = onnx_input_height
+
+        self.canvas: np.ndarray = np.full((onnx_input_height, onnx_input_width, 3), 114, dtype=np.uint8)
+        self.planes: np.ndarray = np.empty((3, onnx_input_height, onnx_input_width), dtype=np.uint8)
+        self.tensor: np.ndarray = np.empty((1, 3, onnx_input_height, onnx_input_width), dtype=np.float32)
+        self._plane_list = [self.planes[0], self.planes[1], self.planes[2]]
+        self._batch_tensor: Optional[np.ndarray] = None  # 批量推理使用 按需扩容
+
+        self._last_scale_size: Optional[Tuple[int, int]] = None  # 上一次缩放后的大小 不变时画布的填充部分不需要重置
+
+    def get_batch_tensor(self, batch_size: int) -> np.ndarray:
+        """
+        批量推理的输入张量 (batch_size, 3, h, w) 只在批量变大时重新申请
+        :param batch_size: 批量大小
+        :return:
+        """
+        if self._batch_tensor is None or self._batch_tensor.shape[0] < batch_size:
+            self._batch_tensor = np.empty((batch_size, 3, self.onnx_input_height, self.onnx_input_width), dtype=np.float32)
+        return self._batch_tensor[:batch_size]
+
+    def prepare(self, image: MatLike, roi: Optional[Tuple[int, int, int, int]] = None,
+                out: Optional[np.ndarray] = None) -> Tuple[np.ndarray, int, int]:
+        """
+        预处理
+        :param image: 输入的图片 RGB通道
+        :param roi: 只使用图片中的这个区域 (x1, y1, x2, y2) 为空时使用整张图片
+        :param out: 写入的位置 (3, h, w) 例如批量张量中的一个 为空时写入自身的张量
+        :return: 模型的输入张量, 缩放后的高度, 缩放后的宽度 (缩放前的大小为 roi 的大小)
+        """
+        if roi is not None:
+            x1, y1, x2, y2 = roi
+            image = image[y1:y2, x1:x2]
+
+        img_height, img_width = image.shape[:2]
+        min_scale = min(self.onnx_input_height / img_height, self.onnx_input_width / img_width)
+        scale_height = int(round(img_height * min_scale))
+        scale_width = int(round(img_width * min_scale))
+
+        if self.onnx_input_height != img_height or self.onnx_input_width != img_width:  # 需要缩放
+            if self._last_scale_size != (scale_height, scale_width):
+                self.canvas.fill(114)
+                self._last_scale_size = (scale_height, scale_width)
+            cv2.resize(image, (scale_width, scale_height), dst=self.canvas[0:scale_height, 0:scale_width, :],
+                       interpolation=cv2.INTER_LINEAR)
+            input_img = self.canvas
+        else:
+            input_img = image
+
+        cv2.split(input_img, self._plane_list)
+        np.multiply(self.planes, np.float32(1 / 255.0), out=self.tensor[0] if out is None else out, dtype=np.float32)
+
+        return (self.tensor if out is None else out), scale_height, scale_width
+
+
+def __debug_preprocess_benchmark():
+    """
+    对比 scale_input_image_u 和 InputTensorBuffer 的预处理耗时
+    模型大小对应 闪光识别(640) 和 空洞事件、迷失之地识别(736)
+    """
+    img = np.random.randint(0, 256, (1080, 1920, 3), dtype=np.uint8)
+    times = 200
+    for name, size, roi in [
+        ('FlashClassifier', 640, None),
+        ('HollowEventDetector', 736, None),
+        ('LostVoidDetector', 736, None),
+        ('FlashClassifier ROI', 640, (480, 270, 1440, 810)),
+    ]:
+        buffer = InputTensorBuffer(size, size)
+        target = img if roi is None else img[roi[1]:roi[3], roi[0]:roi[2]]
+        old_tensor, _, _ = scale_input_image_u(target, size, size)
+        new_tensor, _, _ = buffer.prepare(img, roi)
+        max_diff = float(np.max(np.abs(old_tensor - new_tensor)))
+
+        start = time.perf_counter()
+        for _ in range(times):
+            scale_input_image_u(target, size, size)
+        old_cost = (time.perf_counter() - start) * 1000 / times
+
+        start = time.perf_counter()
+        for _ in range(times):
+            buffer.prepare(img, roi)
+        new_cost = (time.perf_counter() - start) * 1000 / times
+
+        print('%s %d 原方式 %.2f 毫秒/帧 缓冲区 %.2f 毫秒/帧 最大误差 %.1e' % (
+            name, size, old_cost, new_cost, max_diff))
+
+
+if __name__ == '__main__':
+    __debug_preprocess_benchmark()
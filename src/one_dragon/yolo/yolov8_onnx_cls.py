@@ -2,9 +2,8 @@ import time
 
 import numpy as np
 from cv2.typing import MatLike
-from typing import Optional, List
+from typing import Optional, List, Tuple
 
-from one_dragon.yolo import onnx_utils
 from one_dragon.yolo.onnx_model_loader import OnnxModelLoader
 
 
@@ -36,6 +35,9 @@ class RunContext:
         self.scale_width: int = 0
         """缩放后的宽度"""
 
+        self.roi: Optional[Tuple[int, int, int, int]] = None
+        """只识别图片中的这个区域 (x1, y1, x2, y2) 为空时识别整张图片"""
+
 
 class ClassificationResult:
 
@@ -80,16 +82,19 @@ class Yolov8Classifier(OnnxModelLoader):
         self.keep_result_seconds: float = keep_result_seconds  # 保留识别结果的秒数
         self.run_result_history: List[ClassificationResult] = []  # 历史识别结果
 
-    def run(self, image: MatLike, conf: float = 0.9, run_time: Optional[float] = None) -> ClassificationResult:
+    def run(self, image: MatLike, conf: float = 0.9, run_time: Optional[float] = None,
+            roi: Optional[Tuple[int, int, int, int]] = None) -> ClassificationResult:
         """
         对图片进行识别
         :param image: 使用 opencv 读取的图片 RGB通道
         :param conf: 置信度阈值
+        :param roi: 只识别图片中的这个区域 (x1, y1, x2, y2) 为空时识别整张图片
         :return: 识别结果
         """
         t1 = time.time()
         context = RunContext(image, run_time)
         context.conf = conf
+        context.roi = roi
 
         input_tensor = self.prepare_input(context)
         t2 = time.time()
@@ -105,11 +110,39 @@ class Yolov8Classifier(OnnxModelLoader):
         self.record_result(context, result)
         return result
 
+    def run_batch(self, image_list: List[MatLike], conf: float = 0.9,
+                  run_time_list: Optional[List[float]] = None,
+                  roi_list: Optional[List[Optional[Tuple[int, int, int, int]]]] = None) -> List[ClassificationResult]:
+        """
+        对多张图片进行识别 一次推理输入多张图片 减少每次推理的固定开销
+        模型的 batch 维度固定时 逐张推理
+        :param image_list: 使用 opencv 读取的图片 RGB通道
+        :param conf: 置信度阈值
+        :param run_time_list: 每张图片的识别时间
+        :param roi_list: 每张图片的识别区域
+        :return: 每张图片的识别结果
+        """
+        context_list: List[RunContext] = []
+        for i, image in enumerate(image_list):
+            context = RunContext(image, None if run_time_list is None else run_time_list[i])
+            context.conf = conf
+            context.roi = None if roi_list is None else roi_list[i]
+            context_list.append(context)
+
+        output_list = self.inference_batch(context_list)
+
+        result_list: List[ClassificationResult] = []
+        for context, outputs in zip(context_list, output_list):
+            result = self.process_output(outputs, context)
+            self.record_result(context, result)
+            result_list.append(result)
+        return result_list
+
     def prepare_input(self, context: RunContext) -> np.ndarray:
         """
         推理前的预处理
         """
-        input_tensor, scale_height, scale_width = onnx_utils.scale_input_image_u(context.img, self.onnx_input_width, self.onnx_input_height)
+        input_tensor, scale_height, scale_width = self.get_input_buffer().prepare(context.img, context.roi)
         context.scale_height = scale_height
         context.scale_width = scale_width
         return input_tensor
@@ -156,3 +189,49 @@ class Yolov8Classifier(OnnxModelLoader):
             return self.run_result_history[len(self.run_result_history) - 1]
         else:
             return None
+
+
+def __debug_batch_benchmark():
+    """
+    使用 OCR 的方向分类模型(batch 维度可变) 对比逐张推理 和 批量推理 的耗时
+    """
+    import os
+    import threading
+    from one_dragon.yolo.onnx_session_factory import get_default_factory
+
+    model_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..',
+                              'assets', 'models', 'onnx_ocr', 'cls.onnx')
+    model = Yolov8Classifier.__new__(Yolov8Classifier)
+    model.session = get_default_factory().get_session_pool(model_path, ['CPUExecutionProvider'])
+    model.input_names = [i.name for i in model.session.get_inputs()]
+    model.output_names = [i.name for i in model.session.get_outputs()]
+    model.onnx_input_height, model.onnx_input_width = 48, 192
+    model.dynamic_batch = True
+    model.max_batch_size = 8
+    model._input_buffer_local = threading.local()
+    model.keep_result_seconds = 2
+    model.run_result_history = []
+
+    rng = np.random.default_rng(0)
+    image_list = [rng.integers(0, 256, size=(40, 200, 3), dtype=np.uint8) for _ in range(32)]
+    times = 20
+
+    single = [model.run(image, conf=0).class_idx for image in image_list]
+    batch = [r.class_idx for r in model.run_batch(image_list, conf=0)]
+
+    start = time.perf_counter()
+    for _ in range(times):
+        for image in image_list:
+            model.run(image, conf=0)
+    single_cost = (time.perf_counter() - start) * 1000 / times / len(image_list)
+
+    start = time.perf_counter()
+    for _ in range(times):
+        model.run_batch(image_list, conf=0)
+    batch_cost = (time.perf_counter() - start) * 1000 / times / len(image_list)
+
+    print('逐张 %.3f 毫秒/张 批量 %.3f 毫秒/张 结果一致 %s' % (single_cost, batch_cost, single == batch))
+
+
+if __name__ == '__main__':
+    __debug_batch_benchmark()
@@ -4,11 +4,9 @@ import csv
 import numpy as np
 import os
 from cv2.typing import MatLike
-from typing import Optional, List
+from typing import Optional, List, Tuple
 
-from one_dragon.yolo import onnx_utils
-from one_dragon.yolo.detect_utils import DetectFrameResult, DetectClass, DetectContext, DetectObjectResult, xywh2xyxy, \
-    multiclass_nms
+from one_dragon.yolo.detect_utils import DetectFrameResult, DetectClass, DetectContext, xywh2xyxy, multiclass_nms
 from one_dragon.yolo.onnx_model_loader import OnnxModelLoader
 
 
@@ -54,12 +52,14 @@ class Yolov8Detector(OnnxModelLoader):
 
     def run(self, image: MatLike, conf: float = 0.6, iou: float = 0.5, run_time: Optional[float] = None,
             label_list: Optional[List[str]] = None,
-            category_list: Optional[List[str]] = None) -> DetectFrameResult:
+            category_list: Optional[List[str]] = None,
+            roi: Optional[Tuple[int, int, int, int]] = None) -> DetectFrameResult:
         """
         对图片进行识别
         :param image: 使用 opencv 读取的图片 RGB通道
         :param conf: 置信度阈值
         :param iou: iou阈值
+        :param roi: 只识别图片中的这个区域 (x1, y1, x2, y2) 为空时识别整张图片 结果仍是原图的坐标
         :return: 识别结果
         """
         t1 = time.time()
@@ -68,6 +68,7 @@ class Yolov8Detector(OnnxModelLoader):
         context.iou = iou
         context.label_list = label_list
         context.category_list = category_list
+        context.roi = roi
 
         input_tensor = self.prepare_input(context)
         t2 = time.time()
@@ -75,18 +76,48 @@ class Yolov8Detector(OnnxModelLoader):
         outputs = self.inference(input_tensor)
         t3 = time.time()
 
-        results = self.process_output(outputs, context)
+        frame_result = self.process_output(outputs, context)
         t4 = time.time()
 
-        # log.info(f'识别完毕 得到结果 {len(results)}个。预处理耗时 {t2 - t1:.3f}s, 推理耗时 {t3 - t2:.3f}s, 后处理耗时 {t4 - t3:.3f}s')
+        # log.info(f'识别完毕 得到结果 {len(frame_result)}个。预处理耗时 {t2 - t1:.3f}s, 推理耗时 {t3 - t2:.3f}s, 后处理耗时 {t4 - t3:.3f}s')
 
-        return self.record_result(context, results)
+        return self.record_result(context, frame_result)
+
+    def run_batch(self, image_list: List[MatLike], conf: float = 0.6, iou: float = 0.5,
+                  run_time_list: Optional[List[float]] = None,
+                  label_list: Optional[List[str]] = None,
+                  category_list: Optional[List[str]] = None,
+                  roi_list: Optional[List[Optional[Tuple[int, int, int, int]]]] = None) -> List[DetectFrameResult]:
+        """
+        对多张图片进行识别 一次推理输入多张图片 减少每次推理的固定开销
+        模型的 batch 维度固定时 逐张推理
+        :param image_list: 使用 opencv 读取的图片 RGB通道
+        :param conf: 置信度阈值
+        :param iou: iou阈值
+        :param run_time_list: 每张图片的识别时间
+        :param roi_list: 每张图片的识别区域
+        :return: 每张图片的识别结果 按时间顺序记录到历史中
+        """
+        context_list: List[DetectContext] = []
+        for i, image in enumerate(image_list):
+            context = DetectContext(image, None if run_time_list is None else run_time_list[i])
+            context.conf = conf
+            context.iou = iou
+            context.label_list = label_list
+            context.category_list = category_list
+            context.roi = None if roi_list is None else roi_list[i]
+            context_list.append(context)
+
+        output_list = self.inference_batch(context_list)
+
+        return [self.record_result(context, self.process_output(outputs, context))
+                for context, outputs in zip(context_list, output_list)]
 
     def prepare_input(self, context: DetectContext) -> np.ndarray:
         """
         推理前的预处理
         """
-        input_tensor, scale_height, scale_width = onnx_utils.scale_input_image_u(context.img, self.onnx_input_width, self.onnx_input_height)
+        input_tensor, scale_height, scale_width = self.get_input_buffer().prepare(context.img, context.roi)
         context.scale_height = scale_height
         context.scale_width = scale_width
         return input_tensor
@@ -100,74 +131,81 @@ class Yolov8Detector(OnnxModelLoader):
         outputs = self.session.run(self.output_names, {self.input_names[0]: input_tensor})
         return outputs
 
-    def process_output(self, output, context: DetectContext) -> List[DetectObjectResult]:
+    def process_output(self, output, context: DetectContext) -> DetectFrameResult:
         """
         :param output: 推理结果
         :param context: 上下文
         :return: 最终得到的识别结果
         """
-        predictions = np.squeeze(output[0]).T
-
-        keep = np.ones(shape=(predictions.shape[1]), dtype=bool)
+        predictions = output[0][0]  # (4 + 类别数量, 候选框数量) 不转置 按行读取是连续内存
 
         if context.label_list is not None or context.category_list is not None:
-            keep[4:] = False  # 前4位是坐标 先把所有标签都设置为False
+            class_idx_set = set()
             if context.label_list is not None:
                 for label in context.label_list:
                     idx = self.class_2_idx.get(label)
                     if idx is not None:
-                        keep[idx + 4] = True
+                        class_idx_set.add(idx)
 
             if context.category_list is not None:
                 for category in context.category_list:
-                    for idx in self.category_2_idx.get(category, []):
-                        keep[idx + 4] = True
+                    class_idx_set.update(self.category_2_idx.get(category, []))
+            class_idx_arr = np.array(sorted(class_idx_set), dtype=np.int32)
+            class_scores = predictions[4 + class_idx_arr, :]  # 只取需要的类别
+        else:
+            class_idx_arr = None
+            class_scores = predictions[4:, :]
 
-        predictions[:, keep == False] = 0
+        if class_scores.shape[0] == 0:
+            return self._empty_frame_result(context)
 
         # 按置信度阈值进行基本的过滤
-        scores = np.max(predictions[:, 4:], axis=1)
-        predictions = predictions[scores > context.conf, :]
-        scores = scores[scores > context.conf]
-
-        results: List[DetectObjectResult] = []
-        if len(scores) == 0:
-            return results
+        scores = np.max(class_scores, axis=0)
+        mask = scores > context.conf
+        if not np.any(mask):
+            return self._empty_frame_result(context)
+        scores = scores[mask]
 
         # 选择置信度最高的类别
-        class_ids = np.argmax(predictions[:, 4:], axis=1)
+        class_ids = np.argmax(class_scores[:, mask], axis=0)
+        if class_idx_arr is not None:
+            class_ids = class_idx_arr[class_ids]
 
         # 提取Bounding box
-        boxes = predictions[:, :4]  # 原始推理结果 xywh
+        boxes = predictions[:4, mask].T  # 原始推理结果 xywh
         scale_shape = np.array([context.scale_width, context.scale_height, context.scale_width, context.scale_height])  # 缩放后图片的大小
         boxes = np.divide(boxes, scale_shape, dtype=np.float32)  # 转化到 0~1
-        boxes *= np.array([context.img_width, context.img_height, context.img_width, context.img_height])  # 恢复到原图的坐标
+        if context.roi is None:
+            boxes *= np.array([context.img_width, context.img_height, context.img_width, context.img_height])  # 恢复到原图的坐标
+        else:
+            x1, y1, x2, y2 = context.roi
+            boxes *= np.array([x2 - x1, y2 - y1, x2 - x1, y2 - y1])  # 恢复到区域的坐标
+            boxes[:, 0] += x1
+            boxes[:, 1] += y1
         boxes = xywh2xyxy(boxes)  # 转化成 xyxy
 
         # 进行NMS 获取最后的结果
         indices = multiclass_nms(boxes, scores, class_ids, context.iou)
 
-        for idx in indices:
-            result = DetectObjectResult(rect=boxes[idx].tolist(),
-                                        score=float(scores[idx]),
-                                        detect_class=self.idx_2_class[int(class_ids[idx])]
-                                        )
-            results.append(result)
+        return DetectFrameResult(
+            raw_image=context.img,
+            run_time=context.run_time,
+            boxes=boxes[indices].astype(np.int32),  # 与 DetectObjectResult 一致 向0取整
+            scores=scores[indices].astype(np.float32),
+            class_ids=class_ids[indices].astype(np.int32),
+            idx_2_class=self.idx_2_class
+        )
 
-        return results
+    def _empty_frame_result(self, context: DetectContext) -> DetectFrameResult:
+        return DetectFrameResult(raw_image=context.img, run_time=context.run_time, idx_2_class=self.idx_2_class)
 
-    def record_result(self, context: DetectContext, results: List[DetectObjectResult]) -> DetectFrameResult:
+    def record_result(self, context: DetectContext, new_frame: DetectFrameResult) -> DetectFrameResult:
         """
         记录本帧识别结果
         :param context: 识别上下文
-        :param results: 识别结果
+        :param new_frame: 识别结果
         :return: 组合结果
         """
-        new_frame = DetectFrameResult(
-            raw_image=context.img,
-            results=results,
-            run_time=context.run_time
-        )
         self.run_result_history.append(new_frame)
         self.run_result_history = [i for i in self.run_result_history
                                    if context.run_time - i.run_time <= self.keep_result_seconds]
@@ -200,3 +238,78 @@ class Yolov8Detector(OnnxModelLoader):
                 if c.class_category not in self.category_2_idx:
                     self.category_2_idx[c.class_category] = []
                 self.category_2_idx[c.class_category].append(c.class_id)
+
+
+def __debug_postprocess_benchmark():
+    """
+    模拟空洞地图画面的密集输出 对比原来逐类别循环的后处理 和 向量化的后处理
+    """
+    from one_dragon.yolo.detect_utils import DetectObjectResult, compute_iou
+
+    def legacy_process_output(detector: Yolov8Detector, output, context: DetectContext) -> List[DetectObjectResult]:
+        predictions = np.squeeze(output[0]).T.copy()
+        scores = np.max(predictions[:, 4:], axis=1)
+        predictions = predictions[scores > context.conf, :]
+        scores = scores[scores > context.conf]
+        class_ids = np.argmax(predictions[:, 4:], axis=1)
+        scale_shape = np.array([context.scale_width, context.scale_height, context.scale_width, context.scale_height])
+        boxes = np.divide(predictions[:, :4], scale_shape, dtype=np.float32)
+        boxes *= np.array([context.img_width, context.img_height, context.img_width, context.img_height])
+        boxes = xywh2xyxy(boxes)
+
+        keep = []
+        for class_id in np.unique(class_ids):
+            class_indices = np.where(class_ids == class_id)[0]
+            sorted_indices = np.argsort(scores[class_indices])[::-1]
+            while sorted_indices.size > 0:
+                box_id = sorted_indices[0]
+                keep.append(class_indices[box_id])
+                ious = compute_iou(boxes[class_indices[box_id]], boxes[class_indices[sorted_indices[1:]]])
+                sorted_indices = sorted_indices[np.where(ious < context.iou)[0] + 1]
+
+        return [DetectObjectResult(rect=boxes[idx].tolist(), score=float(scores[idx]),
+                                   detect_class=detector.idx_2_class[int(class_ids[idx])])
+                for idx in keep]
+
+    rng = np.random.default_rng(0)
+    class_cnt = 40
+    anchor_cnt = 92 * 92 + 46 * 46 + 23 * 23  # 736 输入
+    output = rng.uniform(0, 0.3, size=(1, 4 + class_cnt, anchor_cnt)).astype(np.float32)
+    output[0, 0, :] = rng.uniform(0, 736, anchor_cnt)
+    output[0, 1, :] = rng.uniform(92, 644, anchor_cnt)
+    output[0, 2:4, :] = 40
+    # 地图上 60 个格子 每个格子有 8 个重叠的候选框
+    for node in range(60):
+        cx, cy = rng.uniform(40, 700), rng.uniform(130, 600)
+        class_id = rng.integers(0, class_cnt)
+        for anchor in rng.choice(anchor_cnt, 8, replace=False):
+            output[0, 0:4, anchor] = (cx + rng.normal(0, 3), cy + rng.normal(0, 3), 40, 40)
+            output[0, 4 + class_id, anchor] = rng.uniform(0.6, 0.95)
+
+    detector = Yolov8Detector.__new__(Yolov8Detector)
+    detector.idx_2_class = {i: DetectClass(i, 'class_%d' % i) for i in range(class_cnt)}
+    detector.class_2_idx = {c.class_name: i for i, c in detector.idx_2_class.items()}
+    detector.category_2_idx = {}
+
+    context = DetectContext(np.zeros((1080, 1920, 3), dtype=np.uint8))
+    context.conf = 0.5
+    context.scale_width = 736
+    context.scale_height = 414
+
+    times = 200
+    for name, fn in [('原方式', lambda: legacy_process_output(detector, [output], context)),
+                     ('向量化', lambda: detector.process_output([output], context)),
+                     ('向量化+创建对象', lambda: detector.process_output([output], context).results)]:
+        fn()
+        start = time.perf_counter()
+        for _ in range(times):
+            fn()
+        print('%s %.3f 毫秒/帧' % (name, (time.perf_counter() - start) * 1000 / times))
+
+    old_set = {(r.x1, r.y1, r.detect_class.class_id) for r in legacy_process_output(detector, [output], context)}
+    new_set = {(r.x1, r.y1, r.detect_class.class_id) for r in detector.process_output([output], context).results}
+    print('结果数量 原方式 %d 向量化 %d 一致 %s' % (len(old_set), len(new_set), old_set == new_set))
+
+
+if __name__ == '__main__':
+    __debug_postprocess_benchmark()
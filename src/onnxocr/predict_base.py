@@ -1,4 +1,4 @@
-import onnxruntime
+from one_dragon.yolo.onnx_session_factory import get_default_factory
 
 class PredictBase(object):
     def __init__(self):
@@ -11,7 +11,8 @@ class PredictBase(object):
         else:
             providers = providers = ['CPUExecutionProvider']
 
-        onnx_session = onnxruntime.InferenceSession(model_dir, None,providers=providers)
+        # 统一的线程数和图优化配置 同一个模型只加载一次
+        onnx_session = get_default_factory().get_session_pool(model_dir, providers)
 
         # print("providers:", onnxruntime.get_device())
         return onnx_session
@@ -11,7 +11,7 @@ from pynput import keyboard, mouse
 
 from one_dragon.base.screen.screen_area import ScreenArea
 from one_dragon.base.conditional_operation.state_recorder import StateRecord
-from one_dragon.utils import cv2_utils, thread_utils, cal_utils, os_utils, yolo_config_utils
+from one_dragon.utils import thread_utils, cal_utils, os_utils, yolo_config_utils
 from one_dragon.utils.log_utils import log
 from zzz_od.context.zzz_context import ZContext
 from zzz_od.auto_battle.auto_battle_context import AutoBattleContext
@@ -373,11 +373,9 @@ class BattleContext4Recording(AutoBattleContext):
                 return None
             self._last_check_quick_time = screenshot_time
 
-            part = cv2_utils.crop_image_only(screen, self.area_btn_switch.rect)
-
             possible_agents = self.agent_context.get_possible_agent_list()
 
-            agent = self._match_quick_assist_agent_in(part, possible_agents)
+            agent = self._match_quick_assist_agent_in(screen, possible_agents)
 
             if agent is not None:
                 state_records: List[StateRecord] = [
@@ -425,15 +423,12 @@ class BattleContext4Recording(AutoBattleContext):
         """
         并行识别连携技角色
         """
-        c1 = cv2_utils.crop_image_only(screen, self.area_chain_1.rect)
-        c2 = cv2_utils.crop_image_only(screen, self.area_chain_2.rect)
-
         possible_agents = self.agent_context.get_possible_agent_list()
 
         result_agent_list: List[Optional[Agent]] = []
         future_list: List[Future] = []
-        future_list.append(_record_executor.submit(self._match_chain_agent_in, c1, possible_agents))
-        future_list.append(_record_executor.submit(self._match_chain_agent_in, c2, possible_agents))
+        future_list.append(_record_executor.submit(self._match_chain_agent_in, screen, self.area_chain_1, possible_agents))
+        future_list.append(_record_executor.submit(self._match_chain_agent_in, screen, self.area_chain_2, possible_agents))
 
         for future in future_list:
             try:
@@ -4,6 +4,7 @@ from typing import Optional, ClassVar
 
 from one_dragon.base.controller.pc_button import pc_button_utils
 from one_dragon.base.operation.operation_base import OperationResult
+from one_dragon.base.operation.application_warmup import AppWarmupResource
 from one_dragon.base.operation.operation_edge import node_from
 from one_dragon.base.operation.operation_node import operation_node
 from one_dragon.base.operation.operation_round_result import OperationRoundResult
@@ -32,6 +33,9 @@ class AutoBattleApp(ZApplication):
 
         self.auto_op: Optional[AutoBattleOperator] = None
 
+    def get_warmup_resource(self) -> AppWarmupResource:
+        return self.get_battle_warmup_resource()
+
     def handle_init(self) -> None:
         """
         执行前的初始化 由子类实现
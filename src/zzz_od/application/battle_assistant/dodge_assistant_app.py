@@ -3,6 +3,7 @@ import time
 from typing import Optional
 
 from one_dragon.base.controller.pc_button import pc_button_utils
+from one_dragon.base.operation.application_warmup import AppWarmupResource
 from one_dragon.base.operation.operation_edge import node_from
 from one_dragon.base.operation.operation_node import operation_node
 from one_dragon.base.operation.operation_round_result import OperationRoundResult
@@ -30,6 +31,10 @@ class DodgeAssistantApp(ZApplication):
 
         self.auto_op: Optional[AutoBattleOperator] = None
 
+    def get_warmup_resource(self) -> AppWarmupResource:
+        resource = self.get_battle_warmup_resource()
+        return AppWarmupResource(model_list=resource.model_list)
+
     def handle_init(self) -> None:
         """
         执行前的初始化 由子类实现
@@ -1,9 +1,12 @@
+import os
 from typing import ClassVar
 
+from one_dragon.base.operation.application_warmup import AppWarmupResource, get_model_resource
 from one_dragon.base.operation.operation import Operation
 from one_dragon.base.operation.operation_edge import node_from
 from one_dragon.base.operation.operation_node import operation_node
 from one_dragon.base.operation.operation_round_result import OperationRoundResult
+from one_dragon.utils import yolo_config_utils
 from one_dragon.utils.log_utils import log
 from zzz_od.application.hollow_zero.lost_void.lost_void_challenge_config import LostVoidRegionType
 from zzz_od.application.hollow_zero.lost_void.operation.lost_void_run_level import LostVoidRunLevel
@@ -31,6 +34,18 @@ class LostVoidApp(ZApplication):
 
         self.next_region_type: LostVoidRegionType = LostVoidRegionType.ENTRY # 下一个区域的类型
 
+    def get_warmup_resource(self) -> AppWarmupResource:
+        yolo_config = self.ctx.yolo_config
+        return self.get_battle_warmup_resource().merge(AppWarmupResource(
+            template_sub_dir_list=['lost_void'],
+            model_list=[
+                get_model_resource(
+                    os.path.join(yolo_config_utils.get_model_category_dir('lost_void_det'), yolo_config.lost_void_det),
+                    yolo_config.lost_void_det_gpu
+                )
+            ]
+        ))
+
     @operation_node(name='初始化加载', is_start_node=True)
     def init_for_lost_void(self) -> OperationRoundResult:
         try:
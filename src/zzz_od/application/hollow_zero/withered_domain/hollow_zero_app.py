@@ -1,10 +1,13 @@
+import os
 import time
 
 from typing import ClassVar
 
+from one_dragon.base.operation.application_warmup import AppWarmupResource, get_model_resource
 from one_dragon.base.operation.operation_edge import node_from
 from one_dragon.base.operation.operation_node import operation_node
 from one_dragon.base.operation.operation_round_result import OperationRoundResult
+from one_dragon.utils import yolo_config_utils
 from one_dragon.utils.i18_utils import gt
 from one_dragon.utils.log_utils import log
 from zzz_od.application.zzz_application import ZApplication
@@ -38,6 +41,18 @@ class HollowZeroApp(ZApplication):
         self.level: int = 1
         self.phase: int = 1
 
+    def get_warmup_resource(self) -> AppWarmupResource:
+        yolo_config = self.ctx.yolo_config
+        return self.get_battle_warmup_resource().merge(AppWarmupResource(
+            template_sub_dir_list=['hollow'],
+            model_list=[
+                get_model_resource(
+                    os.path.join(yolo_config_utils.get_model_category_dir('hollow_zero_event'), yolo_config.hollow_zero_event),
+                    yolo_config.hollow_zero_event_gpu
+                )
+            ]
+        ))
+
     def handle_init(self):
         self.ctx.init_hollow_config()
         mission_name = self.ctx.hollow_zero_config.mission_name
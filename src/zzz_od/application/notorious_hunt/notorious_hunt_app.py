@@ -1,5 +1,6 @@
 from typing import ClassVar, Optional
 
+from one_dragon.base.operation.application_warmup import AppWarmupResource
 from one_dragon.base.operation.operation_edge import node_from
 from one_dragon.base.operation.operation_node import operation_node
 from one_dragon.base.operation.operation_round_result import OperationRoundResult
@@ -31,6 +32,9 @@ class NotoriousHuntApp(ZApplication):
             run_record=ctx.notorious_hunt_record
         )
 
+    def get_warmup_resource(self) -> AppWarmupResource:
+        return self.get_battle_warmup_resource()
+
     def handle_init(self) -> None:
         """
         执行前的初始化 由子类实现
@@ -1,6 +1,7 @@
 from typing import ClassVar, List
 
 from one_dragon.base.geometry.point import Point
+from one_dragon.base.operation.application_warmup import AppWarmupResource
 from one_dragon.base.operation.operation_edge import node_from
 from one_dragon.base.operation.operation_node import operation_node
 from one_dragon.base.operation.operation_round_result import OperationRoundResult
@@ -34,6 +35,9 @@ class ShiyuDefenseApp(ZApplication):
         self.phase_team_list: List[DefensePhaseTeamInfo] = []  # 每个阶段使用的配队
         self.phase_idx: int = 0  # 当前阶段
 
+    def get_warmup_resource(self) -> AppWarmupResource:
+        return self.get_battle_warmup_resource()
+
     @operation_node(name='传送', is_start_node=True)
     def tp(self) -> OperationRoundResult:
         op = TransportByCompendium(self.ctx, '作战', '式舆防卫战', '剧变节点')
@@ -1,8 +1,11 @@
+import os
 from typing import Optional, Callable
 
 from one_dragon.base.operation.application_base import Application
 from one_dragon.base.operation.application_run_record import AppRunRecord
+from one_dragon.base.operation.application_warmup import AppWarmupResource, get_model_resource
 from one_dragon.base.operation.operation_base import OperationResult
+from one_dragon.utils import yolo_config_utils
 from zzz_od.context.zzz_context import ZContext
 from zzz_od.operation.enter_game.open_and_enter_game import OpenAndEnterGame
 
@@ -40,3 +43,20 @@ class ZApplication(Application):
 
     def handle_resume(self) -> None:
         self.ctx.controller.active_window()
+
+    def get_battle_warmup_resource(self) -> AppWarmupResource:
+        """
+        需要战斗的应用 预热战斗画面的模板和闪光模型
+        :return:
+        """
+        yolo_config = self.ctx.yolo_config
+        return AppWarmupResource(
+            template_sub_dir_list=['battle', 'agent_state'],
+            model_list=[
+                get_model_resource(
+                    os.path.join(yolo_config_utils.get_model_category_dir('flash_classifier'),
+                                 yolo_config.flash_classifier),
+                    yolo_config.flash_classifier_gpu
+                )
+            ]
+        )
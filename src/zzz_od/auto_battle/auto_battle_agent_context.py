@@ -6,8 +6,9 @@ from typing import Optional, List, Union, Tuple, Callable
 
 from one_dragon.base.conditional_operation.conditional_operator import ConditionalOperator
 from one_dragon.base.conditional_operation.state_recorder import StateRecord, StateRecorder
+from one_dragon.base.geometry.rectangle import Rect
 from one_dragon.base.screen.screen_area import ScreenArea
-from one_dragon.utils import cv2_utils, cal_utils
+from one_dragon.utils import cal_utils
 from one_dragon.utils.log_utils import log
 from zzz_od.auto_battle.agent_state import agent_state_checker
 from zzz_od.auto_battle.auto_battle_state import BattleStateEnum
@@ -383,11 +384,11 @@ class AutoBattleAgentContext:
         并发识别角色
         :return:
         """
-        area_img = [
-            cv2_utils.crop_image_only(screen, self.area_agent_3_1.rect),
-            cv2_utils.crop_image_only(screen, self.area_agent_3_2.rect),
-            cv2_utils.crop_image_only(screen, self.area_agent_3_3.rect),
-            cv2_utils.crop_image_only(screen, self.area_agent_2_2.rect)
+        area_list = [
+            self.area_agent_3_1,
+            self.area_agent_3_2,
+            self.area_agent_3_3,
+            self.area_agent_2_2,
         ]
 
         possible_agents = self.get_possible_agent_list()
@@ -408,7 +409,7 @@ class AutoBattleAgentContext:
 
         for i in range(4):
             if should_check[i]:
-                future_list.append(_battle_agent_context_executor.submit(self._match_agent_in, area_img[i], i == 0, possible_agents))
+                future_list.append(_battle_agent_context_executor.submit(self._match_agent_in, screen, area_list[i], i == 0, possible_agents))
             else:
                 future_list.append(None)
 
@@ -432,19 +433,44 @@ class AutoBattleAgentContext:
 
         return current_agent_list
 
-    def _match_agent_in(self, img: MatLike, is_front: bool,
+    def _match_agent_in(self, screen: MatLike, area: ScreenArea, is_front: bool,
                         possible_agents: Optional[List[Agent]] = None) -> Optional[Agent]:
         """
         在候选列表重匹配角色
         :return:
         """
         prefix = 'avatar_1_' if is_front else 'avatar_2_'
-        for agent in possible_agents:
-            mrl = self.ctx.tm.match_template(img, 'battle', prefix + agent.agent_id, threshold=0.8)
-            if mrl.max is not None:
-                return agent
+        agent, _ = self.match_agent_avatar(screen, area.rect, prefix, 0.8, possible_agents, reuse_unchanged=True)
+        return agent
 
-        return None
+    def match_agent_avatar(self, screen: MatLike, rect: Rect, prefix: str, threshold: float,
+                           possible_agents: Optional[List[Agent]] = None,
+                           reuse_unchanged: bool = False) -> Tuple[Optional[Agent], float]:
+        """
+        在区域中匹配角色头像 所有角色的头像作为一个模板组一次匹配
+        :param screen: 游戏画面
+        :param rect: 头像区域
+        :param prefix: 头像模板的前缀 例如 avatar_1_
+        :param threshold: 匹配阈值
+        :param possible_agents: 候选角色 为空时使用全部角色
+        :param reuse_unchanged: 头像区域没有变化时 复用上一次的结果
+        :return: 置信度最高的角色 及其置信度
+        """
+        all_agent_list: List[Agent] = [agent_enum.value for agent_enum in AgentEnum]
+        template_id_list = [prefix + agent.agent_id for agent in all_agent_list]
+        candidate_id_list = None if possible_agents is None else [prefix + agent.agent_id for agent in possible_agents]
+
+        mr = self.ctx.frame_cache.match_template_group(screen, self.ctx.tm, rect, 'battle', template_id_list,
+                                                       threshold=threshold, candidate_id_list=candidate_id_list,
+                                                       reuse_unchanged=reuse_unchanged)
+        if mr is None:
+            return None, 0
+
+        for agent in all_agent_list:
+            if prefix + agent.agent_id == mr.data:
+                return agent, mr.confidence
+
+        return None, 0
 
     def _check_agent_state_in_parallel(self, screen: MatLike, screenshot_time: float, agent_state_list: List[CheckAgentState]) -> List[StateRecord]:
         """
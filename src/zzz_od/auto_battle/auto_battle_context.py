@@ -3,7 +3,7 @@ from concurrent.futures import ThreadPoolExecutor, Future
 
 import threading
 from cv2.typing import MatLike
-from typing import Optional, List, Union
+from typing import Optional, List, Tuple, Union
 
 from one_dragon.base.conditional_operation.conditional_operator import ConditionalOperator
 from one_dragon.base.conditional_operation.state_recorder import StateRecord
@@ -11,6 +11,7 @@ from one_dragon.base.matcher.match_result import MatchResult
 from one_dragon.base.screen import screen_utils
 from one_dragon.base.screen.screen_area import ScreenArea
 from one_dragon.base.screen.screen_utils import FindAreaResultEnum
+from one_dragon.thread.recognition_scheduler import RecognitionScheduler
 from one_dragon.utils import cv2_utils, thread_utils, cal_utils, str_utils
 from one_dragon.utils.log_utils import log
 from zzz_od.auto_battle.auto_battle_agent_context import AutoBattleAgentContext
@@ -22,6 +23,17 @@ from zzz_od.game_data.agent import Agent
 
 _battle_state_check_executor = ThreadPoolExecutor(thread_name_prefix='od_battle_state_check', max_workers=16)
 
+# 每帧的识别入口统一由调度器执行 限制同时识别的数量 并总是识别最新的画面
+# 识别内部的并行子任务(如同时识别两个连携技头像)仍然使用上面的线程池 避免等待子任务时占满调度器线程
+_battle_recognition_scheduler = RecognitionScheduler('od_battle_recognition', max_workers=4)
+_battle_recognition_scheduler.register_checker('dodge_audio', priority=100)
+_battle_recognition_scheduler.register_checker('dodge_flash', priority=90)
+_battle_recognition_scheduler.register_checker('agent', priority=50)
+_battle_recognition_scheduler.register_checker('quick_assist', priority=40)
+_battle_recognition_scheduler.register_checker('chain_attack', priority=40)
+_battle_recognition_scheduler.register_checker('distance', priority=20)
+_battle_recognition_scheduler.register_checker('battle_end', priority=10)
+
 
 class AutoBattleContext:
 
@@ -392,28 +404,43 @@ class AutoBattleContext:
         future_list: List[Future] = []
 
         if in_battle:
-            audio_future = _battle_state_check_executor.submit(self.dodge_context.check_dodge_audio, screenshot_time)
+            # 音频优先级高于闪光 保证闪光识别等待音频结果时 音频已经被取出执行
+            audio_future = _battle_recognition_scheduler.submit(
+                'dodge_audio', self.dodge_context.check_dodge_audio, screenshot_time,
+                frame_time=screenshot_time)
             future_list.append(audio_future)
-            future_list.append(_battle_state_check_executor.submit(self.dodge_context.check_dodge_flash, screen, screenshot_time, audio_future))
-
-            agent_future = _battle_state_check_executor.submit(self.agent_context.check_agent_related, screen, screenshot_time)
-            future_list.append(agent_future)
-            future_list.append(_battle_state_check_executor.submit(self.check_quick_assist, screen, screenshot_time))
+            future_list.append(_battle_recognition_scheduler.submit(
+                'dodge_flash', self.dodge_context.check_dodge_flash, screen, screenshot_time, audio_future,
+                frame_time=screenshot_time))
+
+            future_list.append(_battle_recognition_scheduler.submit(
+                'agent', self.agent_context.check_agent_related, screen, screenshot_time,
+                frame_time=screenshot_time))
+            future_list.append(_battle_recognition_scheduler.submit(
+                'quick_assist', self.check_quick_assist, screen, screenshot_time,
+                frame_time=screenshot_time))
             if check_distance:
-                future_list.append(_battle_state_check_executor.submit(self._check_distance_with_lock, screen, screenshot_time))
+                future_list.append(_battle_recognition_scheduler.submit(
+                    'distance', self._check_distance_with_lock, screen, screenshot_time,
+                    frame_time=screenshot_time))
         else:
-            future_list.append(_battle_state_check_executor.submit(self.check_chain_attack, screen, screenshot_time))
+            future_list.append(_battle_recognition_scheduler.submit(
+                'chain_attack', self.check_chain_attack, screen, screenshot_time,
+                frame_time=screenshot_time))
             check_battle_end = check_battle_end_normal_result or check_battle_end_hollow_result or check_battle_end_defense_result
             if check_battle_end:
-                future_list.append(_battle_state_check_executor.submit(
-                    self._check_battle_end, screen, screenshot_time,
-                    check_battle_end_normal_result, check_battle_end_hollow_result, check_battle_end_defense_result
+                future_list.append(_battle_recognition_scheduler.submit(
+                    'battle_end', self._check_battle_end, screen, screenshot_time,
+                    check_battle_end_normal_result, check_battle_end_hollow_result, check_battle_end_defense_result,
+                    frame_time=screenshot_time
                 ))
         for future in future_list:
             future.add_done_callback(thread_utils.handle_future_result)
 
         if sync:
             for future in future_list:
+                if future.cancelled():  # 被更新的画面替换了
+                    continue
                 future.result()
 
         return in_battle
@@ -441,15 +468,12 @@ class AutoBattleContext:
         """
         并行识别连携技角色
         """
-        c1 = cv2_utils.crop_image_only(screen, self.area_chain_1.rect)
-        c2 = cv2_utils.crop_image_only(screen, self.area_chain_2.rect)
-
         possible_agents = self.agent_context.get_possible_agent_list()
 
         result_agent_list: List[Optional[Agent]] = []
         future_list: List[Future] = []
-        future_list.append(_battle_state_check_executor.submit(self._match_chain_agent_in, c1, possible_agents))
-        future_list.append(_battle_state_check_executor.submit(self._match_chain_agent_in, c2, possible_agents))
+        future_list.append(_battle_state_check_executor.submit(self._match_chain_agent_in, screen, self.area_chain_1, possible_agents))
+        future_list.append(_battle_state_check_executor.submit(self._match_chain_agent_in, screen, self.area_chain_2, possible_agents))
 
         for future in future_list:
             try:
@@ -477,17 +501,14 @@ class AutoBattleContext:
             state_records.append(StateRecord(BattleStateEnum.STATUS_CHAIN_READY.value, screenshot_time))
             self.auto_op.batch_update_states(state_records)
 
-    def _match_chain_agent_in(self, img: MatLike, possible_agents: Optional[List[Agent]] = None) -> Optional[Agent]:
+    def _match_chain_agent_in(self, screen: MatLike, area: ScreenArea,
+                              possible_agents: Optional[List[Agent]] = None) -> Optional[Agent]:
         """
         在候选列表重匹配角色
         :return:
         """
-        for agent in possible_agents:
-            mrl = self.ctx.tm.match_template(img, 'battle', 'avatar_chain_' + agent.agent_id, threshold=0.8)
-            if mrl.max is not None:
-                return agent
-
-        return None
+        agent, _ = self.agent_context.match_agent_avatar(screen, area.rect, 'avatar_chain_', 0.8, possible_agents)
+        return agent
 
     def check_quick_assist(self, screen: MatLike, screenshot_time: float) -> None:
         """
@@ -502,11 +523,9 @@ class AutoBattleContext:
                 return
             self._last_check_quick_time = screenshot_time
 
-            part = cv2_utils.crop_image_only(screen, self.area_btn_switch.rect)
-
             possible_agents = self.agent_context.get_possible_agent_list()
 
-            agent = self._match_quick_assist_agent_in(part, possible_agents)
+            agent = self._match_quick_assist_agent_in(screen, possible_agents)
 
             if agent is not None:
                 state_records: List[StateRecord] = [
@@ -520,17 +539,13 @@ class AutoBattleContext:
         finally:
             self._check_quick_lock.release()
 
-    def _match_quick_assist_agent_in(self, img: MatLike, possible_agents: Optional[List[Agent]] = None) -> Optional[Agent]:
+    def _match_quick_assist_agent_in(self, screen: MatLike, possible_agents: Optional[List[Agent]] = None) -> Optional[Agent]:
         """
         在候选列表重匹配角色
         :return:
         """
-        for agent in possible_agents:
-            mrl = self.ctx.tm.match_template(img, 'battle', 'avatar_quick_' + agent.agent_id, threshold=0.9)
-            if mrl.max is not None:
-                return agent
-
-        return None
+        agent, _ = self.agent_context.match_agent_avatar(screen, self.area_btn_switch.rect, 'avatar_quick_', 0.9, possible_agents)
+        return agent
 
     def _check_battle_end(self, screen: MatLike, screenshot_time: float,
                           check_battle_end_normal_result: bool,
@@ -545,54 +560,27 @@ class AutoBattleContext:
                 return
             self._last_check_end_time = screenshot_time
 
+            # (画面名称, 区域名称, 识别结果) 按顺序取第一个找到的
+            to_check_list: List[Tuple[str, str, str]] = []
             if check_battle_end_hollow_result:
-                result = screen_utils.find_area(ctx=self.ctx, screen=screen,
-                                                screen_name='零号空洞-战斗', area_name='挑战结果')
-                if result == FindAreaResultEnum.TRUE:
-                    self.last_check_end_result = '零号空洞-挑战结果'
-                    return
-
-                result = screen_utils.find_area(ctx=self.ctx, screen=screen,
-                                                screen_name='零号空洞-事件', area_name='背包')
-                if result == FindAreaResultEnum.TRUE:
-                    self.last_check_end_result = '零号空洞-背包'
-                    return
-
-                result = screen_utils.find_area(ctx=self.ctx, screen=screen,
-                                                screen_name='零号空洞-战斗', area_name='鸣徽-确定')
-                if result == FindAreaResultEnum.TRUE:
-                    self.last_check_end_result = '鸣徽-确定'
-                    return
-
-                result = screen_utils.find_area(ctx=self.ctx, screen=screen,
-                                                screen_name='零号空洞-战斗', area_name='结算周期上限-确认')
-                if result == FindAreaResultEnum.TRUE:
-                    self.last_check_end_result = '零号空洞-结算周期上限'
-                    return
-
+                to_check_list.append(('零号空洞-战斗', '挑战结果', '零号空洞-挑战结果'))
+                to_check_list.append(('零号空洞-事件', '背包', '零号空洞-背包'))
+                to_check_list.append(('零号空洞-战斗', '鸣徽-确定', '鸣徽-确定'))
+                to_check_list.append(('零号空洞-战斗', '结算周期上限-确认', '零号空洞-结算周期上限'))
             if check_battle_end_defense_result:
-                result = screen_utils.find_area(ctx=self.ctx, screen=screen,
-                                                screen_name='式舆防卫战', area_name='战斗结束-退出')
-                if result == FindAreaResultEnum.TRUE:
-                    self.last_check_end_result = '战斗结束-退出'
-                    return
-
-                result = screen_utils.find_area(ctx=self.ctx, screen=screen,
-                                                screen_name='式舆防卫战', area_name='战斗结束-撤退')
-                if result == FindAreaResultEnum.TRUE:
-                    self.last_check_end_result = '战斗结束-撤退'
-                    return
-
+                to_check_list.append(('式舆防卫战', '战斗结束-退出', '战斗结束-退出'))
+                to_check_list.append(('式舆防卫战', '战斗结束-撤退', '战斗结束-撤退'))
             if check_battle_end_normal_result:
-                result = screen_utils.find_area(ctx=self.ctx, screen=screen,
-                                                screen_name='战斗画面', area_name='战斗结果-完成')
-                if result == FindAreaResultEnum.TRUE:
-                    self.last_check_end_result = '普通战斗-完成'
-                    return
-                result = screen_utils.find_area(ctx=self.ctx, screen=screen,
-                                                screen_name='战斗画面', area_name='战斗结果-撤退')
+                to_check_list.append(('战斗画面', '战斗结果-完成', '普通战斗-完成'))
+                to_check_list.append(('战斗画面', '战斗结果-撤退', '普通战斗-撤退'))
+
+            # 文本区域合并成一次批量OCR
+            area_list = [self.ctx.screen_loader.get_area(screen_name, area_name)
+                         for screen_name, area_name, _ in to_check_list]
+            result_list = screen_utils.find_area_list_in_screen(self.ctx, screen, area_list, reuse_unchanged=True)
+            for (_, _, end_result), result in zip(to_check_list, result_list):
                 if result == FindAreaResultEnum.TRUE:
-                    self.last_check_end_result = '普通战斗-撤退'
+                    self.last_check_end_result = end_result
                     return
 
             self.last_check_end_result = None
@@ -674,9 +662,8 @@ class AutoBattleContext:
         :param screen:
         :return:
         """
-        part = cv2_utils.crop_image_only(screen, self.area_btn_normal.rect)
-        mrl = self.ctx.tm.match_template(part, 'battle', 'btn_normal_attack',
-                                         threshold=0.9)
+        mrl = self.ctx.frame_cache.match_template(screen, self.ctx.tm, self.area_btn_normal.rect,
+                                                  'battle', 'btn_normal_attack', threshold=0.9)
         return mrl.max is not None
 
     def start_context(self) -> None:
@@ -685,6 +672,8 @@ class AutoBattleContext:
         :return:
         """
         self.dodge_context.start_context()
+        self.ctx.frame_cache.reset_stats()
+        _battle_recognition_scheduler.reset_stats()
 
     def stop_context(self) -> None:
         """
@@ -692,6 +681,8 @@ class AutoBattleContext:
         :return:
         """
         self.dodge_context.stop_context()
+        log.debug('单帧识别缓存 %s', self.ctx.frame_cache.stats_display_text)
+        log.debug('识别调度 %s', _battle_recognition_scheduler.stats_display_text)
 
         log.info('松开所有按键')
         self.dodge(release=True)
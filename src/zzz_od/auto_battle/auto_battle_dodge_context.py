@@ -1,4 +1,4 @@
-from concurrent.futures import ThreadPoolExecutor, Future
+from concurrent.futures import ThreadPoolExecutor, Future, CancelledError
 
 import librosa
 import numpy as np
@@ -6,15 +6,17 @@ import os
 import threading
 from cv2.typing import MatLike
 from enum import Enum
+from functools import lru_cache
 from scipy.signal import correlate, butter, filtfilt
 from sklearn.preprocessing import scale
-from typing import Optional, List, Union
+from typing import Optional, List, Tuple, Union
 
 from one_dragon.base.conditional_operation.conditional_operator import ConditionalOperator
 from one_dragon.base.conditional_operation.state_recorder import StateRecord
 from one_dragon.utils import cal_utils, yolo_config_utils
 from one_dragon.utils import thread_utils, os_utils
 from one_dragon.utils.log_utils import log
+from zzz_od.auto_battle.dodge_audio_stream import AudioRingBuffer, StreamingAudioDetector
 from zzz_od.context.zzz_context import ZContext
 from zzz_od.yolo.flash_classifier import FlashClassifier
 
@@ -36,7 +38,9 @@ class AudioRecorder:
         self._sample_len = 0.01  # 每次采样的长度（秒）
         self._chunk_size = int(self._sample_rate * self._sample_len)  # 每个音频块的大小
 
-        self.trigger_threshold = 0.1  # 触发阈值
+        self.trigger_threshold = 0.1  # 触发阈值 get_max_corr 使用
+        self.stream_trigger_threshold = 0.3  # 流式匹配的触发阈值 归一化的相关系数
+        self.stream_template_seconds = 0.15  # 流式匹配使用模板开头的秒数 越短识别越快
 
         self._filter_degree = 4  # 四阶bathworth多项式, 越大阻带区域滤波程度越大
         self._cut_off = 1000  # Hz,截止频率,对该频率一下的声音进行滤波,若需要识别人声可适当降低
@@ -44,7 +48,9 @@ class AudioRecorder:
         self.filter_b, self.filter_a = butter(self._filter_degree, self._cut_off, btype='highpass', output='ba',
                                               fs=self._sample_rate)  # Butterworth高通滤波
 
-        self.latest_audio = np.empty(shape=(0,), dtype=np.float64)  # 存储最新的音频数据
+        self.audio_buffer: AudioRingBuffer = AudioRingBuffer(int(self._sample_rate // 2))  # 最新0.5秒的音频数据
+        self.detector: StreamingAudioDetector = StreamingAudioDetector(
+            self._sample_rate, self._chunk_size, self.filter_b, self.filter_a)  # 录音时持续进行模板匹配
         self._update_audio_lock = threading.Lock()
 
     def start_running_async(self) -> None:
@@ -57,7 +63,7 @@ class AudioRecorder:
 
             self.running = True
 
-        self.latest_audio = np.zeros(int(self._sample_rate // 2))  # 初始化音频数据缓冲区，长度为0.5秒
+        self.clear_audio()
         future = _dodge_check_executor.submit(self._record_loop)
         future.add_done_callback(thread_utils.handle_future_result)
 
@@ -83,9 +89,8 @@ class AudioRecorder:
                     stream_data = stream_data.T
 
                 with self._update_audio_lock:
-                    # 更新 latest_audio
-                    self.latest_audio[:-len(stream_data)] = self.latest_audio[len(stream_data):]
-                    self.latest_audio[-len(stream_data):] = stream_data
+                    self.audio_buffer.write(stream_data)
+                self.detector.feed(stream_data)
 
     def stop_running(self) -> None:
         """
@@ -93,12 +98,21 @@ class AudioRecorder:
         """
         self.running = False
 
+    @property
+    def latest_audio(self) -> np.ndarray:
+        """
+        按时间顺序的最新0.5秒音频 每次都会复制
+        """
+        with self._update_audio_lock:
+            return self.audio_buffer.read_latest(self.audio_buffer.capacity)
+
     def clear_audio(self) -> None:
         """
         清楚当前录音
         """
         with self._update_audio_lock:
-            self.latest_audio = np.zeros(int(self._sample_rate // 2))
+            self.audio_buffer.clear()
+        self.detector.reset()
 
 
 class YoloStateEventEnum(Enum):
@@ -110,6 +124,37 @@ class YoloStateEventEnum(Enum):
     DODGE_AUDIO = '闪避识别-声音'
 
 
+def get_dodge_audio_template_dir() -> str:
+    """
+    声音模板的目录 每个 wav 文件是一种闪避的声音提示
+    :return:
+    """
+    return os_utils.get_path_under_work_dir('assets', 'template', 'dodge_audio')
+
+
+@lru_cache
+def get_dodge_audio_cue_list() -> Tuple[str, ...]:
+    """
+    所有声音提示的名称 即模板文件名 只读取一次目录
+    :return:
+    """
+    template_dir = get_dodge_audio_template_dir()
+    if not os.path.isdir(template_dir):
+        return tuple()
+    return tuple(sorted(os.path.splitext(file_name)[0]
+                        for file_name in os.listdir(template_dir)
+                        if file_name.lower().endswith('.wav')))
+
+
+def get_dodge_audio_cue_state(cue_name: str) -> str:
+    """
+    每种声音提示对应的状态 例如 闪避识别-声音-template_1
+    :param cue_name: 声音提示名称
+    :return:
+    """
+    return '%s-%s' % (YoloStateEventEnum.DODGE_AUDIO.value, cue_name)
+
+
 class AutoBattleDodgeContext:
     """
     战斗闪避上下文类，用于管理和处理闪避识别相关的逻辑。
@@ -165,6 +210,15 @@ class AutoBattleDodgeContext:
                 gpu=use_gpu
             )
 
+        # 识别模式 每次运行前按配置更新
+        yolo_config = self.ctx.yolo_config
+        self._flash_model.mode = yolo_config.flash_classifier_mode
+        self._flash_model.roi = yolo_config.flash_classifier_roi
+        self._flash_model.downscale = yolo_config.flash_classifier_downscale
+        self._flash_model.gate.threshold = yolo_config.flash_classifier_gate_threshold
+        self._flash_model.gate.hold_seconds = yolo_config.flash_classifier_gate_hold_seconds
+        self._flash_model.reset_mode_state()
+
         # 识别间隔
         self._check_dodge_interval = check_dodge_interval
         self._check_audio_interval = check_audio_interval
@@ -183,14 +237,21 @@ class AutoBattleDodgeContext:
         if self._audio_template is not None:
             return
         log.info('加载声音模板中')
-        self._audio_template, _ = librosa.load(os.path.join(
-            os_utils.get_path_under_work_dir('assets', 'template', 'dodge_audio'),
-            'template_1.wav'
-        ), sr=32000)
+        template_dir = get_dodge_audio_template_dir()
+        template_map = {}
+        for cue_name in get_dodge_audio_cue_list():
+            raw_template, _ = librosa.load(os.path.join(template_dir, '%s.wav' % cue_name), sr=32000)
+            template_map[cue_name] = raw_template
+        if len(template_map) == 0:
+            log.error('没有声音模板 %s', template_dir)
+            return
+        # 所有模板共用输入音频的频谱 一次批量计算
+        self._audio_recorder.detector.set_templates(template_map, max_seconds=self._audio_recorder.stream_template_seconds)
 
-        self._audio_template = self._get_filter_wave(self._audio_template)  # 滤波
+        default_template = template_map.get('template_1', next(iter(template_map.values())))
+        self._audio_template = self._get_filter_wave(default_template)  # 滤波
 
-        log.info('加载声音模板完成')
+        log.info('加载声音模板完成 共 %d 个', len(template_map))
 
     def check_dodge_flash(self, screen: MatLike, screenshot_time: float, audio_future: Optional[Future[bool]] = None) -> bool:
         """
@@ -210,14 +271,18 @@ class AutoBattleDodgeContext:
 
             self._last_check_dodge_time = screenshot_time
 
-            result = self._flash_model.run(screen)
+            result = self._flash_model.classify(screen, run_time=screenshot_time)
             state_name: Optional[str] = None
             if result.class_idx == 1:
                 state_name = YoloStateEventEnum.DODGE_RED.value
             elif result.class_idx == 2:
                 state_name = YoloStateEventEnum.DODGE_YELLOW.value
-            elif audio_future is not None:
-                audio_result = audio_future.result()
+            elif audio_future is not None and not audio_future.cancelled():
+                # 音频任务可能因为有更新的画面而被取消
+                try:
+                    audio_result = audio_future.result()
+                except CancelledError:
+                    audio_result = False
                 if audio_result:
                     state_name = YoloStateEventEnum.DODGE_AUDIO.value
 
@@ -244,20 +309,23 @@ class AutoBattleDodgeContext:
             if screenshot_time - self._last_check_audio_time < cal_utils.random_in_range(self._check_audio_interval):
                 # 还没有达到识别间隔
                 return False
-            if self._audio_template is None:
+            if self._audio_template is None or not self._audio_recorder.detector.ready:
                 return False
             self._last_check_audio_time = screenshot_time
 
-            if self._audio_recorder.latest_audio.size == 0:
-                return False
-
-            corr = self.get_max_corr(self._audio_template, self._audio_recorder.latest_audio)
-            # log.debug('声音相似度 %.2f' % corr)
+            # 录音线程已经持续匹配 这里只取上次识别后 每种声音提示的最大相关系数
+            cue_corr = self._audio_recorder.detector.pop_cue_corr()
+            # log.debug('声音相似度 %s' % cue_corr)
 
+            hit_cue_list = [cue_name for cue_name, corr in cue_corr.items()
+                            if corr > self._audio_recorder.stream_trigger_threshold]
             # 事件去重逻辑
-            if corr > self._audio_recorder.trigger_threshold:
+            if len(hit_cue_list) > 0:
                 self._last_audio_event_time = screenshot_time
                 self._audio_recorder.clear_audio()
+                # 通用的 闪避识别-声音 在 check_dodge_flash 中更新
+                for cue_name in hit_cue_list:
+                    self.auto_op.update_state(StateRecord(get_dodge_audio_cue_state(cue_name), screenshot_time))
                 return True
 
             return False
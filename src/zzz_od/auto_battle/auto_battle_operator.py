@@ -1,5 +1,6 @@
 import time
 from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
 import os
 from typing import List, Optional, Tuple
@@ -9,7 +10,7 @@ from one_dragon.base.conditional_operation.conditional_operator import Condition
 from one_dragon.base.conditional_operation.operation_def import OperationDef
 from one_dragon.base.conditional_operation.operation_template import OperationTemplate
 from one_dragon.base.conditional_operation.state_handler_template import StateHandlerTemplate
-from one_dragon.base.conditional_operation.state_recorder import StateRecorder
+from one_dragon.base.conditional_operation.state_recorder import StateRecorder, StateRecorderStore
 from one_dragon.utils import os_utils, thread_utils
 from one_dragon.utils.log_utils import log
 from zzz_od.auto_battle.atomic_op.btn_chain_left import AtomicBtnChainLeft
@@ -32,7 +33,8 @@ from zzz_od.auto_battle.atomic_op.state_clear import AtomicClearState
 from zzz_od.auto_battle.atomic_op.state_set import AtomicSetState
 from zzz_od.auto_battle.atomic_op.wait import AtomicWait
 from zzz_od.auto_battle.auto_battle_context import AutoBattleContext
-from zzz_od.auto_battle.auto_battle_dodge_context import YoloStateEventEnum
+from zzz_od.auto_battle.auto_battle_dodge_context import YoloStateEventEnum, get_dodge_audio_cue_list, \
+    get_dodge_audio_cue_state
 from zzz_od.auto_battle.auto_battle_state import BattleStateEnum
 from zzz_od.context.zzz_context import ZContext
 from zzz_od.game_data.agent import AgentEnum, AgentTypeEnum, CommonAgentStateEnum
@@ -53,7 +55,6 @@ class AutoBattleOperator(ConditionalOperator):
         )
 
         self.state_recorders: dict[str, StateRecorder] = {}
-        self._mutex_list: dict[str, List[str]] = {}
 
         self.auto_battle_context: AutoBattleContext = AutoBattleContext(ctx)
 
@@ -91,47 +92,8 @@ class AutoBattleOperator(ConditionalOperator):
         if not self.is_file_exists():
             return False, '自动战斗配置不存在 请重新选择'
 
-        self._mutex_list: dict[str, List[str]] = {}
-
-        for agent_enum in AgentEnum:
-            mutex_list: List[str] = []
-            for mutex_agent_enum in AgentEnum:
-                if mutex_agent_enum == agent_enum:
-                    continue
-                mutex_list.append(mutex_agent_enum.value.agent_name)
-
-            agent_name = agent_enum.value.agent_name
-            self._mutex_list[f'前台-{agent_name}'] = [f'前台-{i}' for i in mutex_list] + [f'后台-1-{agent_name}', f'后台-2-{agent_name}', f'后台-{agent_name}']
-            self._mutex_list[f'后台-{agent_name}'] = [f'前台-{agent_name}']
-            self._mutex_list[f'后台-1-{agent_name}'] = [f'后台-1-{i}' for i in mutex_list] + [f'后台-2-{agent_name}', f'前台-{agent_name}']
-            self._mutex_list[f'后台-2-{agent_name}'] = [f'后台-2-{i}' for i in mutex_list] + [f'后台-1-{agent_name}', f'前台-{agent_name}']
-            self._mutex_list[f'连携技-1-{agent_name}'] = [f'连携技-1-{i}' for i in (mutex_list + ['邦布'])]
-            self._mutex_list[f'连携技-2-{agent_name}'] = [f'连携技-2-{i}' for i in (mutex_list + ['邦布'])]
-            self._mutex_list[f'快速支援-{agent_name}'] = [f'快速支援-{i}' for i in mutex_list]
-            self._mutex_list[f'切换角色-{agent_name}'] = [f'切换角色-{i}' for i in mutex_list]
-
-        for agent_type_enum in AgentTypeEnum:
-            if agent_type_enum == AgentTypeEnum.UNKNOWN:
-                continue
-            mutex_list: List[str] = []
-            for mutex_agent_type_enum in AgentTypeEnum:
-                if mutex_agent_type_enum == AgentTypeEnum.UNKNOWN:
-                    continue
-                if mutex_agent_type_enum == agent_type_enum:
-                    continue
-                mutex_list.append(mutex_agent_type_enum.value)
-
-            self._mutex_list['前台-' + agent_type_enum.value] = ['前台-' + i for i in mutex_list]
-            self._mutex_list['后台-1-' + agent_type_enum.value] = ['后台-1-' + i for i in mutex_list]
-            self._mutex_list['后台-2-' + agent_type_enum.value] = ['后台-2-' + i for i in mutex_list]
-            self._mutex_list['连携技-1-' + agent_type_enum.value] = ['连携技-1-' + i for i in mutex_list]
-            self._mutex_list['连携技-2-' + agent_type_enum.value] = ['连携技-2-' + i for i in mutex_list]
-            self._mutex_list['快速支援-' + agent_type_enum.value] = ['快速支援-' + i for i in mutex_list]
-            self._mutex_list['切换角色-' + agent_type_enum.value] = ['切换角色-' + i for i in mutex_list]
-
-        # 特殊处理连携技的互斥
-        for i in range(1, 3):
-            self._mutex_list[f'连携技-{i}-邦布'] = [f'连携技-{i}-{agent_enum.value.agent_name}' for agent_enum in AgentEnum]
+        self.state_recorder_store = StateRecorderStore()
+        self._init_state_mutex(self.state_recorder_store)
 
         ConditionalOperator.init(
             self,
@@ -141,6 +103,32 @@ class AutoBattleOperator(ConditionalOperator):
         )
         return True, ''
 
+    @staticmethod
+    def _init_state_mutex(store: StateRecorderStore) -> None:
+        """
+        初始化状态之间的互斥关系
+        同一位置的不同角色 同一位置的不同角色类型 都作为一个互斥组
+        :param store: 状态记录的存储
+        :return:
+        """
+        agent_name_list: List[str] = [agent_enum.value.agent_name for agent_enum in AgentEnum]
+        for prefix in ['前台-', '后台-1-', '后台-2-', '快速支援-', '切换角色-']:
+            store.add_mutex_group([prefix + i for i in agent_name_list])
+        # 连携技的邦布 与所有角色互斥
+        for prefix in ['连携技-1-', '连携技-2-']:
+            store.add_mutex_group([prefix + i for i in (agent_name_list + ['邦布'])])
+
+        for agent_name in agent_name_list:
+            store.add_mutex(f'前台-{agent_name}', [f'后台-1-{agent_name}', f'后台-2-{agent_name}', f'后台-{agent_name}'])
+            store.add_mutex(f'后台-{agent_name}', [f'前台-{agent_name}'])
+            store.add_mutex(f'后台-1-{agent_name}', [f'后台-2-{agent_name}', f'前台-{agent_name}'])
+            store.add_mutex(f'后台-2-{agent_name}', [f'后台-1-{agent_name}', f'前台-{agent_name}'])
+
+        agent_type_list: List[str] = [agent_type_enum.value for agent_type_enum in AgentTypeEnum
+                                      if agent_type_enum != AgentTypeEnum.UNKNOWN]
+        for prefix in ['前台-', '后台-1-', '后台-2-', '连携技-1-', '连携技-2-', '快速支援-', '切换角色-']:
+            store.add_mutex_group([prefix + i for i in agent_type_list])
+
     @staticmethod
     def get_all_state_event_ids() -> List[str]:
         """
@@ -152,6 +140,9 @@ class AutoBattleOperator(ConditionalOperator):
         for event_enum in YoloStateEventEnum:
             event_ids.append(event_enum.value)
 
+        for cue_name in get_dodge_audio_cue_list():
+            event_ids.append(get_dodge_audio_cue_state(cue_name))
+
         for event_enum in BattleStateEnum:
             event_ids.append(event_enum.value)
 
@@ -206,12 +197,21 @@ class AutoBattleOperator(ConditionalOperator):
             if state_name in self.state_recorders:
                 return self.state_recorders[state_name]
             else:
-                r = StateRecorder(state_name, mutex_list=self._mutex_list.get(state_name, None))
+                r = StateRecorder(state_name, store=self.state_recorder_store)
                 self.state_recorders[state_name] = r
                 return r
         else:
             return None
 
+    @staticmethod
+    @lru_cache
+    def get_valid_state_set() -> frozenset[str]:
+        """
+        合法的状态事件ID 只计算一次 状态更新时判断使用
+        :return:
+        """
+        return frozenset(AutoBattleOperator.get_all_state_event_ids())
+
     @staticmethod
     def is_valid_state(state_name: str) -> bool:
         """
@@ -219,7 +219,7 @@ class AutoBattleOperator(ConditionalOperator):
         :param state_name:
         :return:
         """
-        if state_name in AutoBattleOperator.get_all_state_event_ids():
+        if state_name in AutoBattleOperator.get_valid_state_set():
             return True
         elif state_name.startswith('自定义-'):
             return True
@@ -0,0 +1,468 @@
+import threading
+import time
+
+import numpy as np
+from scipy.signal import lfilter, lfilter_zi
+from typing import Dict, List, Optional
+
+
+class AudioRingBuffer:
+
+    def __init__(self, capacity: int):
+        """
+        环形缓冲区 写入时不移动已有的数据
+        :param capacity: 容量(采样数)
+        """
+        self.capacity: int = capacity
+        self._data: np.ndarray = np.zeros(capacity, dtype=np.float64)
+        self._pos: int = 0  # 下一次写入的位置
+        self.total_written: int = 0  # 累计写入的采样数
+
+    def write(self, chunk: np.ndarray) -> None:
+        """
+        写入一段音频 超过容量时覆盖最旧的数据
+        :param chunk: 音频
+        :return:
+        """
+        n = len(chunk)
+        if n >= self.capacity:
+            self._data[:] = chunk[-self.capacity:]
+            self._pos = 0
+        else:
+            first = min(n, self.capacity - self._pos)
+            self._data[self._pos:self._pos + first] = chunk[:first]
+            self._data[:n - first] = chunk[first:]
+            self._pos = (self._pos + n) % self.capacity
+        self.total_written += n
+
+    def read_latest(self, n: int, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        按时间顺序读取最新的 n 个采样
+        :param n: 数量 不超过容量
+        :param out: 写入的数组 为空时新建
+        :return:
+        """
+        n = min(n, self.capacity)
+        if out is None:
+            out = np.empty(n, dtype=self._data.dtype)
+        start = (self._pos - n) % self.capacity
+        first = min(n, self.capacity - start)
+        out[:first] = self._data[start:start + first]
+        out[first:n] = self._data[:n - first]
+        return out
+
+    def clear(self) -> None:
+        self._data.fill(0)
+        self._pos = 0
+        self.total_written = 0
+
+
+def trim_template(template: np.ndarray, sample_rate: int,
+                  max_seconds: float = 0.35, start_ratio: float = 0.1) -> np.ndarray:
+    """
+    截取模板中声音开始的一段 去掉开头的静音
+    模板越短 声音出现后越快能匹配上
+    :param template: 模板音频
+    :param sample_rate: 采样率
+    :param max_seconds: 最多保留的秒数
+    :param start_ratio: 10ms内的音量 达到最大音量的这个比例时 认为声音开始
+    :return:
+    """
+    frame = max(1, sample_rate // 100)
+    frame_cnt = len(template) // frame
+    if frame_cnt == 0:
+        return template
+    rms = np.sqrt(np.mean(template[:frame_cnt * frame].reshape(frame_cnt, frame) ** 2, axis=1))
+    start_frame = int(np.argmax(rms >= rms.max() * start_ratio))
+    start = start_frame * frame
+    return template[start:start + int(sample_rate * max_seconds)]
+
+
+class StreamingMatchedFilterBank:
+
+    def __init__(self, template_list: List[np.ndarray], block_size: int,
+                 filter_b: Optional[np.ndarray] = None, filter_a: Optional[np.ndarray] = None):
+        """
+        多个模板的流式匹配
+        - 使用因果的 IIR 滤波 滤波状态在音频块之间延续 每次只处理新的音频
+        - 使用均匀分段的 overlap-save 计算与模板的互相关 模板的分段频谱预先计算
+        - 所有模板共用输入音频的频谱 每块音频只需要一次 2*block_size 的 FFT 和一次批量的 IFFT
+        - 用滑动的能量做归一化 得到 [-1, 1] 的相关系数
+        每个新的音频块耗时与块大小和模板总长度相关 与窗口长度无关
+        :param template_list: 模板音频 未滤波
+        :param block_size: 每次处理的采样数
+        :param filter_b: 滤波器参数 为空时不滤波
+        :param filter_a: 滤波器参数
+        """
+        self.block_size: int = block_size
+        self.filter_b: Optional[np.ndarray] = filter_b
+        self.filter_a: Optional[np.ndarray] = filter_a
+
+        # 模板使用相同的因果滤波 保证两者的相位响应一致
+        filtered_list = [lfilter(filter_b, filter_a, t) if filter_b is not None else np.asarray(t, dtype=np.float64)
+                         for t in template_list]
+        self.template_cnt: int = len(filtered_list)
+        self.template_len_list: List[int] = [len(t) for t in filtered_list]
+        self.template_norm: np.ndarray = np.array([np.linalg.norm(t) for t in filtered_list], dtype=np.float64)
+
+        # 模板倒序后分段 每段的频谱 较短的模板后面补0
+        fft_size = 2 * block_size
+        max_len = max(self.template_len_list)
+        self.partition_cnt: int = (max_len + block_size - 1) // block_size
+        padded = np.zeros((self.template_cnt, self.partition_cnt * block_size), dtype=np.float64)
+        for i, t in enumerate(filtered_list):
+            padded[i, :len(t)] = t[::-1]
+        self._template_spectra: np.ndarray = np.fft.rfft(
+            padded.reshape(self.template_cnt, self.partition_cnt, block_size), n=fft_size, axis=2)
+
+        self._zi_template: Optional[np.ndarray] = lfilter_zi(filter_b, filter_a) if filter_b is not None else None
+        self._zi: Optional[np.ndarray] = None
+        self._spectra_line: np.ndarray = np.zeros((self.partition_cnt, block_size + 1), dtype=np.complex128)  # 最近各个输入块的频谱
+        self._line_pos: int = 0
+        self._prev_block: np.ndarray = np.zeros(block_size, dtype=np.float64)
+        self._pending: np.ndarray = np.zeros(block_size, dtype=np.float64)  # 不足一块的输入
+        self._pending_len: int = 0
+        self._filtered: AudioRingBuffer = AudioRingBuffer(max_len + 2 * block_size)  # 滤波后的音频 用于滑动能量
+        self._old: np.ndarray = np.zeros((self.template_cnt, block_size), dtype=np.float64)
+        self._energy: np.ndarray = np.zeros(self.template_cnt, dtype=np.float64)
+        self._block_cnt: int = 0
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        清空所有状态 相当于之前的音频都是静音
+        :return:
+        """
+        self._zi = None if self._zi_template is None else self._zi_template * 0
+        self._spectra_line.fill(0)
+        self._line_pos = 0
+        self._prev_block.fill(0)
+        self._pending_len = 0
+        self._filtered.clear()
+        self._energy.fill(0)
+        self._block_cnt = 0
+
+    def process(self, chunk: np.ndarray) -> np.ndarray:
+        """
+        输入新的音频
+        :param chunk: 音频 任意长度
+        :return: 本次输入中 每个模板的最大相关系数 不足一块时为0
+        """
+        max_corr = np.zeros(self.template_cnt, dtype=np.float64)
+        idx = 0
+        n = len(chunk)
+        while idx < n:
+            take = min(n - idx, self.block_size - self._pending_len)
+            self._pending[self._pending_len:self._pending_len + take] = chunk[idx:idx + take]
+            self._pending_len += take
+            idx += take
+            if self._pending_len == self.block_size:
+                np.maximum(max_corr, self._process_block(self._pending), out=max_corr)
+                self._pending_len = 0
+        return max_corr
+
+    def _process_block(self, block: np.ndarray) -> np.ndarray:
+        b = self.block_size
+        if self.filter_b is not None:
+            block, self._zi = lfilter(self.filter_b, self.filter_a, block, zi=self._zi)
+        else:
+            block = block.copy()
+
+        # 互相关 overlap-save 所有模板共用输入的频谱
+        self._line_pos = (self._line_pos - 1) % self.partition_cnt
+        self._spectra_line[self._line_pos] = np.fft.rfft(np.concatenate((self._prev_block, block)))
+        self._prev_block = block
+        order = (self._line_pos + np.arange(self.partition_cnt)) % self.partition_cnt
+        acc = np.einsum('pk,tpk->tk', self._spectra_line[order], self._template_spectra)
+        corr = np.fft.irfft(acc, axis=1)[:, b:]
+
+        # 每个输出位置 最近 模板长度 个采样的能量
+        for i, m in enumerate(self.template_len_list):
+            if m >= b:
+                self._old[i] = self._filtered.read_latest(m)[:b]  # 移出窗口的采样 未写入过的位置是0
+            else:  # 模板比块短时 部分移出窗口的采样在本块中
+                self._old[i] = np.concatenate((self._filtered.read_latest(m), block))[:b]
+        self._filtered.write(block)
+        delta = block[np.newaxis, :] ** 2 - self._old ** 2
+        energy = self._energy[:, np.newaxis] + np.cumsum(delta, axis=1)
+        self._energy = energy[:, -1].copy()
+        self._block_cnt += 1
+        if self._block_cnt % 500 == 0:  # 定期重新计算 避免累计误差
+            for i, m in enumerate(self.template_len_list):
+                self._energy[i] = float(np.sum(self._filtered.read_latest(m) ** 2))
+
+        ncc = corr / (np.sqrt(np.maximum(energy, 1e-12)) * self.template_norm[:, np.newaxis] + 1e-12)
+        result = np.max(ncc, axis=1)
+        for i, m in enumerate(self.template_len_list):
+            if self._filtered.total_written < m:
+                result[i] = 0  # 模板还没有完整的对应音频
+        return result
+
+
+class StreamingMatchedFilter(StreamingMatchedFilterBank):
+
+    def __init__(self, template: np.ndarray, block_size: int,
+                 filter_b: Optional[np.ndarray] = None, filter_a: Optional[np.ndarray] = None):
+        """
+        单个模板的流式匹配
+        :param template: 模板音频 未滤波
+        :param block_size: 每次处理的采样数
+        :param filter_b: 滤波器参数 为空时不滤波
+        :param filter_a: 滤波器参数
+        """
+        StreamingMatchedFilterBank.__init__(self, [template], block_size, filter_b, filter_a)
+
+    def process(self, chunk: np.ndarray) -> float:
+        """
+        输入新的音频
+        :param chunk: 音频 任意长度
+        :return: 本次输入中 与模板的最大相关系数 不足一块时返回0
+        """
+        return float(StreamingMatchedFilterBank.process(self, chunk)[0])
+
+
+class StreamingAudioDetector:
+
+    def __init__(self, sample_rate: int, block_size: int,
+                 filter_b: Optional[np.ndarray] = None, filter_a: Optional[np.ndarray] = None):
+        """
+        录音线程中持续匹配所有模板 识别线程只读取这段时间每个模板的最大相关系数
+        :param sample_rate: 采样率
+        :param block_size: 每次处理的采样数
+        :param filter_b: 滤波器参数
+        :param filter_a: 滤波器参数
+        """
+        self.sample_rate: int = sample_rate
+        self.block_size: int = block_size
+        self.filter_b: Optional[np.ndarray] = filter_b
+        self.filter_a: Optional[np.ndarray] = filter_a
+
+        self._lock = threading.Lock()
+        self._filter_bank: Optional[StreamingMatchedFilterBank] = None
+        self.cue_name_list: List[str] = []
+        self._max_corr: np.ndarray = np.zeros(0, dtype=np.float64)
+
+        self.process_cnt: int = 0
+        self.process_seconds: float = 0
+
+    def set_template(self, template: np.ndarray, max_seconds: float = 0.35) -> None:
+        """
+        只使用一个模板
+        :param template: 模板音频 未滤波
+        :param max_seconds: 最多使用模板开头多少秒
+        :return:
+        """
+        self.set_templates({'default': template}, max_seconds=max_seconds)
+
+    def set_templates(self, template_map: Dict[str, np.ndarray], max_seconds: float = 0.35) -> None:
+        """
+        设置多个模板 每个模板是一种声音提示
+        :param template_map: key=声音提示名称 value=模板音频 未滤波
+        :param max_seconds: 最多使用模板开头多少秒
+        :return:
+        """
+        if len(template_map) == 0:
+            return
+        cue_name_list = list(template_map.keys())
+        filter_bank = StreamingMatchedFilterBank(
+            [trim_template(template_map[name], self.sample_rate, max_seconds) for name in cue_name_list],
+            self.block_size, self.filter_b, self.filter_a)
+        with self._lock:
+            self._filter_bank = filter_bank
+            self.cue_name_list = cue_name_list
+            self._max_corr = np.zeros(len(cue_name_list), dtype=np.float64)
+
+    @property
+    def ready(self) -> bool:
+        return self._filter_bank is not None
+
+    def feed(self, chunk: np.ndarray) -> None:
+        """
+        录音线程调用 输入新的音频
+        :param chunk: 音频
+        :return:
+        """
+        with self._lock:
+            if self._filter_bank is None:
+                return
+            start = time.perf_counter()
+            corr = self._filter_bank.process(chunk)
+            self.process_seconds += time.perf_counter() - start
+            self.process_cnt += 1
+            np.maximum(self._max_corr, corr, out=self._max_corr)
+
+    def pop_cue_corr(self) -> Dict[str, float]:
+        """
+        识别线程调用 获取上次调用之后 每种声音提示的最大相关系数
+        :return:
+        """
+        with self._lock:
+            result = {name: float(corr) for name, corr in zip(self.cue_name_list, self._max_corr)}
+            self._max_corr.fill(0)
+            return result
+
+    def pop_max_corr(self) -> float:
+        """
+        识别线程调用 获取上次调用之后 所有声音提示中的最大相关系数
+        :return:
+        """
+        cue_corr = self.pop_cue_corr()
+        return max(cue_corr.values()) if len(cue_corr) > 0 else 0
+
+    def reset(self) -> None:
+        """
+        清空状态 识别到之后调用 避免同一个声音重复触发
+        :return:
+        """
+        with self._lock:
+            self._max_corr.fill(0)
+            if self._filter_bank is not None:
+                self._filter_bank.reset()
+
+
+def __debug_stream_benchmark():
+    """
+    合成音频 背景噪声中按不同音量插入闪避提示音
+    对比 每20ms对0.5秒窗口滤波+FFT相关 的原方式 和 流式匹配 的识别延迟、误报和耗时
+    """
+    import os
+    from scipy.io import wavfile
+    from scipy.signal import butter, correlate, filtfilt, resample_poly
+
+    sample_rate = 32000
+    chunk_size = 320
+    check_interval_chunks = 2  # 每20ms识别一次
+    filter_b, filter_a = butter(4, 1000, btype='highpass', output='ba', fs=sample_rate)
+
+    template_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..',
+                                 'assets', 'template', 'dodge_audio', 'template_1.wav')
+    wav_rate, wav = wavfile.read(template_path)
+    if wav.ndim > 1:
+        wav = wav.mean(axis=1)
+    template = resample_poly(wav.astype(np.float64), sample_rate, wav_rate)
+
+    # 背景: 白噪声 + 随机音调 + 随机的其它短促声音
+    rng = np.random.default_rng(0)
+    duration = 12
+    total = duration * sample_rate
+    t = np.arange(total) / sample_rate
+    signal = rng.normal(0, 0.01, total)
+    for _ in range(8):
+        start = rng.integers(0, total - sample_rate)
+        freq = rng.uniform(200, 4000)
+        signal[start:start + sample_rate] += 0.03 * np.sin(2 * np.pi * freq * t[:sample_rate])
+    for _ in range(10):
+        start = rng.integers(0, total - 4000)
+        burst = rng.normal(0, 0.05, 4000) * np.hanning(4000)
+        signal[start:start + 4000] += burst
+    event_list = []
+    template_rms = np.sqrt(np.mean(template ** 2))
+    for i, snr_db in enumerate([20, 10, 5, 0, -5]):
+        start = int((1 + i * 2.1) * sample_rate)
+        gain = 0.01 * (10 ** (snr_db / 20)) / template_rms
+        signal[start:start + len(template)] += template * gain
+        event_list.append((start, snr_db))
+
+    # 原方式
+    filtered_template = filtfilt(filter_b, filter_a, template)
+    wx = filtered_template / np.std(filtered_template)
+
+    def old_corr(window: np.ndarray) -> float:
+        y = filtfilt(filter_b, filter_a, window)
+        wy = y / np.std(y)
+        if wx.shape[0] > wy.shape[0]:
+            correlation = correlate(wx, wy, mode='same', method='fft') / wx.shape[0]
+        else:
+            correlation = correlate(wy, wx, mode='same', method='fft') / wy.shape[0]
+        return float(np.max(correlation))
+
+    def evaluate(name: str, threshold: float, feed, check, clear):
+        detect_list = []
+        cost = 0
+        for chunk_idx in range(total // chunk_size):
+            chunk = signal[chunk_idx * chunk_size:(chunk_idx + 1) * chunk_size]
+            start = time.perf_counter()
+            feed(chunk)
+            if chunk_idx % check_interval_chunks == 0 and check() > threshold:
+                detect_list.append((chunk_idx + 1) * chunk_size)
+                clear()  # 与实际使用一致 识别到之后清空
+            cost += time.perf_counter() - start
+
+        latency_list = []
+        matched = set()
+        for event_start, snr_db in event_list:
+            # 识别到后清空 声音剩余的部分仍可能再次触发 不算误报
+            hit = [d for d in detect_list if event_start <= d <= event_start + len(template)]
+            latency_list.append('%ddB:%s' % (snr_db, '%dms' % ((hit[0] - event_start) * 1000 // sample_rate) if len(hit) > 0 else '未识别'))
+            matched.update(hit)
+        false_cnt = len(set(detect_list) - matched)
+        print('%s 阈值 %.2f | 延迟 %s | 误报 %d 次 | 耗时 %.3f 毫秒/10ms音频' % (
+            name, threshold, ' '.join(latency_list), false_cnt, cost * 1000 / (total // chunk_size)))
+
+    window = np.zeros(sample_rate // 2)
+
+    def old_feed(chunk):
+        window[:-len(chunk)] = window[len(chunk):]
+        window[-len(chunk):] = chunk
+
+    evaluate('原方式', 0.1, old_feed, lambda: old_corr(window), lambda: window.fill(0))
+
+    for max_seconds in [0.1, 0.15, 0.2, 0.35]:
+        for threshold in [0.2, 0.3]:
+            detector = StreamingAudioDetector(sample_rate, chunk_size, filter_b, filter_a)
+            detector.set_template(template, max_seconds=max_seconds)
+            evaluate('流式匹配 模板%.2f秒' % max_seconds, threshold, detector.feed, detector.pop_max_corr, detector.reset)
+
+
+def __debug_bank_benchmark():
+    """
+    多个模板时 对比 每个模板单独流式匹配 和 共用输入频谱的批量匹配 的耗时
+    模板使用 template_1 变调后的版本 同时检查两种方式的结果一致
+    """
+    import os
+    from scipy.io import wavfile
+    from scipy.signal import butter, resample_poly
+
+    sample_rate = 32000
+    chunk_size = 320
+    filter_b, filter_a = butter(4, 1000, btype='highpass', output='ba', fs=sample_rate)
+
+    template_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..',
+                                 'assets', 'template', 'dodge_audio', 'template_1.wav')
+    wav_rate, wav = wavfile.read(template_path)
+    if wav.ndim > 1:
+        wav = wav.mean(axis=1)
+    template = resample_poly(wav.astype(np.float64), sample_rate, wav_rate)
+
+    rng = np.random.default_rng(0)
+    signal = rng.normal(0, 0.01, 6 * sample_rate)
+    chunk_cnt = len(signal) // chunk_size
+
+    for template_cnt in [1, 2, 4, 8]:
+        template_list = [trim_template(resample_poly(template, 20 + i, 20), sample_rate, 0.15)
+                         for i in range(template_cnt)]
+
+        single_list = [StreamingMatchedFilter(t, chunk_size, filter_b, filter_a) for t in template_list]
+        single_result = np.zeros((chunk_cnt, template_cnt))
+        start = time.perf_counter()
+        for chunk_idx in range(chunk_cnt):
+            chunk = signal[chunk_idx * chunk_size:(chunk_idx + 1) * chunk_size]
+            for i, f in enumerate(single_list):
+                single_result[chunk_idx, i] = f.process(chunk)
+        single_cost = time.perf_counter() - start
+
+        bank = StreamingMatchedFilterBank(template_list, chunk_size, filter_b, filter_a)
+        bank_result = np.zeros((chunk_cnt, template_cnt))
+        start = time.perf_counter()
+        for chunk_idx in range(chunk_cnt):
+            bank_result[chunk_idx] = bank.process(signal[chunk_idx * chunk_size:(chunk_idx + 1) * chunk_size])
+        bank_cost = time.perf_counter() - start
+
+        print('模板 %d 个 | 单独匹配 %.3f 毫秒/10ms音频 | 批量匹配 %.3f 毫秒/10ms音频 | 结果最大差异 %.2e' % (
+            template_cnt, single_cost * 1000 / chunk_cnt, bank_cost * 1000 / chunk_cnt,
+            float(np.max(np.abs(single_result - bank_result)))))
+
+
+if __name__ == '__main__':
+    __debug_stream_benchmark()
+    __debug_bank_benchmark()
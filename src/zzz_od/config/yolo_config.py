@@ -1,3 +1,4 @@
+from enum import Enum
 from typing import List
 
 from one_dragon.base.config.config_item import ConfigItem
@@ -16,6 +17,14 @@ _DEFAULT_LOST_VOID_DET = 'yolov8n-736-lost-void-det-0104'
 _BACKUP_LOST_VOID_DET = 'yolov8s-736-lost-void-det-0101'
 
 
+class FlashClassifierModeEnum(Enum):
+
+    FULL = ConfigItem('全画面', 'full', desc='每次都识别整个画面')
+    ROI = ConfigItem('固定区域', 'roi', desc='只识别画面中间的区域')
+    DOWNSCALE = ConfigItem('降低分辨率', 'downscale', desc='隔行隔列采样后再识别')
+    GATED = ConfigItem('亮度触发', 'gated', desc='画面出现红黄色亮光时才识别')
+
+
 class YoloConfig(YamlConfig):
 
     def __init__(self):
@@ -41,6 +50,55 @@ class YoloConfig(YamlConfig):
     def flash_classifier_gpu(self, new_value: bool) -> None:
         self.update('flash_classifier_gpu', new_value)
 
+    @property
+    def flash_classifier_mode(self) -> str:
+        return self.get('flash_classifier_mode', FlashClassifierModeEnum.FULL.value.value)
+
+    @flash_classifier_mode.setter
+    def flash_classifier_mode(self, new_value: str) -> None:
+        self.update('flash_classifier_mode', new_value)
+
+    @property
+    def flash_classifier_roi(self) -> List[int]:
+        """
+        固定区域模式下识别的区域 x1, y1, x2, y2 (1920*1080 下的坐标) 默认去掉左右两侧的界面
+        """
+        return self.get('flash_classifier_roi', [320, 0, 1600, 1080])
+
+    @flash_classifier_roi.setter
+    def flash_classifier_roi(self, new_value: List[int]) -> None:
+        self.update('flash_classifier_roi', new_value)
+
+    @property
+    def flash_classifier_downscale(self) -> float:
+        return self.get('flash_classifier_downscale', 0.5)
+
+    @flash_classifier_downscale.setter
+    def flash_classifier_downscale(self, new_value: float) -> None:
+        self.update('flash_classifier_downscale', new_value)
+
+    @property
+    def flash_classifier_gate_threshold(self) -> float:
+        """
+        亮度触发模式下 红黄色亮光像素占比的增长超过这个值时触发识别
+        """
+        return self.get('flash_classifier_gate_threshold', 0.003)
+
+    @flash_classifier_gate_threshold.setter
+    def flash_classifier_gate_threshold(self, new_value: float) -> None:
+        self.update('flash_classifier_gate_threshold', new_value)
+
+    @property
+    def flash_classifier_gate_hold_seconds(self) -> float:
+        """
+        亮度触发模式下 触发后持续识别的秒数
+        """
+        return self.get('flash_classifier_gate_hold_seconds', 0.3)
+
+    @flash_classifier_gate_hold_seconds.setter
+    def flash_classifier_gate_hold_seconds(self, new_value: float) -> None:
+        self.update('flash_classifier_gate_hold_seconds', new_value)
+
     @property
     def hollow_zero_event(self) -> str:
         return self.get('hollow_zero_event', _DEFAULT_HOLLOW_ZERO_EVENT)
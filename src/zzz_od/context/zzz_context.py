@@ -49,6 +49,27 @@ class ZContext(OneDragonContext):
         self.hollow.data_service.reload()
         self.init_hollow_config()
 
+    def init_replay_controller(self, replay_path: str,
+                               fps: Optional[float] = None,
+                               realtime: bool = True,
+                               loop: bool = False) -> None:
+        """
+        使用录制的画面代替游戏窗口 用于离线测试识别的吞吐和延迟
+        需要在 init_by_config 之后调用
+        :param replay_path: 录制画面的文件夹或视频
+        :param fps: 回放帧率 为空时使用录制的时间
+        :param realtime: 是否按时间回放 否则每次截图返回下一帧
+        :param loop: 是否循环回放
+        :return:
+        """
+        from zzz_od.controller.zzz_replay_controller import ZReplayController
+        self.controller = ZReplayController(
+            replay_path,
+            fps=fps, realtime=realtime, loop=loop,
+            standard_width=self.project_config.screen_standard_width,
+            standard_height=self.project_config.screen_standard_height
+        )
+
     def init_hollow_config(self) -> None:
         """
         对空洞配置进行初始化
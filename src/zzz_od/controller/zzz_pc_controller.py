@@ -39,9 +39,11 @@ class ZPcController(PcControllerBase):
 
         self.is_moving: bool = False  # 是否正在移动
 
-    def fill_uid_black(self, screen: MatLike) -> MatLike:
+    def fill_uid_black(self, screen: MatLike, new_image: bool = True) -> MatLike:
         """
-        遮挡UID 由子类实现
+        遮挡UID
+        :param screen: 截图
+        :param new_image: 是否复制一张新图 否则直接修改原图
         """
         rect = ScreenNormalWorldEnum.UID.value.rect
 
@@ -49,7 +51,7 @@ class ZPcController(PcControllerBase):
             screen,
             pos=[rect.x1, rect.y1, rect.width, rect.height],
             color=game_const.YOLO_DEFAULT_COLOR,
-            new_image=True
+            new_image=new_image
         )
 
     def enable_keyboard(self):
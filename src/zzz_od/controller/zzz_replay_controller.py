@@ -0,0 +1,194 @@
+from typing import Optional
+
+from one_dragon.base.controller.replay_controller_base import ReplayControllerBase
+
+
+class ZReplayController(ReplayControllerBase):
+
+    def __init__(self, replay_path: str,
+                 fps: Optional[float] = None,
+                 realtime: bool = True,
+                 loop: bool = False,
+                 speed: float = 1,
+                 standard_width: int = 1920,
+                 standard_height: int = 1080,
+                 max_frame_cnt: Optional[int] = None):
+        """
+        回放录制画面的绝区零控制器 游戏内的操作都只记录次数
+        参数见 ReplayControllerBase
+        """
+        ReplayControllerBase.__init__(self, replay_path,
+                                      fps=fps, realtime=realtime, loop=loop, speed=speed,
+                                      standard_width=standard_width, standard_height=standard_height,
+                                      max_frame_cnt=max_frame_cnt)
+        self.is_moving: bool = False
+
+    def _replay_input(self, key: str, press: bool, press_time: Optional[float], release: bool) -> None:
+        """
+        与 ZPcController 一致的按键逻辑
+        """
+        if press:
+            self.btn_controller.press(key, press_time)
+        elif release:
+            self.btn_controller.release(key)
+        else:
+            self.btn_controller.tap(key)
+
+    def dodge(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        """
+        闪避
+        """
+        self._replay_input('dodge', press, press_time, release)
+
+    def switch_next(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        """
+        切换角色-下一个
+        """
+        self._replay_input('switch_next', press, press_time, release)
+
+    def switch_prev(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        """
+        切换角色-上一个
+        """
+        self._replay_input('switch_prev', press, press_time, release)
+
+    def normal_attack(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        """
+        普通攻击
+        """
+        self._replay_input('normal_attack', press, press_time, release)
+
+    def special_attack(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        """
+        特殊攻击
+        """
+        self._replay_input('special_attack', press, press_time, release)
+
+    def ultimate(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        """
+        终结技
+        """
+        self._replay_input('ultimate', press, press_time, release)
+
+    def chain_left(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        """
+        连携技-左
+        """
+        self._replay_input('chain_left', press, press_time, release)
+
+    def chain_right(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        """
+        连携技-右
+        """
+        self._replay_input('chain_right', press, press_time, release)
+
+    def move_w(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        """
+        向前移动
+        """
+        self._replay_input('move_w', press, press_time, release)
+
+    def move_s(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        """
+        向后移动
+        """
+        self._replay_input('move_s', press, press_time, release)
+
+    def move_a(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        """
+        向左移动
+        """
+        self._replay_input('move_a', press, press_time, release)
+
+    def move_d(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        """
+        向右移动
+        """
+        self._replay_input('move_d', press, press_time, release)
+
+    def interact(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        """
+        交互
+        """
+        self._replay_input('interact', press, press_time, release)
+
+    def lock(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        """
+        锁定敌人
+        """
+        self._replay_input('lock', press, press_time, release)
+
+    def chain_cancel(self, press: bool = False, press_time: Optional[float] = None, release: bool = False) -> None:
+        """
+        取消连携
+        """
+        self._replay_input('chain_cancel', press, press_time, release)
+
+    def turn_by_distance(self, d: float):
+        """
+        横向转向 按距离转
+        :param d: 正数往右转 负数往左转
+        :return:
+        """
+        pass
+
+    def start_moving_forward(self) -> None:
+        """
+        开始向前移动
+        """
+        if self.is_moving:
+            return
+        self.is_moving = True
+        self.move_w(press=True)
+
+    def stop_moving_forward(self) -> None:
+        """
+        停止向前移动
+        """
+        self.is_moving = False
+        self.move_w(release=True)
+
+
+def __debug_replay_benchmark():
+    """
+    回放 .debug/images 中的截图 测量画面匹配和战斗状态识别的耗时
+    """
+    import time
+    from one_dragon.base.screen import screen_utils
+    from one_dragon.utils import debug_utils
+    from one_dragon.utils.latency_histogram import LatencyHistogram
+    from zzz_od.context.zzz_context import ZContext
+
+    ctx = ZContext()
+    ctx.init_by_config()
+    ctx.init_replay_controller(debug_utils.get_debug_image_dir_path(), realtime=False)
+    ctx.ocr.init_model()
+    ctx.start_running()
+
+    screen_latency = LatencyHistogram('画面匹配')
+    while ctx.controller.is_game_window_ready:
+        screen = ctx.controller.screenshot()
+        start = time.perf_counter()
+        screen_utils.get_match_screen_name(ctx, screen)
+        screen_latency.record(time.perf_counter() - start)
+    print(screen_latency.display_text)
+
+    from zzz_od.auto_battle.auto_battle_operator import AutoBattleOperator
+    auto_op = AutoBattleOperator(ctx, 'auto_battle', '专属配队-简')
+    auto_op.init_before_running()
+    ctx.controller.reset_replay()
+    battle_latency = LatencyHistogram('战斗状态识别')
+    while ctx.controller.is_game_window_ready:
+        screen = ctx.controller.screenshot()
+        start = time.perf_counter()
+        auto_op.auto_battle_context.check_battle_state(screen, time.time(), sync=True)
+        battle_latency.record(time.perf_counter() - start)
+    print(battle_latency.display_text)
+    print(ctx.controller.stats_display_text)
+
+    auto_op.dispose()
+    ctx.stop_running()
+
+
+if __name__ == '__main__':
+    __debug_replay_benchmark()
@@ -11,7 +11,7 @@ from one_dragon.gui.widgets.setting_card.text_setting_card import TextSettingCar
 from one_dragon.gui.widgets.setting_card.yolo_model_card import ModelDownloadSettingCard
 from one_dragon.utils.i18_utils import gt
 from zzz_od.config.yolo_config import ZZZ_MODEL_DOWNLOAD_URL, get_flash_classifier_opts, get_hollow_zero_event_opts, \
-    get_lost_void_det_opts
+    get_lost_void_det_opts, FlashClassifierModeEnum
 from zzz_od.context.zzz_context import ZContext
 
 from phosdeiz.gui.widgets import Column
@@ -69,6 +69,12 @@ class SettingYoloInterface(VerticalScrollInterface):
         self.flash_classifier_gpu_opt = SwitchSettingCard(icon=FluentIcon.GAME, title='闪光识别-GPU运算')
         group.addSettingCard(self.flash_classifier_gpu_opt)
 
+        self.flash_classifier_mode_opt = ComboBoxSettingCard(
+            icon=FluentIcon.GAME, title='闪光识别-识别模式', content='降低识别耗时 可能影响准确率',
+            options_enum=FlashClassifierModeEnum
+        )
+        group.addSettingCard(self.flash_classifier_mode_opt)
+
         self.hollow_zero_event_opt = ModelDownloadSettingCard(
             ctx=self.ctx, sub_dir='hollow_zero_event', download_url=ZZZ_MODEL_DOWNLOAD_URL,
             icon=FluentIcon.GLOBE, title='空洞格子识别')
@@ -101,6 +107,7 @@ class SettingYoloInterface(VerticalScrollInterface):
 
         self._init_flash_classifier_opts()
         self.flash_classifier_gpu_opt.init_with_adapter(self.ctx.yolo_config.get_prop_adapter('flash_classifier_gpu'))
+        self.flash_classifier_mode_opt.init_with_adapter(self.ctx.yolo_config.get_prop_adapter('flash_classifier_mode'))
 
         self._init_hollow_zero_event_opts()
         self.hollow_zero_event_gpu_opt.init_with_adapter(self.ctx.yolo_config.get_prop_adapter('hollow_zero_event_gpu'))
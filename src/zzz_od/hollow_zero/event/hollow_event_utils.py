@@ -1,7 +1,6 @@
 import time
 
 import cv2
-import difflib
 from cv2.typing import MatLike
 from typing import Optional, List
 
@@ -12,7 +11,7 @@ from one_dragon.base.operation.operation_round_result import OperationRoundResul
 from one_dragon.base.screen import screen_utils
 from one_dragon.base.screen.screen_area import ScreenArea
 from one_dragon.base.screen.screen_utils import FindAreaResultEnum
-from one_dragon.utils import cv2_utils, str_utils
+from one_dragon.utils import cv2_utils, str_utils, text_matcher
 from one_dragon.utils.i18_utils import gt
 from one_dragon.utils.log_utils import log
 from zzz_od.context.zzz_context import ZContext
@@ -33,12 +32,10 @@ def check_event_at_right(ctx: ZContext, screen: MatLike, ignore_events: set[str]
     ocr_result_map = ctx.ocr.run_ocr(to_ocr)
 
     event_name_list = []
-    event_name_gt_list = []
     for event in ctx.hollow.data_service.normal_events:
         if event.event_name in ignore_events:
             continue
         event_name_list.append(event.event_name)
-        event_name_gt_list.append(gt(event.event_name))
 
     for event_enum in HollowZeroSpecialEvent:
         event = event_enum.value
@@ -49,7 +46,6 @@ def check_event_at_right(ctx: ZContext, screen: MatLike, ignore_events: set[str]
         if event.event_name in ignore_events:
             continue
         event_name_list.append(event.event_name)
-        event_name_gt_list.append(gt(event.event_name))
 
     # 事件标题一定在最上方 因此找y最小的
     min_y = 9999
@@ -62,7 +58,8 @@ def check_event_at_right(ctx: ZContext, screen: MatLike, ignore_events: set[str]
         if mrl.max.y - min_y < 20:
             ocr_result_list.append(ocr_result)
 
-    event_idx, _ = str_utils.find_most_similar(event_name_gt_list, ocr_result_list)
+    event_idx, _ = text_matcher.find_most_similar(text_matcher.get_text_matcher(event_name_list, translate=True),
+                                                  text_matcher.TextMatcher(ocr_result_list))
 
     if event_idx is not None:
         return event_name_list[event_idx]
@@ -91,7 +88,7 @@ def check_entry_opt_pos_at_right(ctx: ZContext, screen: MatLike, ignore_events:
     ocr_result_map = ctx.ocr.run_ocr(to_ocr)
 
     event_enum_list = []
-    event_name_gt_list = []
+    event_name_list = []
 
     for event_enum in HollowZeroSpecialEvent:
         event = event_enum.value
@@ -102,7 +99,7 @@ def check_entry_opt_pos_at_right(ctx: ZContext, screen: MatLike, ignore_events:
         if event.event_name in ignore_events:
             continue
         event_enum_list.append(event_enum)
-        event_name_gt_list.append(gt(event.event_name))
+        event_name_list.append(event.event_name)
 
     # 事件标题一定在最上方 因此找y最小的
     min_y = 9999
@@ -117,7 +114,8 @@ def check_entry_opt_pos_at_right(ctx: ZContext, screen: MatLike, ignore_events:
             ocr_result_list.append(ocr_result)
             ocr_mrl_list.append(mrl)
 
-    event_idx, ocr_idx = str_utils.find_most_similar(event_name_gt_list, ocr_result_list)
+    event_idx, ocr_idx = text_matcher.find_most_similar(text_matcher.get_text_matcher(event_name_list, translate=True),
+                                                        text_matcher.TextMatcher(ocr_result_list))
 
     if event_idx is not None:
         event = event_enum_list[event_idx]
@@ -156,23 +154,24 @@ def check_event_text_and_run(op: ZOperation, screen: MatLike, handlers: List[Eve
         if bottom_opt_pos is None or mrl.max.center.y > bottom_opt_pos.center.y:
             bottom_opt_pos = mrl.max
 
-    handler_str_list = [gt(handler.target_cn) for handler in handlers]
+    handler_matcher = text_matcher.get_text_matcher([handler.target_cn for handler in handlers], translate=True)
+    ocr_matcher = text_matcher.TextMatcher(ocr_result_list)
 
     # 由于选项和识别的文本都是多个，多对多的情况下需要双向匹配才算成功匹配
-    for handler in handlers:
-        handler_event_str = gt(handler.target_cn)
-        results = difflib.get_close_matches(handler_event_str, ocr_result_list, n=1)
-
-        if results is None or len(results) == 0:
+    ocr_result_idx_list = ocr_matcher.find_best_idx_batch(handler_matcher.target_list)
+    back_idx_map: dict[int, Optional[int]] = {}  # 识别文本反向匹配到的选项 相同的识别文本只匹配一次
+    for handler_idx, handler in enumerate(handlers):
+        ocr_result_idx = ocr_result_idx_list[handler_idx]
+        if ocr_result_idx is None:
             continue
 
-        ocr_result = results[0]
         # 同时需要反向匹配到一样的
-        results2 = difflib.get_close_matches(ocr_result, handler_str_list, n=1)
-        if results2 is None or len(results2) == 0 or results2[0] != handler_event_str:
+        if ocr_result_idx not in back_idx_map:
+            back_idx_map[ocr_result_idx] = handler_matcher.find_best_idx(ocr_result_list[ocr_result_idx])
+        back_idx = back_idx_map[ocr_result_idx]
+        if back_idx is None or handler_matcher.target_list[back_idx] != handler_matcher.target_list[handler_idx]:
             continue
 
-        ocr_result_idx = ocr_result_list.index(ocr_result)
         mrl = mrl_list[ocr_result_idx]
 
         if handler.is_event_mark:
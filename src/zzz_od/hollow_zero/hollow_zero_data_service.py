@@ -1,10 +1,8 @@
-import difflib
 import os
 import yaml
 from typing import List, Optional, Tuple
 
-from one_dragon.utils import os_utils
-from one_dragon.utils.i18_utils import gt
+from one_dragon.utils import os_utils, text_matcher
 from one_dragon.utils.log_utils import log
 from zzz_od.hollow_zero.game_data.hollow_zero_event import HallowZeroEvent, HollowZeroEntry
 from zzz_od.hollow_zero.game_data.hollow_zero_resonium import Resonium
@@ -103,10 +101,11 @@ class HallowZeroDataService:
 
     def match_resonium_by_ocr(self, cate_ocr: str, name_ocr: str) -> Optional[Resonium]:
         log.info('当前识别 %s %s', cate_ocr, name_ocr)
-        category_list = [gt(i) for i in self.resonium_cate_list]
-        results = difflib.get_close_matches(cate_ocr, category_list, n=2, cutoff=0.5)
+        category_matcher = text_matcher.get_text_matcher(self.resonium_cate_list, translate=True)
+        category_list = category_matcher.target_list
+        results = [category_list[i] for i in category_matcher.get_close_matches(cate_ocr, n=2, cutoff=0.5)]
 
-        if results is None or len(results) == 0:
+        if len(results) == 0:
             log.info('匹配结果 无')
             return None
 
@@ -129,14 +128,13 @@ class HallowZeroDataService:
 
         resonium_list = self.cate_2_resonium[self.resonium_cate_list[category_idx]]
 
-        resonium_name_list = [gt(i.name) for i in resonium_list]
-        results = difflib.get_close_matches(name_ocr, resonium_name_list, n=1)
+        resonium_matcher = text_matcher.get_text_matcher([i.name for i in resonium_list], translate=True)
+        resonium_idx = resonium_matcher.find_best_idx(name_ocr)
 
-        if results is None or len(results) == 0:
+        if resonium_idx is None:
             log.info('匹配结果 无')
             return None
 
-        resonium_idx = resonium_name_list.index(results[0])
         r = resonium_list[resonium_idx]
         log.info('匹配结果 %s %s', r.category, r.name)
         return r
@@ -322,6 +320,60 @@ class HallowZeroDataService:
         ]
 
 
+def __debug_text_matcher_benchmark():
+    """
+    对比 difflib 和 TextMatcher 在事件和鸣徽词表上的匹配耗时
+    使用随机删改字符的词模拟OCR结果
+    """
+    import difflib
+    import random
+    import time
+
+    data = HallowZeroDataService()
+    random.seed(0)
+
+    def _mock_ocr(word: str) -> str:
+        chars = list(word)
+        for _ in range(random.randint(0, 2)):
+            if len(chars) <= 1:
+                break
+            idx = random.randrange(len(chars))
+            if random.random() < 0.5:
+                chars.pop(idx)
+            else:
+                chars[idx] = random.choice(word)
+        return ''.join(chars)
+
+    vocabulary_list = [
+        ('事件', [i.event_name for i in data.normal_events]),
+        ('鸣徽', [i.name for i in data.resonium_list]),
+    ]
+    for name, word_list in vocabulary_list:
+        ocr_list = [_mock_ocr(random.choice(word_list)) for _ in range(2000)]
+
+        start = time.perf_counter()
+        expected = []
+        for ocr in ocr_list:
+            results = difflib.get_close_matches(ocr, word_list, n=1)
+            expected.append(word_list.index(results[0]) if len(results) > 0 else None)
+        difflib_cost = time.perf_counter() - start
+
+        start = time.perf_counter()
+        matcher = text_matcher.TextMatcher(word_list)
+        build_cost = time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = matcher.find_best_idx_batch(ocr_list)
+        matcher_cost = time.perf_counter() - start
+
+        print('%s 词表 %d 个 查询 %d 次 | difflib %.3fms/次 | TextMatcher 建立索引 %.2fms 查询 %.3fms/次 | 结果不一致 %d' % (
+            name, len(word_list), len(ocr_list),
+            difflib_cost * 1000 / len(ocr_list),
+            build_cost * 1000, matcher_cost * 1000 / len(ocr_list),
+            sum(1 for i, j in zip(expected, actual) if i != j)))
+
+
 if __name__ == '__main__':
     _data = HallowZeroDataService()
-    _data.match_resonium_by_ocr_full('[强聚合徽标')
\ No newline at end of file
+    _data.match_resonium_by_ocr_full('[强聚合徽标')
+    __debug_text_matcher_benchmark()
@@ -1,12 +1,74 @@
 import os
-from typing import Optional
+import time
+
+import cv2
+import numpy as np
+from cv2.typing import MatLike
+from typing import List, Optional
 
 from one_dragon.yolo.yolo_utils import ZZZ_MODEL_DOWNLOAD_URL
-from one_dragon.yolo.yolov8_onnx_cls import Yolov8Classifier
+from one_dragon.yolo.yolov8_onnx_cls import Yolov8Classifier, ClassificationResult
+
+
+class FlashBurstGate:
+
+    def __init__(self, threshold: float = 0.003,
+                 hold_seconds: float = 0.3,
+                 ratio_threshold: float = 0.02,
+                 sample_step: int = 20):
+        """
+        闪光的简单触发器 只有画面中红黄色亮光突然变多时 才需要用模型识别
+        在隔行隔列采样的小图上计算 耗时远小于模型推理
+        :param threshold: 红黄色亮光像素占比 比上一帧增长超过这个值时触发
+        :param hold_seconds: 触发后持续多少秒都认为需要识别
+        :param ratio_threshold: 红黄色亮光像素占比 超过这个值时也触发
+        :param sample_step: 采样间隔
+        """
+        self.threshold: float = threshold
+        self.hold_seconds: float = hold_seconds
+        self.ratio_threshold: float = ratio_threshold
+        self.sample_step: int = max(1, sample_step)
+
+        self.last_ratio: float = 0
+        self.hold_until: float = 0
+
+    def reset(self) -> None:
+        self.last_ratio = 0
+        self.hold_until = 0
+
+    def get_burst_ratio(self, image: MatLike) -> float:
+        """
+        红黄色亮光的像素占比
+        :param image: RGB 图片
+        :return:
+        """
+        thumbnail = np.ascontiguousarray(image[::self.sample_step, ::self.sample_step])
+        hsv = cv2.cvtColor(thumbnail, cv2.COLOR_RGB2HSV)
+        h, s, v = hsv[:, :, 0], hsv[:, :, 1], hsv[:, :, 2]
+        mask = (s >= 120) & (v >= 200) & ((h <= 35) | (h >= 165))  # 红色到黄色
+        return float(np.count_nonzero(mask)) / mask.size
+
+    def check(self, image: MatLike, run_time: float) -> bool:
+        """
+        是否需要用模型识别
+        :param image: RGB 图片
+        :param run_time: 画面时间
+        :return:
+        """
+        ratio = self.get_burst_ratio(image)
+        if ratio - self.last_ratio >= self.threshold or ratio >= self.ratio_threshold:
+            self.hold_until = run_time + self.hold_seconds
+        self.last_ratio = ratio
+        return run_time <= self.hold_until
 
 
 class FlashClassifier(Yolov8Classifier):
 
+    MODE_FULL = 'full'
+    MODE_ROI = 'roi'
+    MODE_DOWNSCALE = 'downscale'
+    MODE_GATED = 'gated'
+
     def __init__(self,
                  model_name: str = 'yolov8n-640-dodge-0718',
                  backup_model_name: str = 'yolov8n-640-dodge-0718',
@@ -14,13 +76,23 @@ class FlashClassifier(Yolov8Classifier):
                  gh_proxy: bool = True,
                  personal_proxy: Optional[str] = None,
                  gpu: bool = False,
-                 keep_result_seconds: float = 2
+                 keep_result_seconds: float = 2,
+                 mode: str = 'full',
+                 roi: Optional[List[int]] = None,
+                 downscale: float = 0.5,
+                 gate_threshold: float = 0.003,
+                 gate_hold_seconds: float = 0.3,
                  ):
         """
         :param model_name: 模型名称 在根目录下会有一个以模型名称创建的子文件夹
         :param model_parent_dir_path: 放置所有模型的根目录
         :param gpu: 是否启用GPU加速
         :param keep_result_seconds: 保留多长时间的识别结果
+        :param mode: 识别模式 见 FlashClassifierModeEnum
+        :param roi: 固定区域模式下识别的区域 x1, y1, x2, y2
+        :param downscale: 降低分辨率模式下的缩放比例
+        :param gate_threshold: 亮度触发模式下 触发的阈值
+        :param gate_hold_seconds: 亮度触发模式下 触发后持续识别的秒数
         """
         Yolov8Classifier.__init__(
             self,
@@ -33,3 +105,57 @@ class FlashClassifier(Yolov8Classifier):
             gpu=gpu,
             keep_result_seconds=keep_result_seconds
         )
+
+        self.mode: str = mode
+        self.roi: Optional[List[int]] = roi
+        self.downscale: float = downscale
+        self.gate: FlashBurstGate = FlashBurstGate(threshold=gate_threshold, hold_seconds=gate_hold_seconds)
+
+        self.classify_cnt: int = 0  # 调用次数
+        self.skip_cnt: int = 0  # 亮度触发模式下 没有触发而跳过模型的次数
+
+    def classify(self, image: MatLike, conf: float = 0.9, run_time: Optional[float] = None) -> ClassificationResult:
+        """
+        按识别模式对画面进行识别
+        :param image: 使用 opencv 读取的图片 RGB通道
+        :param conf: 置信度阈值
+        :param run_time: 画面时间
+        :return: 识别结果 跳过模型时 class_idx 为 -1
+        """
+        if run_time is None:
+            run_time = time.time()
+        self.classify_cnt += 1
+
+        if self.mode == FlashClassifier.MODE_ROI and self.roi is not None:
+            return self.run(image, conf=conf, run_time=run_time, roi=self._get_roi(image))
+        elif self.mode == FlashClassifier.MODE_DOWNSCALE and 0 < self.downscale < 1:
+            step = max(1, int(round(1 / self.downscale)))
+            return self.run(image[::step, ::step], conf=conf, run_time=run_time)
+        elif self.mode == FlashClassifier.MODE_GATED:
+            if not self.gate.check(image, run_time):
+                self.skip_cnt += 1
+                return ClassificationResult(raw_image=image, class_idx=-1, run_time=run_time)
+
+        return self.run(image, conf=conf, run_time=run_time)
+
+    def _get_roi(self, image: MatLike):
+        """
+        配置的区域是 1920*1080 下的坐标 按画面大小换算
+        """
+        height, width = image.shape[:2]
+        x1, y1, x2, y2 = self.roi
+        sx, sy = width / 1920.0, height / 1080.0
+        x1, x2 = max(0, int(x1 * sx)), min(width, int(x2 * sx))
+        y1, y2 = max(0, int(y1 * sy)), min(height, int(y2 * sy))
+        if x2 <= x1 or y2 <= y1:
+            return None
+        return x1, y1, x2, y2
+
+    def reset_mode_state(self) -> None:
+        """
+        重置触发器和统计 开始新的战斗时调用
+        :return:
+        """
+        self.gate.reset()
+        self.classify_cnt = 0
+        self.skip_cnt = 0
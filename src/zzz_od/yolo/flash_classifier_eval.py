@@ -0,0 +1,207 @@
+import argparse
+import os
+import re
+import time
+
+import numpy as np
+from cv2.typing import MatLike
+from typing import List, Optional
+
+from one_dragon.utils import cv2_utils, yolo_config_utils
+from zzz_od.config.yolo_config import FlashClassifierModeEnum
+from zzz_od.yolo.flash_classifier import FlashClassifier, FlashBurstGate
+
+_IMAGE_SUFFIX_LIST = ['.png', '.jpg', '.jpeg', '.bmp']
+
+
+class LabeledFrame:
+
+    def __init__(self, image: MatLike, label: int, run_time: float, name: str):
+        """
+        标注好的一帧
+        :param image: RGB 图片
+        :param label: 类别下标 0=无闪光 1=红光 2=黄光
+        :param run_time: 画面时间(秒)
+        :param name: 文件名
+        """
+        self.image: MatLike = image
+        self.label: int = label
+        self.run_time: float = run_time
+        self.name: str = name
+
+
+def load_labeled_frames(dataset_dir: str, fps: float = 50) -> List[LabeledFrame]:
+    """
+    读取标注的画面 目录结构与 yolo 分类数据集一致 每个类别下标一个子文件夹
+        dataset_dir/0/_1735134333210.png
+        dataset_dir/1/_1735134333230.png
+    所有画面按文件名中的毫秒时间戳排序 组成连续的画面 亮度触发模式依赖画面的先后顺序
+    没有时间戳时按文件名排序 按 fps 的间隔计算时间
+    :param dataset_dir: 数据集目录
+    :param fps: 没有时间戳时使用的帧率
+    :return:
+    """
+    item_list = []
+    for sub_dir in os.listdir(dataset_dir):
+        sub_dir_path = os.path.join(dataset_dir, sub_dir)
+        if not os.path.isdir(sub_dir_path) or not sub_dir.isdigit():
+            continue
+        for file_name in os.listdir(sub_dir_path):
+            if os.path.splitext(file_name)[1].lower() not in _IMAGE_SUFFIX_LIST:
+                continue
+            match = re.search(r'(\d{13})', file_name)
+            record_time = int(match.group(1)) / 1000.0 if match is not None else None
+            item_list.append((record_time, file_name, int(sub_dir), os.path.join(sub_dir_path, file_name)))
+
+    with_time = len(item_list) > 0 and all(i[0] is not None for i in item_list)
+    item_list.sort(key=lambda i: (i[0], i[1]) if with_time else i[1])
+
+    frame_list: List[LabeledFrame] = []
+    for idx, (record_time, file_name, label, file_path) in enumerate(item_list):
+        image = cv2_utils.read_image(file_path)
+        if image is None:
+            continue
+        run_time = record_time - item_list[0][0] if with_time else idx / fps
+        frame_list.append(LabeledFrame(image, label, run_time, file_name))
+    return frame_list
+
+
+def _print_metrics(mode: str, label_list: List[int], predict_list: List[int],
+                   cost_list: List[float], skip_cnt: int) -> None:
+    labels = np.array(label_list)
+    predicts = np.array(predict_list)
+    predicts[predicts < 0] = 0  # 低于阈值或跳过 都认为是无闪光
+    flash = labels > 0
+
+    accuracy = float(np.mean(labels == predicts)) if len(labels) > 0 else 0
+    recall = float(np.mean(predicts[flash] == labels[flash])) if np.any(flash) else 0
+    false_positive = float(np.mean(predicts[~flash] > 0)) if np.any(~flash) else 0
+    cost_ms = np.array(cost_list) * 1000
+
+    print('%-10s 准确率 %.3f 闪光召回 %.3f 误报 %.3f | 耗时 平均 %.2fms P90 %.2fms 最大 %.2fms | 跳过模型 %d/%d' % (
+        mode, accuracy, recall, false_positive,
+        np.mean(cost_ms), np.percentile(cost_ms, 90), np.max(cost_ms),
+        skip_cnt, len(label_list)))
+
+
+def evaluate_gate(frame_list: List[LabeledFrame], gate: FlashBurstGate) -> None:
+    """
+    只评估亮度触发器 不需要模型
+    闪光召回 = 闪光画面中触发的比例 跳过率越高 节省的模型推理越多
+    :param frame_list: 标注的画面
+    :param gate: 触发器
+    :return:
+    """
+    gate.reset()
+    fired_list: List[bool] = []
+    cost_list: List[float] = []
+    for frame in frame_list:
+        start = time.perf_counter()
+        fired_list.append(gate.check(frame.image, frame.run_time))
+        cost_list.append(time.perf_counter() - start)
+
+    fired = np.array(fired_list)
+    flash = np.array([f.label > 0 for f in frame_list])
+    cost_ms = np.array(cost_list) * 1000
+    print('亮度触发器 闪光召回 %.3f 无闪光时触发 %.3f 跳过率 %.3f | 耗时 平均 %.3fms 最大 %.3fms' % (
+        float(np.mean(fired[flash])) if np.any(flash) else 0,
+        float(np.mean(fired[~flash])) if np.any(~flash) else 0,
+        1 - float(np.mean(fired)),
+        np.mean(cost_ms), np.max(cost_ms)))
+
+
+def evaluate_modes(frame_list: List[LabeledFrame], model: FlashClassifier,
+                   mode_list: List[str], conf: float = 0.9) -> None:
+    """
+    逐个识别模式 按画面顺序识别 统计准确率和耗时
+    :param frame_list: 标注的画面
+    :param model: 闪光模型
+    :param mode_list: 识别模式
+    :param conf: 置信度阈值
+    :return:
+    """
+    model.classify(frame_list[0].image, conf=conf, run_time=frame_list[0].run_time)  # 预热
+    for mode in mode_list:
+        model.mode = mode
+        model.reset_mode_state()
+        label_list: List[int] = []
+        predict_list: List[int] = []
+        cost_list: List[float] = []
+        for frame in frame_list:
+            start = time.perf_counter()
+            result = model.classify(frame.image, conf=conf, run_time=frame.run_time)
+            cost_list.append(time.perf_counter() - start)
+            label_list.append(frame.label)
+            predict_list.append(int(result.class_idx))
+        _print_metrics(mode, label_list, predict_list, cost_list, model.skip_cnt)
+
+
+def evaluate_batch(frame_list: List[LabeledFrame], model: FlashClassifier,
+                   batch_size: int, conf: float = 0.9) -> None:
+    """
+    全画面模式下 使用批量推理识别所有画面 统计准确率和每张画面的平均耗时
+    批量推理只适合离线评估 实时识别时每帧都需要立刻得到结果
+    :param frame_list: 标注的画面
+    :param model: 闪光模型
+    :param batch_size: 每次推理的画面数量
+    :param conf: 置信度阈值
+    :return:
+    """
+    model.max_batch_size = batch_size
+    label_list: List[int] = []
+    predict_list: List[int] = []
+    cost_list: List[float] = []
+    for start_idx in range(0, len(frame_list), batch_size):
+        chunk = frame_list[start_idx:start_idx + batch_size]
+        start = time.perf_counter()
+        result_list = model.run_batch([f.image for f in chunk], conf=conf, run_time_list=[f.run_time for f in chunk])
+        cost = (time.perf_counter() - start) / len(chunk)
+        for frame, result in zip(chunk, result_list):
+            label_list.append(frame.label)
+            predict_list.append(int(result.class_idx))
+            cost_list.append(cost)
+    _print_metrics('batch-%d' % batch_size, label_list, predict_list, cost_list, 0)
+
+
+def main(args: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description='闪光识别模式的准确率和耗时评估')
+    parser.add_argument('dataset_dir', help='标注的画面目录 每个类别下标一个子文件夹')
+    parser.add_argument('--model', default='yolov8n-640-flash-1215', help='模型名称')
+    parser.add_argument('--model-dir', default=None, help='模型根目录 默认使用 flash_classifier 模型目录')
+    parser.add_argument('--mode', nargs='*', default=[i.value.value for i in FlashClassifierModeEnum], help='识别模式')
+    parser.add_argument('--fps', type=float, default=50, help='画面没有时间戳时使用的帧率')
+    parser.add_argument('--roi', type=int, nargs=4, default=[320, 0, 1600, 1080], help='固定区域模式的区域')
+    parser.add_argument('--downscale', type=float, default=0.5, help='降低分辨率模式的缩放比例')
+    parser.add_argument('--gate-threshold', type=float, default=0.003, help='亮度触发的阈值')
+    parser.add_argument('--gate-hold', type=float, default=0.3, help='亮度触发后持续识别的秒数')
+    parser.add_argument('--gate-only', action='store_true', help='只评估亮度触发器 不加载模型')
+    parser.add_argument('--batch', type=int, default=0, help='大于1时 额外评估全画面模式下批量推理的耗时')
+    parser.add_argument('--gpu', action='store_true', help='使用GPU')
+    opt = parser.parse_args(args)
+
+    frame_list = load_labeled_frames(opt.dataset_dir, fps=opt.fps)
+    print('读取画面 %d 张 其中闪光 %d 张' % (len(frame_list), sum(1 for f in frame_list if f.label > 0)))
+    if len(frame_list) == 0:
+        return
+
+    evaluate_gate(frame_list, FlashBurstGate(threshold=opt.gate_threshold, hold_seconds=opt.gate_hold))
+    if opt.gate_only:
+        return
+
+    model = FlashClassifier(
+        model_name=opt.model,
+        backup_model_name=opt.model,
+        model_parent_dir_path=opt.model_dir if opt.model_dir is not None else yolo_config_utils.get_model_category_dir('flash_classifier'),
+        gpu=opt.gpu,
+        roi=opt.roi,
+        downscale=opt.downscale,
+        gate_threshold=opt.gate_threshold,
+        gate_hold_seconds=opt.gate_hold,
+    )
+    evaluate_modes(frame_list, model, opt.mode)
+    if opt.batch > 1:
+        evaluate_batch(frame_list, model, opt.batch)
+
+
+if __name__ == '__main__':
+    main()